@@ -3,7 +3,7 @@ import os
 from flask import Flask
 
 from .config import Config
-from . import data
+from . import assets, catalog_io, data, facets, fragments, http_cache, images, instrumentation, orders, related, template_globals, uploads
 
 
 def create_app(config_class: type[Config] = Config) -> Flask:
@@ -13,17 +13,30 @@ def create_app(config_class: type[Config] = Config) -> Flask:
     os.makedirs(app.config["INSTANCE_DIR"], exist_ok=True)
 
     data.init_app(app)
+    catalog_io.init_app(app)
+    instrumentation.init_app(app)
+    facets.init_app(app)
+    related.init_app(app)
+    orders.init_app(app)
+    uploads.init_app(app)
+    images.init_app(app)
+    fragments.init_app(app)
+    http_cache.init_app(app)
+    assets.init_app(app)
+    template_globals.init_app(app)
 
     from .blueprints.main import main as main_bp
     from .blueprints.shop import shop as shop_bp
     from .blueprints.custom import custom as custom_bp
     from .blueprints.media import media as media_bp
     from .blueprints.checkout import checkout as checkout_bp
+    from .blueprints.api import api as api_bp
 
     app.register_blueprint(main_bp)
     app.register_blueprint(shop_bp, url_prefix="/shop")
     app.register_blueprint(custom_bp, url_prefix="/custom")
     app.register_blueprint(media_bp, url_prefix="/videos")
     app.register_blueprint(checkout_bp)
+    app.register_blueprint(api_bp, url_prefix="/api/v1")
 
     return app
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import abort, current_app, jsonify, request
+from werkzeug.exceptions import HTTPException
+
+from ... import data
+from ...http_cache import CATALOG, conditional
+from ..media.routes import media_url
+from . import api
+
+Getter = Callable[[Any], Any]
+
+
+def _flag(name: str) -> Getter:
+    return lambda record: bool(record[name])
+
+
+IMAGE_FIELDS: Dict[str, Optional[Getter]] = {"id": None, "image_url": None, "alt_text": None, "position": None}
+CATEGORY_FIELDS: Dict[str, Optional[Getter]] = {"id": None, "slug": None, "name": None, "description": None, "hero_image": None}
+CITY_FIELDS: Dict[str, Optional[Getter]] = {"slug": None, "title": None, "intro": None, "directions": None, "hours": None}
+VIDEO_FIELDS: Dict[str, Optional[Getter]] = {
+    "slug": None,
+    "title": None,
+    "category": None,
+    "thumbnail_url": lambda row: media_url(row["thumbnail_url"], external=True),
+    "video_url": lambda row: media_url(row["video_url"], external=True),
+}
+PRODUCT_FIELDS: Dict[str, Optional[Getter]] = {
+    "id": None,
+    "slug": None,
+    "name": None,
+    "category": lambda product: product.category_slug,
+    "category_name": None,
+    "description": None,
+    "price": None,
+    "made_to_order": _flag("made_to_order"),
+    "limited_drop": _flag("limited_drop"),
+    "seasonal": _flag("seasonal"),
+    "bundle_eligible": _flag("bundle_eligible"),
+    "availability": None,
+    "hero_image": lambda product: product.hero_image,
+    "images": lambda product: _serialize_all(product.images, _IMAGE_SERIALIZER),
+    "personalization": lambda product: product.personalization,
+    "options": lambda product: product.option_values,
+}
+
+Serializer = List[Tuple[str, Getter]]
+
+
+def _resolve(spec: Dict[str, Optional[Getter]], names: Iterable[str]) -> Serializer:
+    return [(name, spec[name] or itemgetter(name)) for name in names]
+
+
+_IMAGE_SERIALIZER = _resolve(IMAGE_FIELDS, IMAGE_FIELDS)
+
+
+def _fields(spec: Dict[str, Optional[Getter]]) -> Serializer:
+    requested = request.args.get("fields")
+    if not requested:
+        return _resolve(spec, spec)
+    names = list(dict.fromkeys(name.strip() for name in requested.split(",") if name.strip()))
+    unknown = [name for name in names if name not in spec]
+    if unknown:
+        abort(400, description=f"Unknown fields: {', '.join(unknown)}")
+    return _resolve(spec, names)
+
+
+def _serialize(record: Any, serializer: Serializer) -> Dict[str, Any]:
+    return {name: getter(record) for name, getter in serializer}
+
+
+def _serialize_all(records: Iterable[Any], serializer: Serializer) -> List[Dict[str, Any]]:
+    return [_serialize(record, serializer) for record in records]
+
+
+def _limit() -> int:
+    maximum = current_app.config["API_MAX_PAGE_SIZE"]
+    try:
+        limit = int(request.args.get("limit", current_app.config["PRODUCTS_PAGE_SIZE"]))
+    except ValueError:
+        abort(400, description="limit must be an integer")
+    if not 1 <= limit <= maximum:
+        abort(400, description=f"limit must be between 1 and {maximum}")
+    return limit
+
+
+def _truthy(name: str) -> Optional[bool]:
+    return True if request.args.get(name, "").lower() in ("1", "true", "yes") else None
+
+
+@api.errorhandler(HTTPException)
+def _error(exc: HTTPException):
+    return jsonify(error={"status": exc.code, "message": exc.description}), exc.code
+
+
+@api.route("/categories")
+@conditional(CATALOG)
+def categories():
+    return jsonify(data=_serialize_all(data.get_categories(), _fields(CATEGORY_FIELDS)))
+
+
+@api.route("/categories/<slug>")
+@conditional(CATALOG)
+def category(slug: str):
+    row = data.get_category_by_slug(slug)
+    if not row:
+        abort(404, description=f"No category {slug!r}")
+    return jsonify(data=_serialize(row, _fields(CATEGORY_FIELDS)))
+
+
+@api.route("/products")
+@conditional(CATALOG)
+def products():
+    serializer = _fields(PRODUCT_FIELDS)
+    try:
+        page = data.get_products_page(
+            category_slug=request.args.get("category") or None,
+            limited=_truthy("limited"),
+            search_term=request.args.get("q", "").strip() or None,
+            seasonal=_truthy("seasonal"),
+            after=request.args.get("after"),
+            limit=_limit(),
+        )
+    except ValueError:
+        abort(400, description="Invalid cursor")
+    return jsonify(data=_serialize_all(page.products, serializer), next_cursor=page.next_cursor)
+
+
+@api.route("/products/bulk")
+@conditional(CATALOG)
+def products_bulk():
+    slugs = [slug for value in request.args.getlist("slugs") for slug in value.split(",") if slug]
+    maximum = current_app.config["API_MAX_PAGE_SIZE"]
+    if not slugs:
+        abort(400, description="slugs is required")
+    if len(slugs) > maximum:
+        abort(400, description=f"At most {maximum} slugs per request")
+    records = data.get_products_by_slugs(slugs)
+    found = {record.slug for record in records}
+    return jsonify(
+        data=_serialize_all(records, _fields(PRODUCT_FIELDS)),
+        missing=[slug for slug in dict.fromkeys(slugs) if slug not in found],
+    )
+
+
+@api.route("/products/<slug>")
+@conditional(CATALOG)
+def product(slug: str):
+    record = data.get_product_by_slug(slug)
+    if not record:
+        abort(404, description=f"No product {slug!r}")
+    return jsonify(data=_serialize(record, _fields(PRODUCT_FIELDS)))
+
+
+@api.route("/products/<slug>/images")
+@conditional(CATALOG)
+def product_images(slug: str):
+    record = data.get_product_by_slug(slug)
+    if not record:
+        abort(404, description=f"No product {slug!r}")
+    return jsonify(data=_serialize_all(record.images, _fields(IMAGE_FIELDS)))
+
+
+@api.route("/cities")
+@conditional(CATALOG)
+def cities():
+    return jsonify(data=_serialize_all(data.get_city_pages(), _fields(CITY_FIELDS)))
+
+
+@api.route("/cities/<slug>")
+@conditional(CATALOG)
+def city(slug: str):
+    row = data.get_city_page(slug)
+    if not row:
+        abort(404, description=f"No city page {slug!r}")
+    return jsonify(data=_serialize(row, _fields(CITY_FIELDS)))
+
+
+@api.route("/videos")
+@conditional(CATALOG)
+def videos():
+    serializer = _fields(VIDEO_FIELDS)
+    groups = data.get_videos_grouped()
+    return jsonify(data=[_serialize(row, serializer) for rows in groups.values() for row in rows])
@@ -1,23 +1,158 @@
 from __future__ import annotations
 
-from flask import flash, redirect, render_template, request, url_for
+import hashlib
+import json
+import secrets
 
+from flask import abort, flash, jsonify, make_response, redirect, render_template, request, session, url_for
+
+from ... import cart as cart_store
+from ... import data, orders
 from . import checkout
 
 
+REQUIRED_FIELDS = ("email", "address", "city", "zip")
+
+
+def _wants_json() -> bool:
+    return request.accept_mimetypes.best == "application/json"
+
+
+def _quantity(default: int = 1) -> int:
+    try:
+        return int(request.form.get("quantity", default))
+    except ValueError:
+        abort(400)
+
+
+def _cart_response(lines, message: str):
+    if _wants_json():
+        response = jsonify(cart_count=sum(line[1] for line in lines), message=message)
+    else:
+        flash(message, "success")
+        response = redirect(url_for("checkout.cart"))
+    return cart_store.save(response, lines)
+
+
+def _revalidated(template: str, **context):
+    priced = cart_store.priced()
+    response = make_response()
+    if priced.dropped:
+        # Pruned before rendering so the badge on this page already matches the cookie being set.
+        flash("Some items are no longer available and were removed from your cart.", "error")
+        cart_store.save(response, priced.kept)
+    response.set_data(render_template(template, cart=priced, **context))
+    return response
+
+
 @checkout.route("/cart")
 def cart():
-    return render_template("checkout/cart.html")
+    return _revalidated("checkout/cart.html")
+
+
+@checkout.route("/cart/add", methods=["POST"])
+def add_to_cart():
+    try:
+        product_id = int(request.form["product_id"])
+    except (KeyError, ValueError):
+        abort(400)
+    options, personalization = cart_store.options_from_form(request.form)
+    try:
+        lines = cart_store.add(product_id, max(_quantity(), 1), options, personalization)
+    except ValueError as exc:
+        if _wants_json():
+            return jsonify(error=str(exc)), 409
+        flash(str(exc), "error")
+        return redirect(url_for("checkout.cart"))
+    return _cart_response(lines, "Added to your cart.")
+
+
+@checkout.route("/cart/update", methods=["POST"])
+def update_cart():
+    lines = cart_store.update(request.form.get("line", ""), _quantity())
+    return _cart_response(lines, "Cart updated.")
+
+
+@checkout.route("/cart/remove", methods=["POST"])
+def remove_from_cart():
+    lines = cart_store.remove(request.form.get("line", ""))
+    return _cart_response(lines, "Removed from your cart.")
 
 
 @checkout.route("/checkout", methods=["GET", "POST"])
 def checkout_view():
     if request.method == "POST":
-        flash("Stripe checkout session will start soon.", "success")
-        return redirect(url_for("checkout.success"))
-    return render_template("checkout/checkout.html")
+        priced = cart_store.priced()
+        if not priced.lines:
+            flash("Your cart is empty.", "error")
+            return redirect(url_for("checkout.cart"))
+        missing = [field for field in REQUIRED_FIELDS if not request.form.get(field, "").strip()]
+        if missing:
+            flash(f"Please fill in: {', '.join(missing)}.", "error")
+            return redirect(url_for("checkout.checkout_view"))
+        try:
+            hold = data.reserve_stock(
+                (line.product.id, data.variant_key(line.options), line.quantity) for line in priced.lines
+            )
+        except data.OutOfStock as exc:
+            name = next(line.product.name for line in priced.lines if line.product.id == exc.product_id)
+            flash(f"Sorry, there isn't enough {name} left to fill your order.", "error")
+            return redirect(url_for("checkout.cart"))
+        try:
+            order_id = orders.submit(_new_order(priced, hold, _idempotency_key(priced)))
+        except orders.OrderQueueFull:
+            # Nothing was queued, so the stock can go straight back on sale.
+            if hold is not None:
+                data.release_reservation(hold)
+            flash("We're handling a rush of orders right now. Please try again in a moment.", "error")
+            return redirect(url_for("checkout.checkout_view"))
+        except TimeoutError:
+            # Still queued: the writer confirms the hold if the order commits, and the sweeper expires it if not.
+            flash(
+                "Your order is being processed. Submitting again in a moment will confirm it without charging you twice.",
+                "error",
+            )
+            return redirect(url_for("checkout.checkout_view"))
+        except orders.HoldExpired:
+            flash("Your reserved items were released before the order went through. Please check out again.", "error")
+            return redirect(url_for("checkout.cart"))
+        session.pop("checkout_nonce", None)
+        return cart_store.save(redirect(url_for("checkout.success", order=order_id)), [])
+    return _revalidated("checkout/checkout.html")
+
+
+def _idempotency_key(priced: cart_store.PricedCart) -> str:
+    # Resubmitting the same cart and email after a timeout finds the order it already placed; any change makes a new one.
+    # The nonce is dropped once an order commits, so buying the same cart again later is a new order too.
+    nonce = session.setdefault("checkout_nonce", secrets.token_urlsafe(16))
+    lines = [[line.key, line.quantity, line.unit_price] for line in priced.lines]
+    identity = json.dumps([nonce, request.form["email"].strip().lower(), lines], separators=(",", ":"))
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def _new_order(priced: cart_store.PricedCart, hold: str | None, idempotency_key: str) -> orders.NewOrder:
+    form = request.form
+    return orders.NewOrder(
+        email=form["email"].strip(),
+        phone=form.get("phone", "").strip(),
+        notes=form.get("notes", "").strip(),
+        address=form["address"].strip(),
+        city=form["city"].strip(),
+        zip=form["zip"].strip(),
+        state=form.get("state", "PA"),
+        subtotal=priced.subtotal,
+        tax=priced.tax,
+        shipping=priced.shipping,
+        total=priced.total,
+        lines=[
+            orders.OrderLine(line.product.id, line.product.name, line.quantity, line.unit_price, line.options, line.personalization)
+            for line in priced.lines
+        ],
+        hold=hold,
+        idempotency_key=idempotency_key,
+    )
 
 
 @checkout.route("/checkout/success")
 def success():
-    return render_template("checkout/success.html")
+    return render_template("checkout/success.html", order_id=request.args.get("order", type=int))
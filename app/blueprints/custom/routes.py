@@ -1,32 +1,45 @@
 from __future__ import annotations
 
-from flask import flash, render_template, request
+from flask import abort, current_app, flash, render_template, request, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
 
-from ... import data
+from ... import data, uploads
+from ...http_cache import CATALOG, STATIC, conditional
 from . import custom
 
 
 @custom.route("/how-it-works")
+@conditional(STATIC)
 def how_it_works():
     return render_template("custom/how_it_works.html")
 
 
 @custom.route("/start", methods=["GET", "POST"])
+@conditional(STATIC)
 def intake_form():
     submitted = False
     if request.method == "POST":
+        try:
+            form, stored = uploads.receive(request.environ, "references")
+        except RequestEntityTooLarge as exc:
+            flash(exc.description, "error")
+            return render_template("custom/intake.html", submitted=False), 413
+        if not form.get("name", "").strip() or not form.get("email", "").strip():
+            uploads.discard(stored)
+            flash("Please include your name and email so we can reach you.", "error")
+            return render_template("custom/intake.html", submitted=False)
+        uploads.save_request(form, stored)
         flash("Custom request received! We'll reach out with sketches soon.", "success")
         submitted = True
     return render_template("custom/intake.html", submitted=submitted)
 
 
 @custom.route("/inspiration")
+@conditional(CATALOG)
 def inspiration():
-    placeholder = "https://images.unsplash.com/photo-1512446816042-444d641267d4?auto=format&fit=crop&w=900&q=80"
-    products = []
-    for row in data.get_products():
-        item = dict(row)
-        images = [dict(img) for img in data.get_product_images(item["id"])]
-        item["hero_image"] = images[0]["image_url"] if images else placeholder
-        products.append(item)
-    return render_template("custom/inspiration.html", products=products)
+    try:
+        page = data.get_products_page(after=request.args.get("after"), limit=current_app.config["PRODUCTS_PAGE_SIZE"])
+    except ValueError:
+        abort(400)
+    next_url = url_for("custom.inspiration", after=page.next_cursor) if page.next_cursor else None
+    return render_template("custom/inspiration.html", products=page.products, next_url=next_url)
@@ -1,54 +1,41 @@
 from __future__ import annotations
 
-from flask import flash, redirect, render_template, request, url_for
+from flask import current_app, flash, redirect, render_template, request, url_for
 
 from ... import data
+from ...http_cache import CATALOG, STATIC, conditional
 from . import main
 
 
-@main.context_processor
-def inject_globals():
-    return {
-        "cart_count": 0,
-    }
-
-
 @main.route("/")
 @main.route("/home")
+@conditional(CATALOG)
 def home():
-    featured_rows = [dict(row) for row in data.get_products(limited=True)]
-    best_sellers_rows = [dict(row) for row in data.get_products()[:3]]
-    placeholder = "https://images.unsplash.com/photo-1512446816042-444d641267d4?auto=format&fit=crop&w=900&q=80"
-
-    for product in featured_rows + best_sellers_rows:
-        images = data.get_product_images(product["id"])
-        product["hero_image"] = images[0]["image_url"] if images else placeholder
-
-    featured = featured_rows
-    best_sellers = best_sellers_rows
+    featured = data.get_products_page(limited=True, limit=current_app.config["PRODUCTS_PAGE_SIZE"]).products
+    best_sellers = data.get_products_page(limit=3).products
     reviews = data.get_reviews(limit=3)
-    cities = data.get_city_pages()
     return render_template(
         "home.html",
         featured=featured,
         best_sellers=best_sellers,
         reviews=reviews,
-        cities=cities,
     )
 
 
 @main.route("/about")
+@conditional(STATIC)
 def about():
     return render_template("about.html")
 
 
 @main.route("/visit")
+@conditional(CATALOG)
 def visit():
-    cities = data.get_city_pages()
-    return render_template("visit.html", cities=cities)
+    return render_template("visit.html")
 
 
 @main.route("/visit/<slug>")
+@conditional(CATALOG)
 def local_page(slug: str):
     city = data.get_city_page(slug)
     if not city:
@@ -58,22 +45,26 @@ def local_page(slug: str):
 
 
 @main.route("/care")
+@conditional(STATIC)
 def care():
     return render_template("care.html")
 
 
 @main.route("/faq")
+@conditional(STATIC)
 def faq():
     return render_template("faq.html")
 
 
 @main.route("/reviews")
+@conditional(CATALOG)
 def reviews_page():
     reviews = data.get_reviews()
     return render_template("reviews.html", reviews=reviews)
 
 
 @main.route("/contact", methods=["GET", "POST"])
+@conditional(STATIC)
 def contact():
     submitted = False
     if request.method == "POST":
@@ -84,21 +75,25 @@ def contact():
 
 
 @main.route("/policies/shipping")
+@conditional(STATIC)
 def shipping_policy():
     return render_template("policies/shipping.html")
 
 
 @main.route("/policies/returns")
+@conditional(STATIC)
 def returns_policy():
     return render_template("policies/returns.html")
 
 
 @main.route("/policies/privacy")
+@conditional(STATIC)
 def privacy_policy():
     return render_template("policies/privacy.html")
 
 
 @main.route("/policies/terms")
+@conditional(STATIC)
 def terms_policy():
     return render_template("policies/terms.html")
 
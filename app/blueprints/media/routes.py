@@ -1,13 +1,87 @@
 from __future__ import annotations
 
-from flask import render_template
+import os
+import shutil
+import tempfile
+import urllib.request
+from urllib.parse import urlsplit
+
+import click
+from flask import abort, current_app, render_template, url_for
+from werkzeug.security import safe_join
 
 from ... import data
+from ...http_cache import CATALOG, conditional
+from ...streaming import send_ranged
 from . import media
 
 
+STREAM_EXTENSIONS = {".mp4", ".m4v", ".webm", ".mov", ".jpg", ".jpeg", ".png", ".webp"}
+
+
+@media.app_template_global()
+def media_url(value: str | None, external: bool = False) -> str | None:
+    # video rows hold either a remote URL or a file name relative to MEDIA_DIR.
+    if not value or "://" in value:
+        return value
+    return url_for("media.stream", name=value, _external=external)
+
+
 @media.route("/")
 @media.route("/index")
+@conditional(CATALOG)
 def videos():
     groups = data.get_videos_grouped()
     return render_template("media/videos.html", groups=groups)
+
+
+@media.route("/stream/<path:name>", methods=["GET", "HEAD"])
+def stream(name: str):
+    if os.path.splitext(name)[1].lower() not in STREAM_EXTENSIONS:
+        abort(404)
+    path = safe_join(current_app.config["MEDIA_DIR"], name)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    return send_ranged(path, max_age=current_app.config["MEDIA_MAX_AGE"])
+
+
+def _download(url: str, directory: str, timeout: float) -> str:
+    name = os.path.basename(urlsplit(url).path)
+    if os.path.splitext(name)[1].lower() not in STREAM_EXTENSIONS:
+        raise OSError(f"unsupported file type {name!r}")
+    target = os.path.join(directory, name)
+    if not os.path.exists(target):
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            handle, temporary = tempfile.mkstemp(dir=directory, prefix=".")
+            try:
+                with os.fdopen(handle, "wb") as output:
+                    shutil.copyfileobj(response, output, 1024 * 1024)
+                os.replace(temporary, target)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+    return name
+
+
+@media.cli.command("fetch")
+@click.option("--timeout", default=60.0, help="Per-download timeout in seconds.")
+def fetch_command(timeout: float) -> None:
+    """Download remote videos and thumbnails into MEDIA_DIR and point the video rows at the local copies."""
+    directory = current_app.config["MEDIA_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    db = data.get_db()
+    for row in db.execute("SELECT id, slug, thumbnail_url, video_url FROM video").fetchall():
+        updates = {}
+        for column in ("thumbnail_url", "video_url"):
+            value = row[column]
+            if not value or "://" not in value:
+                continue
+            try:
+                updates[column] = _download(value, directory, timeout)
+            except OSError as exc:
+                click.echo(f"skip {row['slug']} {column}: {exc}")
+        if updates:
+            assignments = ", ".join(f"{column} = ?" for column in updates)
+            db.execute(f"UPDATE video SET {assignments} WHERE id = ?", (*updates.values(), row["id"]))
+            db.commit()
+            click.echo(f"{row['slug']}: {', '.join(updates.values())}")
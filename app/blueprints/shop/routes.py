@@ -1,83 +1,118 @@
 from __future__ import annotations
 
-import json
+from flask import abort, current_app, jsonify, render_template, request, stream_template, url_for
 
-from flask import abort, render_template, request
-
-from ... import data
+from ... import data, facets, related as related_products
+from ...http_cache import CATALOG, conditional
 from . import shop
 
 
-PLACEHOLDER_IMAGE = "https://images.unsplash.com/photo-1512446816042-444d641267d4?auto=format&fit=crop&w=900&q=80"
-
-
-def _enrich(products):
-    enriched = []
-    for row in products:
-        item = dict(row)
-        images = [dict(img) for img in data.get_product_images(item["id"])]
-        item["images"] = images
-        item["hero_image"] = images[0]["image_url"] if images else PLACEHOLDER_IMAGE
-        enriched.append(item)
-    return enriched
-
-
-@shop.app_context_processor
-def inject_filters():
-    return {
-        "categories": [dict(row) for row in data.get_categories()],
-    }
+def _page(**filters) -> data.ProductPage:
+    try:
+        return data.get_products_page(
+            after=request.args.get("after"),
+            limit=current_app.config["PRODUCTS_PAGE_SIZE"],
+            **filters,
+        )
+    except ValueError:
+        abort(400)
+
+
+def _next_url(page: data.ProductPage):
+    if not page.next_cursor:
+        return None
+    args = {**request.args.to_dict(), "after": page.next_cursor}
+    # View args win over a query argument of the same name, which would otherwise be passed twice.
+    return url_for(request.endpoint, **{**args, **request.view_args})
+
+
+def _facet_page():
+    try:
+        after = data.decode_cursor(request.args["after"]) if request.args.get("after") else None
+    except ValueError:
+        abort(400)
+    # Facet positions are (listing_key, product_id); anything else would fail inside the index.
+    if after is not None and not (
+        len(after) == 2 and isinstance(after[0], str) and isinstance(after[1], int) and not isinstance(after[1], bool)
+    ):
+        abort(400)
+    selection = facets.selection_from_args(request.args)
+    result = facets.get_index().query(selection, after=after, limit=current_app.config["PRODUCTS_PAGE_SIZE"])
+    next_url = None
+    if result.next_position:
+        args = {**request.args.to_dict(flat=False), "after": data.encode_cursor(result.next_position)}
+        next_url = url_for("shop.list_products", **args)
+    return data.get_products_by_ids(result.product_ids), result, facets.facet_groups(result.counts, selection), next_url
 
 
 @shop.route("/")
+@conditional(CATALOG)
 def list_products():
-    products = _enrich(data.get_products())
-    return render_template("shop/list.html", products=products, title="All Products")
+    products, result, facet_groups, next_url = _facet_page()
+    return stream_template(
+        "shop/list.html",
+        products=products,
+        next_url=next_url,
+        facets=facet_groups,
+        total=result.total,
+        title="All Products",
+    )
+
+
+@shop.route("/filter")
+@conditional(CATALOG)
+def filter_products():
+    products, result, facet_groups, next_url = _facet_page()
+    html = render_template("shop/_product_grid.html", products=products, next_url=next_url)
+    return jsonify(total=result.total, facets=facet_groups, html=html, next_url=next_url)
 
 
 @shop.route("/limited")
+@conditional(CATALOG)
 def limited():
-    products = _enrich(data.get_products(limited=True))
-    return render_template("shop/list.html", products=products, title="Limited Drops")
+    page = _page(limited=True)
+    return stream_template("shop/list.html", products=page.products, next_url=_next_url(page), title="Limited Drops")
 
 
 @shop.route("/seasonal")
+@conditional(CATALOG)
 def seasonal():
-    products = _enrich([p for p in data.get_products() if p["seasonal"]])
-    return render_template("shop/list.html", products=products, title="Seasonal Highlights")
+    page = _page(seasonal=True)
+    return stream_template("shop/list.html", products=page.products, next_url=_next_url(page), title="Seasonal Highlights")
 
 
 @shop.route("/category/<slug>")
+@conditional(CATALOG)
 def category(slug: str):
     category_row = data.get_category_by_slug(slug)
     if not category_row:
         abort(404)
-    products = _enrich(data.get_products(category_slug=slug))
-    return render_template("shop/category.html", category=dict(category_row), products=products)
+    page = _page(category_slug=slug)
+    return stream_template("shop/category.html", category=dict(category_row), products=page.products, next_url=_next_url(page))
 
 
 @shop.route("/product/<slug>")
+@conditional(CATALOG)
 def product(slug: str):
-    product_row = data.get_product_by_slug(slug)
-    if not product_row:
+    product_record = data.get_product_by_slug(slug)
+    if not product_record:
         abort(404)
-    product_dict = dict(product_row)
-    images = [dict(img) for img in data.get_product_images(product_row["id"])]
-    personalization = json.loads(product_row["personalization_schema"]) if product_row["personalization_schema"] else {}
-    options = json.loads(product_row["options"]) if product_row["options"] else {}
-    related = _enrich([p for p in data.get_products(category_slug=product_row["category_slug"]) if p["slug"] != slug][:3])
+    related = related_products.get_related(product_record)
     return render_template(
         "shop/product.html",
-        product=product_dict,
-        images=images,
-        personalization=personalization,
-        options=options,
+        product=product_record,
+        images=product_record.images,
+        personalization=product_record.personalization,
+        options=product_record.option_values,
         related=related,
     )
 
 
 @shop.route("/search")
+@conditional(CATALOG)
 def search():
     term = request.args.get("q", "").strip()
-    products = _enrich(data.get_products(search_term=term)) if term else []
-    return render_template("shop/search.html", term=term, products=products)
+    if not term:
+        return render_template("shop/search.html", term=term, products=[], next_url=None)
+    page = _page(search_term=term)
+    return stream_template("shop/search.html", term=term, products=page.products, next_url=_next_url(page))
@@ -0,0 +1,162 @@
+import hashlib
+import json
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from flask import current_app, g, request
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from . import data
+
+
+COOKIE_NAME = "cart"
+COOKIE_MAX_AGE = 30 * 24 * 60 * 60
+OPTION_FIELDS = {"size": "sizes", "colorway": "colorways", "inlay": "inlays"}
+PERSONALIZATION_FIELDS = {"engraving": 40}
+TAX_RATE = 0.06
+FLAT_SHIPPING = 8.00
+
+# A line is [product_id, quantity, options, personalization]; lists keep the signed cookie small.
+Line = list
+
+
+class PricedLine(NamedTuple):
+    key: str
+    product: data.Product
+    quantity: int
+    options: Dict[str, str]
+    personalization: Dict[str, str]
+    unit_price: float
+
+    @property
+    def total(self) -> float:
+        return round(self.unit_price * self.quantity, 2)
+
+
+class PricedCart(NamedTuple):
+    lines: List[PricedLine]
+    subtotal: float
+    tax: float
+    shipping: float
+    kept: List[Line]
+    dropped: int
+
+    @property
+    def total(self) -> float:
+        return round(self.subtotal + self.tax + self.shipping, 2)
+
+
+def _serializer() -> URLSafeSerializer:
+    return URLSafeSerializer(current_app.secret_key, salt="cart")
+
+
+def load() -> List[Line]:
+    if "cart" not in g:
+        raw = request.cookies.get(COOKIE_NAME)
+        lines: List[Line] = []
+        if raw:
+            try:
+                lines = [line for line in _serializer().loads(raw) if _valid(line)]
+            except (BadSignature, TypeError):
+                lines = []
+        g.cart = lines
+    return g.cart
+
+
+def _valid(line) -> bool:
+    return (
+        isinstance(line, list)
+        and len(line) == 4
+        and isinstance(line[0], int)
+        and isinstance(line[1], int)
+        and line[1] > 0
+        and isinstance(line[2], dict)
+        and isinstance(line[3], dict)
+    )
+
+
+def save(response, lines: List[Line]):
+    g.cart = lines
+    if not lines:
+        response.delete_cookie(COOKIE_NAME)
+        return response
+    response.set_cookie(
+        COOKIE_NAME,
+        _serializer().dumps(lines),
+        max_age=COOKIE_MAX_AGE,
+        httponly=True,
+        samesite="Lax",
+        secure=request.is_secure,
+    )
+    return response
+
+
+def cart_count() -> int:
+    return sum(line[1] for line in load())
+
+
+def line_key(line: Line) -> str:
+    identity = json.dumps([line[0], line[2], line[3]], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(identity.encode()).hexdigest()[:12]
+
+
+def options_from_form(form) -> Tuple[Dict[str, str], Dict[str, str]]:
+    options = {field: form[field] for field in OPTION_FIELDS if form.get(field)}
+    personalization = {
+        field: form[field].strip()[:limit] for field, limit in PERSONALIZATION_FIELDS.items() if form.get(field, "").strip()
+    }
+    return options, personalization
+
+
+def _clamp(quantity: int) -> int:
+    return max(0, min(quantity, current_app.config["CART_MAX_QUANTITY"]))
+
+
+def add(product_id: int, quantity: int, options: Dict[str, str], personalization: Dict[str, str]) -> List[Line]:
+    lines = [list(line) for line in load()]
+    candidate = [product_id, 0, options, personalization]
+    key = line_key(candidate)
+    for line in lines:
+        if line_key(line) == key:
+            line[1] = _clamp(line[1] + quantity)
+            return lines
+    if len(lines) >= current_app.config["CART_MAX_LINES"]:
+        raise ValueError("Your cart is full.")
+    candidate[1] = _clamp(quantity)
+    lines.append(candidate)
+    return lines
+
+
+def update(key: str, quantity: int) -> List[Line]:
+    lines = []
+    for line in load():
+        if line_key(line) == key:
+            line = [line[0], _clamp(quantity), line[2], line[3]]
+        if line[1] > 0:
+            lines.append(line)
+    return lines
+
+
+def remove(key: str) -> List[Line]:
+    return [line for line in load() if line_key(line) != key]
+
+
+def priced(lines: Optional[List[Line]] = None) -> PricedCart:
+    lines = load() if lines is None else lines
+    products = {product.id: product for product in data.get_products_by_ids(line[0] for line in lines)}
+    priced_lines: List[PricedLine] = []
+    kept: List[Line] = []
+    for line in lines:
+        product = products.get(line[0])
+        if product is None or not _options_allowed(product, line[2]):
+            continue
+        kept.append(line)
+        priced_lines.append(PricedLine(line_key(line), product, line[1], line[2], line[3], product.price))
+    subtotal = round(sum(line.total for line in priced_lines), 2)
+    tax = round(subtotal * TAX_RATE, 2)
+    shipping = FLAT_SHIPPING if priced_lines else 0.0
+    return PricedCart(priced_lines, subtotal, tax, shipping, kept, len(lines) - len(kept))
+
+
+def _options_allowed(product: data.Product, options: Dict[str, str]) -> bool:
+    values = product.option_values
+    return all(value in values.get(OPTION_FIELDS.get(field, ""), ()) for field, value in options.items())
@@ -0,0 +1,487 @@
+import csv
+import json
+import re
+import sqlite3
+import sys
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, IO, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import click
+from flask.cli import AppGroup
+
+from . import data, related
+
+
+FORMATS = ("csv", "jsonl")
+CSV_COLUMNS = (
+    "type", "slug", "name", "category", "description", "hero_image", "price", "availability",
+    "made_to_order", "limited_drop", "seasonal", "bundle_eligible", "options", "personalization", "images",
+)
+FLAGS = ("made_to_order", "limited_drop", "seasonal", "bundle_eligible")
+AVAILABILITY = ("in_stock", "made_to_order", "sold_out")
+JSON_COLUMNS = ("options", "personalization", "images")
+_SLUG = re.compile(r"^[a-z0-9][a-z0-9-]{0,119}$")
+_TRUE = {"1", "true", "yes", "y", "on"}
+_FALSE = {"", "0", "false", "no", "n", "off"}
+LEASE_WAIT_SECONDS = 60.0
+
+
+class RowError(ValueError):
+    pass
+
+
+class Category(NamedTuple):
+    slug: str
+    name: str
+    description: Optional[str]
+    hero_image: Optional[str]
+
+
+class Product(NamedTuple):
+    slug: str
+    name: str
+    category: str
+    description: Optional[str]
+    price: float
+    availability: str
+    made_to_order: int
+    limited_drop: int
+    seasonal: int
+    bundle_eligible: int
+    options: Optional[str]
+    personalization: Optional[str]
+    images: Optional[List[Tuple[str, Optional[str]]]]
+
+
+class ImportStats(NamedTuple):
+    categories: int
+    products: int
+    images: int
+    errors: int
+    seconds: float
+
+
+def _text(record: Dict[str, Any], name: str, required: bool = False) -> Optional[str]:
+    value = record.get(name)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise RowError(f"{name} is required")
+        return None
+    if not isinstance(value, str):
+        raise RowError(f"{name} must be a string")
+    return value.strip()
+
+
+def _flag(record: Dict[str, Any], name: str) -> int:
+    value = record.get(name)
+    if value is None or isinstance(value, bool):
+        return int(bool(value))
+    if isinstance(value, int) and value in (0, 1):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return 1
+    if text in _FALSE:
+        return 0
+    raise RowError(f"{name} must be true or false, got {value!r}")
+
+
+def _json_field(record: Dict[str, Any], name: str) -> Any:
+    # CSV cells carry nested values as JSON text; JSONL records carry them natively.
+    value = record.get(name)
+    if isinstance(value, str):
+        if not value.strip():
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            raise RowError(f"{name} is not valid JSON") from None
+    return value
+
+
+def _options(record: Dict[str, Any]) -> Optional[str]:
+    options = _json_field(record, "options")
+    if options is None:
+        return None
+    if not isinstance(options, dict) or not all(
+        isinstance(values, list) and all(isinstance(value, str) for value in values) for values in options.values()
+    ):
+        raise RowError("options must map option kinds to lists of strings")
+    return json.dumps(options)
+
+
+def _personalization(record: Dict[str, Any]) -> Optional[str]:
+    schema = _json_field(record, "personalization")
+    if schema is None:
+        return None
+    if not isinstance(schema, dict):
+        raise RowError("personalization must be an object")
+    return json.dumps(schema)
+
+
+def _images(record: Dict[str, Any]) -> Optional[List[Tuple[str, Optional[str]]]]:
+    images = _json_field(record, "images")
+    if images is None:
+        return None
+    if not isinstance(images, list):
+        raise RowError("images must be a list")
+    parsed = []
+    for image in images:
+        if isinstance(image, str):
+            image = {"url": image}
+        if not isinstance(image, dict) or not isinstance(image.get("url"), str) or not image["url"].strip():
+            raise RowError("each image needs a url")
+        alt = image.get("alt")
+        parsed.append((image["url"].strip(), alt if isinstance(alt, str) else None))
+    return parsed
+
+
+def _slug(record: Dict[str, Any]) -> str:
+    slug = _text(record, "slug", required=True)
+    if not _SLUG.match(slug):
+        raise RowError(f"slug {slug!r} must be lowercase letters, digits and dashes")
+    return slug
+
+
+def parse_record(record: Dict[str, Any]):
+    kind = record.get("type") or "product"
+    kind = kind.strip().lower() if isinstance(kind, str) else kind
+    if kind == "category":
+        return Category(_slug(record), _text(record, "name", required=True), _text(record, "description"), _text(record, "hero_image"))
+    if kind != "product":
+        raise RowError(f"type must be 'category' or 'product', got {record.get('type')!r}")
+    try:
+        price = float(record.get("price"))
+    except (TypeError, ValueError):
+        raise RowError(f"price must be a number, got {record.get('price')!r}") from None
+    if not 0 <= price < 1_000_000:
+        raise RowError("price must be between 0 and 1,000,000")
+    availability = _text(record, "availability") or "in_stock"
+    if availability not in AVAILABILITY:
+        raise RowError(f"availability must be one of {', '.join(AVAILABILITY)}")
+    return Product(
+        _slug(record),
+        _text(record, "name", required=True),
+        _text(record, "category", required=True),
+        _text(record, "description"),
+        round(price, 2),
+        availability,
+        *(_flag(record, flag) for flag in FLAGS),
+        _options(record),
+        _personalization(record),
+        _images(record),
+    )
+
+
+def read_records(stream: IO[str], fmt: str) -> Iterator[Tuple[int, Any]]:
+    # Yields (line number, parsed record or RowError) one row at a time, so input size never matters.
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        missing = {"slug", "name"} - set(reader.fieldnames or ())
+        if missing:
+            raise click.UsageError(f"CSV header is missing: {', '.join(sorted(missing))}")
+        for record in reader:
+            try:
+                yield reader.line_num, parse_record(record)
+            except RowError as exc:
+                yield reader.line_num, exc
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise RowError("each line must be a JSON object")
+            yield number, parse_record(record)
+        except ValueError as exc:
+            yield number, exc if isinstance(exc, RowError) else RowError(f"invalid JSON: {exc}")
+
+
+def _write_chunk(db: sqlite3.Connection, categories: List[Category], products: List[Tuple[int, Product]]) -> Tuple[List[Tuple[int, str]], int]:
+    db.executemany(
+        """
+        INSERT INTO category (slug, name, description, hero_image) VALUES (?, ?, ?, ?)
+        ON CONFLICT(slug) DO UPDATE SET
+            name = excluded.name, description = excluded.description, hero_image = excluded.hero_image
+        WHERE (name, description, hero_image) IS NOT (excluded.name, excluded.description, excluded.hero_image)
+        """,
+        categories,
+    )
+    slugs = json.dumps(sorted({product.category for _, product in products}))
+    category_ids = dict(db.execute("SELECT slug, id FROM category WHERE slug IN (SELECT value FROM json_each(?))", (slugs,)))
+    errors = [(number, f"unknown category {product.category!r}") for number, product in products if product.category not in category_ids]
+    products = [product for _, product in products if product.category in category_ids]
+
+    db.executemany(
+        """
+        INSERT INTO product (
+            slug, name, category_id, description, price, availability,
+            made_to_order, limited_drop, seasonal, bundle_eligible, options, personalization_schema
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(slug) DO UPDATE SET
+            name = excluded.name, category_id = excluded.category_id, description = excluded.description,
+            price = excluded.price, availability = excluded.availability, made_to_order = excluded.made_to_order,
+            limited_drop = excluded.limited_drop, seasonal = excluded.seasonal, bundle_eligible = excluded.bundle_eligible,
+            options = excluded.options, personalization_schema = excluded.personalization_schema
+        WHERE (name, category_id, description, price, availability, made_to_order, limited_drop, seasonal,
+               bundle_eligible, options, personalization_schema)
+            IS NOT (excluded.name, excluded.category_id, excluded.description, excluded.price, excluded.availability,
+                    excluded.made_to_order, excluded.limited_drop, excluded.seasonal, excluded.bundle_eligible,
+                    excluded.options, excluded.personalization_schema)
+        """,
+        [
+            (
+                product.slug, product.name, category_ids[product.category], product.description, product.price,
+                product.availability, product.made_to_order, product.limited_drop, product.seasonal,
+                product.bundle_eligible, product.options, product.personalization,
+            )
+            for product in products
+        ],
+    )
+
+    # Rows that list images replace the product's gallery; rows without an images value leave it alone.
+    with_images = list({product.slug: product for product in products if product.images is not None}.values())
+    if not with_images:
+        return errors, 0
+    product_ids = dict(
+        db.execute(
+            "SELECT slug, id FROM product WHERE slug IN (SELECT value FROM json_each(?))",
+            (json.dumps([product.slug for product in with_images]),),
+        )
+    )
+    current: Dict[int, List[Tuple[str, Optional[str]]]] = {}
+    for row in db.execute(
+        """
+        SELECT product_id, image_url, alt_text FROM product_image
+        WHERE product_id IN (SELECT value FROM json_each(?))
+        ORDER BY product_id, position, id
+        """,
+        (json.dumps(list(product_ids.values())),),
+    ):
+        current.setdefault(row[0], []).append((row[1], row[2]))
+    # Unchanged galleries are skipped so a re-import does not churn rows, triggers and the catalog generation.
+    changed = [product for product in with_images if current.get(product_ids[product.slug], []) != product.images]
+    db.execute(
+        "DELETE FROM product_image WHERE product_id IN (SELECT value FROM json_each(?))",
+        (json.dumps([product_ids[product.slug] for product in changed]),),
+    )
+    image_rows = [
+        (product_ids[product.slug], url, alt, position)
+        for product in changed
+        for position, (url, alt) in enumerate(product.images)
+    ]
+    db.executemany("INSERT INTO product_image (product_id, image_url, alt_text, position) VALUES (?, ?, ?, ?)", image_rows)
+    return errors, len(image_rows)
+
+
+def import_catalog(
+    db: sqlite3.Connection,
+    stream: IO[str],
+    fmt: str,
+    chunk_size: int = 2000,
+    dry_run: bool = False,
+    on_error=None,
+) -> ImportStats:
+    started = time.perf_counter()
+    counts = {"categories": 0, "products": 0, "images": 0, "errors": 0}
+    categories: List[Category] = []
+    products: List[Tuple[int, Product]] = []
+
+    def report(number: int, message: str) -> None:
+        counts["errors"] += 1
+        if on_error is not None:
+            on_error(number, message)
+
+    def flush() -> None:
+        if not categories and not products:
+            return
+        if dry_run:
+            # Inside the run-wide transaction, so later chunks see the categories earlier ones created.
+            errors, images = _write_chunk(db, categories, products)
+        else:
+            # One bounded transaction per chunk: readers keep going between chunks and a failure loses one chunk at most.
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                errors, images = _write_chunk(db, categories, products)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+        for number, message in errors:
+            report(number, message)
+        counts["categories"] += len(categories)
+        counts["products"] += len(products) - len(errors)
+        counts["images"] += images
+        categories.clear()
+        products.clear()
+
+    if dry_run:
+        # A dry run validates the whole file as one import would apply it, then rolls it all back once.
+        db.execute("BEGIN IMMEDIATE")
+    try:
+        for number, record in read_records(stream, fmt):
+            if isinstance(record, RowError):
+                report(number, str(record))
+            elif isinstance(record, Category):
+                # Products in this chunk may reference the category, so it is written with them.
+                categories.append(record)
+            else:
+                products.append((number, record))
+            if len(categories) + len(products) >= chunk_size:
+                flush()
+        flush()
+    finally:
+        if dry_run:
+            db.rollback()
+    return ImportStats(counts["categories"], counts["products"], counts["images"], counts["errors"], time.perf_counter() - started)
+
+
+def export_records(db: sqlite3.Connection, chunk_size: int = 2000) -> Iterator[Dict[str, Any]]:
+    for row in db.execute("SELECT slug, name, description, hero_image FROM category ORDER BY id"):
+        yield {"type": "category", "slug": row["slug"], "name": row["name"], "description": row["description"], "hero_image": row["hero_image"]}
+    last_id = 0
+    while True:
+        rows = db.execute(
+            """
+            SELECT p.id, p.slug, p.name, c.slug AS category, p.description, p.price, p.availability,
+                   p.made_to_order, p.limited_drop, p.seasonal, p.bundle_eligible, p.options, p.personalization_schema
+            FROM product p
+            JOIN category c ON c.id = p.category_id
+            WHERE p.id > ?
+            ORDER BY p.id
+            LIMIT ?
+            """,
+            (last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1]["id"]
+        images: Dict[int, List[Dict[str, Any]]] = {}
+        for image in db.execute(
+            """
+            SELECT product_id, image_url, alt_text FROM product_image
+            WHERE product_id BETWEEN ? AND ?
+            ORDER BY product_id, position, id
+            """,
+            (rows[0]["id"], last_id),
+        ):
+            images.setdefault(image["product_id"], []).append({"url": image["image_url"], "alt": image["alt_text"]})
+        for row in rows:
+            yield {
+                "type": "product",
+                "slug": row["slug"],
+                "name": row["name"],
+                "category": row["category"],
+                "description": row["description"],
+                "price": row["price"],
+                "availability": row["availability"],
+                **{flag: bool(row[flag]) for flag in FLAGS},
+                "options": json.loads(row["options"]) if row["options"] else None,
+                "personalization": json.loads(row["personalization_schema"]) if row["personalization_schema"] else None,
+                "images": images.get(row["id"], []),
+            }
+
+
+def write_records(records: Iterable[Dict[str, Any]], stream: IO[str], fmt: str) -> int:
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            row = dict(record)
+            for name in JSON_COLUMNS:
+                if row.get(name) is not None:
+                    row[name] = json.dumps(row[name], separators=(",", ":"))
+            for name in FLAGS:
+                if name in row:
+                    row[name] = int(row[name])
+            writer.writerow(row)
+            count += 1
+        return count
+    for record in records:
+        stream.write(json.dumps({key: value for key, value in record.items() if value is not None}, separators=(",", ":")))
+        stream.write("\n")
+        count += 1
+    return count
+
+
+def _format_for(path: str, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if path.endswith(".csv"):
+        return "csv"
+    raise click.UsageError("Cannot tell the format from the file name; pass --format csv or --format jsonl.")
+
+
+def _open(path: str, mode: str):
+    if path == "-":
+        return nullcontext(sys.stdin if mode == "r" else sys.stdout)
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+catalog_cli = AppGroup("catalog", help="Bulk import and export catalog data.")
+
+
+@catalog_cli.command("import")
+@click.argument("path")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), help="Defaults to the file extension.")
+@click.option("--chunk-size", default=2000, show_default=True, help="Rows written per transaction.")
+@click.option("--max-errors", default=100, show_default=True, help="Stop listing row errors after this many.")
+@click.option("--dry-run", is_flag=True, help="Validate and write the whole file in one transaction, then roll it back.")
+def import_command(path: str, fmt: Optional[str], chunk_size: int, max_errors: int, dry_run: bool) -> None:
+    """Upsert categories, products, images and options by slug from CSV or JSONL (use - for stdin)."""
+    fmt = _format_for(path, fmt)
+    shown = []
+
+    def on_error(number: int, message: str) -> None:
+        shown.append(number)
+        if len(shown) <= max_errors:
+            click.echo(f"row {number}: {message}", err=True)
+
+    with _open(path, "r") as stream:
+        stats = import_catalog(data.get_db(), stream, fmt, chunk_size=chunk_size, dry_run=dry_run, on_error=on_error)
+    verb = "Validated" if dry_run else "Imported"
+    click.echo(
+        f"{verb} {stats.categories} categories, {stats.products} products and {stats.images} images "
+        f"in {stats.seconds:.2f}s; {stats.errors} rows rejected."
+    )
+    if not dry_run:
+        with related.exclusive(data.get_db(), wait=LEASE_WAIT_SECONDS) as held:
+            if held:
+                click.echo(f"Refreshed {related.refresh(data.get_db())} related-product lists.")
+            else:
+                click.echo("Another process is refreshing related products; it will pick up this import.")
+    if stats.errors:
+        raise SystemExit(1)
+
+
+@catalog_cli.command("export")
+@click.argument("path", default="-")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), help="Defaults to the file extension, or jsonl for stdout.")
+def export_command(path: str, fmt: Optional[str]) -> None:
+    """Stream the catalog out in the same format `flask catalog import` reads."""
+    fmt = fmt or ("jsonl" if path == "-" else _format_for(path, None))
+    with _open(path, "w") as stream:
+        count = write_records(export_records(data.get_db(readonly=True)), stream, fmt)
+    if path != "-":
+        click.echo(f"Exported {count} records to {path}.")
+
+
+@catalog_cli.command("related")
+@click.option("--rebuild", is_flag=True, help="Recompute every list instead of only those touched by product changes.")
+def related_command(rebuild: bool) -> None:
+    """Bring the precomputed related-products table up to date."""
+    started = time.perf_counter()
+    with related.exclusive(data.get_db(), wait=LEASE_WAIT_SECONDS) as held:
+        if not held:
+            raise click.ClickException("Another process is refreshing related products; try again shortly.")
+        count = related.rebuild(data.get_db()) if rebuild else related.refresh(data.get_db())
+    click.echo(f"Refreshed {count} related-product lists in {time.perf_counter() - started:.2f}s.")
+
+
+def init_app(app) -> None:
+    app.cli.add_command(catalog_cli)
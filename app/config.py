@@ -7,3 +7,45 @@ class Config:
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
     INSTANCE_DIR = os.environ.get("FLASK_INSTANCE_PATH") or os.path.join(os.path.dirname(BASE_DIR), "instance")
     DATABASE_PATH = os.environ.get("DATABASE_PATH") or os.path.join(INSTANCE_DIR, "sams_nik_naks.db")
+    AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "1" if DEBUG else "0") == "1"
+    DATABASE_POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", 8))
+    DATABASE_MMAP_SIZE = int(os.environ.get("DATABASE_MMAP_SIZE", 256 * 1024 * 1024))
+    DATABASE_CACHE_SIZE_KIB = int(os.environ.get("DATABASE_CACHE_SIZE_KIB", 16384))
+    DATABASE_STATEMENT_CACHE = int(os.environ.get("DATABASE_STATEMENT_CACHE", 512))
+    CATALOG_CACHE_ENTRIES = int(os.environ.get("CATALOG_CACHE_ENTRIES", 256))
+    CATALOG_CACHE_ROWS = int(os.environ.get("CATALOG_CACHE_ROWS", 50000))
+    PRODUCTS_PAGE_SIZE = int(os.environ.get("PRODUCTS_PAGE_SIZE", 24))
+    API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", 100))
+    CART_MAX_LINES = int(os.environ.get("CART_MAX_LINES", 50))
+    CART_MAX_QUANTITY = int(os.environ.get("CART_MAX_QUANTITY", 20))
+    ORDER_QUEUE_SIZE = int(os.environ.get("ORDER_QUEUE_SIZE", 256))
+    ORDER_BATCH_SIZE = int(os.environ.get("ORDER_BATCH_SIZE", 64))
+    ORDER_BATCH_WAIT_MS = float(os.environ.get("ORDER_BATCH_WAIT_MS", 5))
+    ORDER_SUBMIT_TIMEOUT = float(os.environ.get("ORDER_SUBMIT_TIMEOUT", 10))
+    STOCK_HOLD_SECONDS = float(os.environ.get("STOCK_HOLD_SECONDS", 900))
+    STOCK_HOLD_SWEEP_SECONDS = float(os.environ.get("STOCK_HOLD_SWEEP_SECONDS", 30))
+    CUSTOM_UPLOAD_DIR = os.environ.get("CUSTOM_UPLOAD_DIR") or os.path.join(INSTANCE_DIR, "uploads")
+    CUSTOM_UPLOAD_MAX_FILES = int(os.environ.get("CUSTOM_UPLOAD_MAX_FILES", 8))
+    CUSTOM_UPLOAD_MAX_FILE_BYTES = int(os.environ.get("CUSTOM_UPLOAD_MAX_FILE_BYTES", 25 * 1024 * 1024))
+    CUSTOM_UPLOAD_MAX_BYTES = int(os.environ.get("CUSTOM_UPLOAD_MAX_BYTES", 120 * 1024 * 1024))
+    CUSTOM_UPLOAD_WORKERS = int(os.environ.get("CUSTOM_UPLOAD_WORKERS", 2))
+    IMAGE_ORIGINALS_DIR = os.environ.get("IMAGE_ORIGINALS_DIR") or os.path.join(INSTANCE_DIR, "images", "originals")
+    IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR") or os.path.join(INSTANCE_DIR, "images", "derived")
+    IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get("FRAGMENT_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+    FRAGMENT_CACHE_DIR = os.environ.get("FRAGMENT_CACHE_DIR", "")
+    FRAGMENT_CACHE_DISK_MAX_BYTES = int(os.environ.get("FRAGMENT_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+    MEDIA_DIR = os.environ.get("MEDIA_DIR") or os.path.join(INSTANCE_DIR, "media")
+    MEDIA_MAX_AGE = int(os.environ.get("MEDIA_MAX_AGE", 86400))
+    SQL_INSTRUMENTATION = os.environ.get("SQL_INSTRUMENTATION", "0") == "1"
+    SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 50))
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+    RELATED_REFRESH_SECONDS = float(os.environ.get("RELATED_REFRESH_SECONDS", 30))
+    SERVER_BIND = os.environ.get("SERVER_BIND", "0.0.0.0:8000")
+    SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", 2 * (os.cpu_count() or 1) + 1))
+    SERVER_THREADS = int(os.environ.get("SERVER_THREADS", 4))
+    SERVER_PRELOAD = os.environ.get("SERVER_PRELOAD", "1") == "1"
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get("SERVER_GRACEFUL_TIMEOUT", 30))
+    CATALOG_RELOAD_SECONDS = float(os.environ.get("CATALOG_RELOAD_SECONDS", 30))
+    HTTP_CACHE_STATIC_MAX_AGE = int(os.environ.get("HTTP_CACHE_STATIC_MAX_AGE", 3600))
+    TAILWIND_COMMAND = os.environ.get("TAILWIND_COMMAND", "npx tailwindcss@3")
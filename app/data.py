@@ -1,38 +1,368 @@
+import base64
+import hashlib
 import json
 import os
+import re
+import secrets
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
 
+import click
 from flask import current_app, g
+from flask.cli import AppGroup
 
 
-SCHEMA_VERSION = 2
+CATALOG_TABLES = ("category", "product", "product_image", "city_page", "video", "review")
 
+SEARCH_WEIGHTS = (10.0, 1.0, 4.0, 2.0)
 
-def get_db() -> sqlite3.Connection:
-    if "db" not in g:
-        database_path = current_app.config["DATABASE_PATH"]
-        Path(os.path.dirname(database_path)).mkdir(parents=True, exist_ok=True)
-        g.db = sqlite3.connect(database_path)
-        g.db.row_factory = sqlite3.Row
-    return g.db
+LISTING_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS product_listing_key_idx ON product (listing_key)",
+    "CREATE INDEX IF NOT EXISTS product_category_listing_key_idx ON product (category_id, listing_key)",
+    "CREATE INDEX IF NOT EXISTS product_limited_listing_key_idx ON product (limited_drop, listing_key)",
+    "CREATE INDEX IF NOT EXISTS product_seasonal_listing_key_idx ON product (seasonal, listing_key)",
+)
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS product_listing_idx ON product (limited_drop DESC, seasonal DESC, name)",
+    "CREATE INDEX IF NOT EXISTS product_category_listing_idx ON product (category_id, limited_drop DESC, seasonal DESC, name)",
+    "CREATE INDEX IF NOT EXISTS product_image_product_idx ON product_image (product_id, position, id)",
+    "CREATE INDEX IF NOT EXISTS category_name_idx ON category (name)",
+    "CREATE INDEX IF NOT EXISTS video_category_idx ON video (category, title)",
+)
+
+_OPTION_VALUES = """
+    SELECT {product}.id, kinds.key, CAST(items.value AS TEXT), items.key
+    FROM {source}json_each(CASE WHEN json_valid({product}.options) THEN {product}.options END) AS kinds,
+         json_each(kinds.value) AS items
+    WHERE kinds.type = 'array'
+"""
+
+PRODUCT_CHANGE_RETENTION = 100000
+
+PLACEHOLDER_IMAGE = "https://images.unsplash.com/photo-1512446816042-444d641267d4?auto=format&fit=crop&w=900&q=80"
+
+_PERSONALIZATION_TERMS = """
+    trim(
+        coalesce((SELECT group_concat(value, ' ') FROM json_each(CASE WHEN json_valid({schema}) THEN {schema} END, '$.colorways')), '')
+        || ' ' ||
+        coalesce((SELECT group_concat(value, ' ') FROM json_each(CASE WHEN json_valid({schema}) THEN {schema} END, '$.inlays')), '')
+    )
+"""
+
+
+class CatalogCache:
+    def __init__(self, max_entries: int = 256, max_rows: int = 50000) -> None:
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.generation: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def get(self, generation: int, key: Hashable, loader: Callable[[], Any], rows: Optional[Callable[[Any], int]] = None) -> Any:
+        with self._lock:
+            if generation != self.generation:
+                self._reset(generation)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        value = loader()
+        if rows is not None:
+            size = rows(value)
+        else:
+            size = len(value) if hasattr(value, "__len__") else 1
+        with self._lock:
+            if generation == self.generation and size <= self.max_rows:
+                if key not in self._entries:
+                    self._entries[key] = (value, size)
+                    self._rows += size
+                    self._evict()
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset(None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "generation": self.generation,
+                "entries": len(self._entries),
+                "rows": self._rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _reset(self, generation: Optional[int]) -> None:
+        self._entries.clear()
+        self._rows = 0
+        self.generation = generation
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._rows > self.max_rows):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._rows -= size
+            self.evictions += 1
+
+
+def _decode_json(raw: Optional[str]) -> dict:
+    if not raw:
+        return {}
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+class Product:
+    FIELDS = (
+        "id",
+        "slug",
+        "name",
+        "category_id",
+        "category_slug",
+        "category_name",
+        "description",
+        "price",
+        "made_to_order",
+        "limited_drop",
+        "seasonal",
+        "bundle_eligible",
+        "availability",
+        "personalization_schema",
+        "options",
+    )
+
+    __slots__ = FIELDS + ("images", "_personalization", "_options", "_version")
+
+    def __init__(self, row: sqlite3.Row, images: Iterable[sqlite3.Row] = ()) -> None:
+        for field in self.FIELDS:
+            setattr(self, field, row[field])
+        self.images = tuple(images)
+        self._personalization: Optional[dict] = None
+        self._options: Optional[dict] = None
+        self._version: Optional[str] = None
+
+    @property
+    def version(self) -> str:
+        # A digest of everything a template can read from the record, stable across processes.
+        if self._version is None:
+            fields = [getattr(self, field) for field in self.FIELDS]
+            images = [tuple(image) for image in self.images]
+            self._version = hashlib.blake2b(repr((fields, images)).encode(), digest_size=8).hexdigest()
+        return self._version
+
+    @property
+    def hero_image(self) -> str:
+        return self.images[0]["image_url"] if self.images else PLACEHOLDER_IMAGE
+
+    @property
+    def personalization(self) -> dict:
+        if self._personalization is None:
+            self._personalization = _decode_json(self.personalization_schema)
+        return self._personalization
+
+    @property
+    def option_values(self) -> dict:
+        if self._options is None:
+            self._options = _decode_json(self.options)
+        return self._options
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.FIELDS
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __repr__(self) -> str:
+        return f"<Product {self.slug}>"
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        database_path: str,
+        max_idle: int = 8,
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_size_kib: int = 16384,
+        cached_statements: int = 512,
+        busy_timeout: float = 5.0,
+        factory: type = sqlite3.Connection,
+    ) -> None:
+        self.database_path = database_path
+        self.max_idle = max_idle
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.cached_statements = cached_statements
+        self.busy_timeout = busy_timeout
+        self.factory = factory
+        self._idle: Dict[bool, List[sqlite3.Connection]] = {False: [], True: []}
+        self._in_use = 0
+        self._counters = {"created": 0, "reused": 0, "discarded": 0}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def acquire(self, readonly: bool = False) -> sqlite3.Connection:
+        with self._lock:
+            idle = self._idle[readonly]
+            preferred = getattr(self._local, "last", {}).get(readonly)
+            if preferred is not None and preferred in idle:
+                idle.remove(preferred)
+                db = preferred
+            elif idle:
+                db = idle.pop()
+            else:
+                db = None
+            self._in_use += 1
+            if db is not None:
+                self._counters["reused"] += 1
+                return db
+        try:
+            db = self._connect(readonly)
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+            raise
+        with self._lock:
+            self._counters["created"] += 1
+        return db
+
+    def release(self, db: sqlite3.Connection, readonly: bool = False) -> None:
+        if db.in_transaction:
+            db.rollback()
+        if not hasattr(self._local, "last"):
+            self._local.last = {}
+        self._local.last[readonly] = db
+        with self._lock:
+            self._in_use -= 1
+            idle = self._idle[readonly]
+            if len(idle) < self.max_idle:
+                idle.append(db)
+                return
+            self._counters["discarded"] += 1
+        db.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            connections = self._idle[False] + self._idle[True]
+            self._idle = {False: [], True: []}
+        for db in connections:
+            db.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                **self._counters,
+                "in_use": self._in_use,
+                "idle": len(self._idle[False]),
+                "idle_readonly": len(self._idle[True]),
+            }
+
+    def _connect(self, readonly: bool) -> sqlite3.Connection:
+        if readonly:
+            uri = Path(self.database_path).resolve().as_uri() + "?mode=ro"
+            db = sqlite3.connect(
+                uri,
+                uri=True,
+                timeout=self.busy_timeout,
+                cached_statements=self.cached_statements,
+                check_same_thread=False,
+                factory=self.factory,
+            )
+        else:
+            Path(os.path.dirname(self.database_path)).mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(
+                self.database_path,
+                timeout=self.busy_timeout,
+                cached_statements=self.cached_statements,
+                check_same_thread=False,
+                factory=self.factory,
+            )
+            db.execute("PRAGMA journal_mode = WAL")
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA synchronous = NORMAL")
+        db.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        db.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        db.execute("PRAGMA temp_store = MEMORY")
+        if readonly:
+            db.execute("PRAGMA query_only = ON")
+        return db
+
+
+def get_db(readonly: bool = False) -> sqlite3.Connection:
+    key = "read_db" if readonly else "db"
+    if key not in g:
+        pool: ConnectionPool = current_app.extensions["db_pool"]
+        setattr(g, key, pool.acquire(readonly=readonly))
+    return g.get(key)
+
+
+def _reader() -> sqlite3.Connection:
+    # Reads follow any writes already made on this context's read-write connection.
+    return g.db if "db" in g else get_db(readonly=True)
 
 
 def close_db(_=None) -> None:
+    pool: ConnectionPool = current_app.extensions["db_pool"]
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        pool.release(db)
+    read_db = g.pop("read_db", None)
+    if read_db is not None:
+        pool.release(read_db, readonly=True)
+
+
+def pool_stats() -> Dict[str, int]:
+    return current_app.extensions["db_pool"].stats()
 
 
 def init_app(app) -> None:
+    app.extensions["db_pool"] = ConnectionPool(
+        app.config["DATABASE_PATH"],
+        max_idle=app.config["DATABASE_POOL_SIZE"],
+        mmap_size=app.config["DATABASE_MMAP_SIZE"],
+        cache_size_kib=app.config["DATABASE_CACHE_SIZE_KIB"],
+        cached_statements=app.config["DATABASE_STATEMENT_CACHE"],
+    )
+    app.extensions["catalog_cache"] = CatalogCache(
+        max_entries=app.config["CATALOG_CACHE_ENTRIES"],
+        max_rows=app.config["CATALOG_CACHE_ROWS"],
+    )
+    app.extensions["hold_sweeper"] = HoldSweeper(app.extensions["db_pool"], app.config["STOCK_HOLD_SWEEP_SECONDS"])
     app.teardown_appcontext(close_db)
+    app.cli.add_command(db_cli)
     with app.app_context():
-        initialize()
+        if app.config["AUTO_MIGRATE"]:
+            upgrade()
+        else:
+            version = schema_version(get_db())
+            if version != SCHEMA_VERSION:
+                app.logger.warning(
+                    "Database schema is at version %s, expected %s; run `flask db upgrade`.", version, SCHEMA_VERSION
+                )
 
 
-def initialize() -> None:
-    db = get_db()
+def _migrate_initial_schema(db: sqlite3.Connection) -> None:
     db.execute(
         """
         CREATE TABLE IF NOT EXISTS meta (
@@ -119,36 +449,440 @@ def initialize() -> None:
         """
     )
 
-    version = db.execute("SELECT value FROM meta WHERE key='schema_version'").fetchone()
-    if not version:
-        seed(db)
-        db.execute(
-            "INSERT INTO meta (key, value) VALUES (?, ?)",
-            ("schema_version", str(SCHEMA_VERSION)),
+
+def _migrate_catalog_generation(db: sqlite3.Connection) -> None:
+    db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('catalog_generation', '0')")
+    for table in CATALOG_TABLES:
+        for operation in ("INSERT", "UPDATE", "DELETE"):
+            db.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_{operation.lower()}_generation
+                AFTER {operation} ON {table}
+                BEGIN
+                    UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'catalog_generation';
+                END
+                """
+            )
+
+
+def _migrate_search_index(db: sqlite3.Connection) -> None:
+    db.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+            name,
+            description,
+            category_name,
+            personalization,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
         )
-        db.commit()
-    elif int(version["value"]) != SCHEMA_VERSION:
-        reset(db)
-        seed(db)
-        db.execute(
-            "UPDATE meta SET value = ? WHERE key='schema_version'",
-            (str(SCHEMA_VERSION),),
+        """
+    )
+    new_terms = _PERSONALIZATION_TERMS.format(schema="NEW.personalization_schema")
+    db.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product
+        BEGIN
+            INSERT INTO product_fts (rowid, name, description, category_name, personalization)
+            VALUES (
+                NEW.id,
+                NEW.name,
+                NEW.description,
+                (SELECT name FROM category WHERE id = NEW.category_id),
+                {new_terms}
+            );
+        END
+        """
+    )
+    db.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS product_fts_update AFTER UPDATE ON product
+        BEGIN
+            DELETE FROM product_fts WHERE rowid = OLD.id;
+            INSERT INTO product_fts (rowid, name, description, category_name, personalization)
+            VALUES (
+                NEW.id,
+                NEW.name,
+                NEW.description,
+                (SELECT name FROM category WHERE id = NEW.category_id),
+                {new_terms}
+            );
+        END
+        """
+    )
+    db.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product
+        BEGIN
+            DELETE FROM product_fts WHERE rowid = OLD.id;
+        END
+        """
+    )
+    db.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS category_fts_update AFTER UPDATE OF name ON category
+        BEGIN
+            UPDATE product_fts SET category_name = NEW.name
+            WHERE rowid IN (SELECT id FROM product WHERE category_id = NEW.id);
+        END
+        """
+    )
+    rebuild_search_index(db)
+
+
+def _migrate_listing_indexes(db: sqlite3.Connection) -> None:
+    for statement in INDEXES:
+        db.execute(statement)
+
+
+def _migrate_option_values(db: sqlite3.Connection) -> None:
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS product_option_value (
+            product_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            value TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (product_id, kind, position),
+            FOREIGN KEY(product_id) REFERENCES product(id)
+        ) WITHOUT ROWID
+        """
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS product_option_value_lookup_idx ON product_option_value (kind, value, product_id)")
+    new_values = _OPTION_VALUES.format(product="NEW", source="")
+    db.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS product_option_value_insert AFTER INSERT ON product
+        BEGIN
+            INSERT INTO product_option_value (product_id, kind, value, position) {new_values};
+        END
+        """
+    )
+    db.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS product_option_value_update AFTER UPDATE OF options ON product
+        BEGIN
+            DELETE FROM product_option_value WHERE product_id = OLD.id;
+            INSERT INTO product_option_value (product_id, kind, value, position) {new_values};
+        END
+        """
+    )
+    db.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS product_option_value_delete AFTER DELETE ON product
+        BEGIN
+            DELETE FROM product_option_value WHERE product_id = OLD.id;
+        END
+        """
+    )
+    db.execute("DELETE FROM product_option_value")
+    values = _OPTION_VALUES.format(product="p", source="product AS p, ")
+    db.execute(f"INSERT INTO product_option_value (product_id, kind, value, position) {values}")
+
+
+def _migrate_catalog_modified_at(db: sqlite3.Connection) -> None:
+    db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('catalog_modified_at', CAST(strftime('%s', 'now') AS TEXT))")
+    for table in CATALOG_TABLES:
+        for operation in ("INSERT", "UPDATE", "DELETE"):
+            db.execute(f"DROP TRIGGER IF EXISTS {table}_{operation.lower()}_generation")
+            db.execute(
+                f"""
+                CREATE TRIGGER {table}_{operation.lower()}_generation
+                AFTER {operation} ON {table}
+                BEGIN
+                    UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'catalog_generation';
+                    UPDATE meta SET value = CAST(strftime('%s', 'now') AS TEXT) WHERE key = 'catalog_modified_at';
+                END
+                """
+            )
+
+
+def _migrate_listing_key(db: sqlite3.Connection) -> None:
+    # One sortable key for (limited_drop DESC, seasonal DESC, name) so keyset pages can seek with a row value.
+    db.execute(
+        """
+        ALTER TABLE product ADD COLUMN listing_key TEXT GENERATED ALWAYS AS (
+            (CASE WHEN limited_drop THEN '0' ELSE '1' END) || (CASE WHEN seasonal THEN '0' ELSE '1' END) || name
+        ) VIRTUAL
+        """
+    )
+    db.execute("DROP INDEX IF EXISTS product_listing_idx")
+    db.execute("DROP INDEX IF EXISTS product_category_listing_idx")
+    for statement in LISTING_INDEXES:
+        db.execute(statement)
+
+
+def _migrate_product_change_log(db: sqlite3.Connection) -> None:
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS product_change (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL
         )
-        db.commit()
+        """
+    )
+    db.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS product_change_prune AFTER INSERT ON product_change
+        BEGIN
+            DELETE FROM product_change WHERE seq <= NEW.seq - {PRODUCT_CHANGE_RETENTION};
+        END
+        """
+    )
+    db.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS product_change_insert AFTER INSERT ON product
+        BEGIN
+            INSERT INTO product_change (product_id) VALUES (NEW.id);
+        END
+        """
+    )
+    db.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS product_change_update AFTER UPDATE ON product
+        BEGIN
+            INSERT INTO product_change (product_id) VALUES (NEW.id);
+            INSERT INTO product_change (product_id) SELECT OLD.id WHERE OLD.id != NEW.id;
+        END
+        """
+    )
+    db.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS product_change_delete AFTER DELETE ON product
+        BEGIN
+            INSERT INTO product_change (product_id) VALUES (OLD.id);
+        END
+        """
+    )
 
 
-def reset(db: sqlite3.Connection) -> None:
-    tables = [
-        "video",
-        "city_page",
-        "review",
-        "product_image",
-        "product",
-        "category",
-    ]
-    for table in tables:
-        db.execute(f"DELETE FROM {table}")
-        db.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+def _migrate_orders(db: sqlite3.Connection) -> None:
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS customer_order (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL,
+            phone TEXT,
+            notes TEXT,
+            address TEXT NOT NULL,
+            city TEXT NOT NULL,
+            zip TEXT NOT NULL,
+            state TEXT NOT NULL,
+            subtotal REAL NOT NULL,
+            tax REAL NOT NULL,
+            shipping REAL NOT NULL,
+            total REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        )
+        """
+    )
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS order_line (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            product_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            unit_price REAL NOT NULL,
+            options TEXT,
+            personalization TEXT,
+            FOREIGN KEY(order_id) REFERENCES customer_order(id)
+        )
+        """
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS order_line_order_idx ON order_line (order_id)")
+
+
+def _migrate_inventory(db: sqlite3.Connection) -> None:
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS inventory (
+            product_id INTEGER NOT NULL,
+            variant TEXT NOT NULL DEFAULT '',
+            on_hand INTEGER NOT NULL CHECK (on_hand >= 0),
+            reserved INTEGER NOT NULL DEFAULT 0 CHECK (reserved >= 0 AND reserved <= on_hand),
+            PRIMARY KEY (product_id, variant),
+            FOREIGN KEY(product_id) REFERENCES product(id)
+        ) WITHOUT ROWID
+        """
+    )
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stock_hold (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            variant TEXT NOT NULL,
+            quantity INTEGER NOT NULL CHECK (quantity > 0),
+            expires_at REAL NOT NULL
+        )
+        """
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS stock_hold_token_idx ON stock_hold (token)")
+    db.execute("CREATE INDEX IF NOT EXISTS stock_hold_expiry_idx ON stock_hold (expires_at)")
+
+
+def _migrate_custom_requests(db: sqlite3.Connection) -> None:
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS custom_request (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            deadline TEXT,
+            budget TEXT,
+            notes TEXT,
+            created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        )
+        """
+    )
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS custom_request_asset (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER NOT NULL,
+            original_name TEXT,
+            stored_name TEXT NOT NULL UNIQUE,
+            content_type TEXT,
+            size INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            thumbnail_name TEXT,
+            preview_name TEXT,
+            width INTEGER,
+            height INTEGER,
+            FOREIGN KEY(request_id) REFERENCES custom_request(id)
+        )
+        """
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS custom_request_asset_request_idx ON custom_request_asset (request_id)")
+
+
+def _migrate_related_products(db: sqlite3.Connection) -> None:
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS related_product (
+            product_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            related_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (product_id, rank)
+        ) WITHOUT ROWID
+        """
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS related_product_related_idx ON related_product (related_id)")
+    # Where each list was computed from, so a product that moves can also refresh its old neighbours.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS related_source (
+            product_id INTEGER PRIMARY KEY,
+            category_id INTEGER NOT NULL,
+            price REAL NOT NULL
+        )
+        """
+    )
+    # 0 means "never computed": the first refresh rebuilds the whole table.
+    db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('related_change_seq', '0')")
+
+
+def _migrate_order_idempotency(db: sqlite3.Connection) -> None:
+    # A checkout retried after a timeout carries the same key, so it finds the order instead of placing it twice.
+    db.execute("ALTER TABLE customer_order ADD COLUMN idempotency_key TEXT")
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS customer_order_idempotency_idx ON customer_order (idempotency_key)")
+
+
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (2, _migrate_initial_schema),
+    (3, _migrate_catalog_generation),
+    (4, _migrate_search_index),
+    (5, _migrate_listing_indexes),
+    (6, _migrate_option_values),
+    (7, _migrate_catalog_modified_at),
+    (8, _migrate_listing_key),
+    (9, _migrate_product_change_log),
+    (10, _migrate_orders),
+    (11, _migrate_inventory),
+    (12, _migrate_custom_requests),
+    (13, _migrate_related_products),
+    (14, _migrate_order_idempotency),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(db: sqlite3.Connection) -> int:
+    try:
+        row = db.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def upgrade() -> List[int]:
+    db = get_db()
+    starting_version = schema_version(db)
+    applied: List[int] = []
+    for version, migration in MIGRATIONS:
+        if version <= starting_version:
+            continue
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have applied this step while we waited for the write lock.
+            if schema_version(db) < version:
+                migration(db)
+                db.execute(
+                    """
+                    INSERT INTO meta (key, value) VALUES ('schema_version', ?)
+                    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+                    """,
+                    (str(version),),
+                )
+                applied.append(version)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    if starting_version == 0 and applied:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            seed(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    return applied
+
+
+db_cli = AppGroup("db", help="Manage the catalog database.")
+
+
+@db_cli.command("upgrade")
+def upgrade_command() -> None:
+    applied = upgrade()
+    if applied:
+        click.echo(f"Applied migrations: {', '.join(str(version) for version in applied)}")
+    click.echo(f"Schema is at version {SCHEMA_VERSION}.")
+
+
+def rebuild_search_index(db: sqlite3.Connection) -> None:
+    terms = _PERSONALIZATION_TERMS.format(schema="p.personalization_schema")
+    db.execute("DELETE FROM product_fts")
+    db.execute(
+        f"""
+        INSERT INTO product_fts (rowid, name, description, category_name, personalization)
+        SELECT p.id, p.name, p.description, c.name, {terms}
+        FROM product p
+        JOIN category c ON p.category_id = c.id
+        """
+    )
+
+
+def search_query(term: str) -> Optional[str]:
+    tokens = re.findall(r"\w+", term)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
 
 
 def seed(db: sqlite3.Connection) -> None:
@@ -363,19 +1097,52 @@ def seed(db: sqlite3.Connection) -> None:
         videos,
     )
 
-    db.commit()
-
 
 def _query(sql: str, params: Iterable = ()):  # helper
-    db = get_db()
+    db = _reader()
     cur = db.execute(sql, params)
     rows = cur.fetchall()
     cur.close()
     return rows
 
 
+def _load_catalog_state() -> None:
+    rows = _reader().execute(
+        "SELECT key, value FROM meta WHERE key IN ('catalog_generation', 'catalog_modified_at')"
+    ).fetchall()
+    state = {row["key"]: int(row["value"]) for row in rows}
+    g.catalog_generation = state.get("catalog_generation", 0)
+    g.catalog_modified_at = state.get("catalog_modified_at", 0)
+
+
+def catalog_generation() -> int:
+    if "catalog_generation" not in g:
+        _load_catalog_state()
+    return g.catalog_generation
+
+
+def catalog_modified_at() -> int:
+    if "catalog_modified_at" not in g:
+        _load_catalog_state()
+    return g.catalog_modified_at
+
+
+def invalidate_catalog() -> None:
+    g.pop("catalog_generation", None)
+    g.pop("catalog_modified_at", None)
+
+
+def catalog_cache_stats() -> Dict[str, Any]:
+    return current_app.extensions["catalog_cache"].stats()
+
+
+def _cached(key: Hashable, loader: Callable[[], Any], rows: Optional[Callable[[Any], int]] = None) -> Any:
+    cache: CatalogCache = current_app.extensions["catalog_cache"]
+    return cache.get(catalog_generation(), key, loader, rows)
+
+
 def get_categories() -> List[sqlite3.Row]:
-    return _query("SELECT * FROM category ORDER BY name")
+    return list(_cached(("categories",), lambda: _query("SELECT * FROM category ORDER BY name")))
 
 
 def get_category_by_slug(slug: str) -> Optional[sqlite3.Row]:
@@ -383,29 +1150,128 @@ def get_category_by_slug(slug: str) -> Optional[sqlite3.Row]:
     return rows[0] if rows else None
 
 
-def get_products(category_slug: Optional[str] = None, limited: Optional[bool] = None, search_term: Optional[str] = None) -> List[sqlite3.Row]:
-    sql = [
-        "SELECT p.*, c.slug as category_slug, c.name as category_name FROM product p",
-        "JOIN category c ON p.category_id = c.id",
-        "WHERE 1=1",
-    ]
+class ProductPage:
+    __slots__ = ("products", "next_cursor")
+
+    def __init__(self, products: List[Product], next_cursor: Optional[str]) -> None:
+        self.products = products
+        self.next_cursor = next_cursor
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+
+def _products_from_rows(rows: List[sqlite3.Row]) -> List[Product]:
+    images_by_product = get_product_images_bulk(row["id"] for row in rows)
+    return [Product(row, images_by_product[row["id"]]) for row in rows]
+
+
+def get_products(
+    category_slug: Optional[str] = None,
+    limited: Optional[bool] = None,
+    search_term: Optional[str] = None,
+    seasonal: Optional[bool] = None,
+) -> List[Product]:
+    key = ("products", category_slug, limited, search_term, seasonal)
+    return list(_cached(key, lambda: _load_products(category_slug, limited, search_term, seasonal).products))
+
+
+def get_products_page(
+    category_slug: Optional[str] = None,
+    limited: Optional[bool] = None,
+    search_term: Optional[str] = None,
+    seasonal: Optional[bool] = None,
+    after: Optional[str] = None,
+    limit: int = 24,
+) -> ProductPage:
+    position = decode_cursor(after) if after else None
+    key = ("products_page", category_slug, limited, search_term, seasonal, after, limit)
+    return _cached(key, lambda: _load_products(category_slug, limited, search_term, seasonal, position, limit))
+
+
+def encode_cursor(position: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+    if not isinstance(position, list) or not position:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return position
+
+
+def _load_products(
+    category_slug: Optional[str],
+    limited: Optional[bool],
+    search_term: Optional[str],
+    seasonal: Optional[bool],
+    position: Optional[list] = None,
+    limit: Optional[int] = None,
+) -> ProductPage:
     params: List = []
+    if search_term:
+        match = search_query(search_term)
+        if match is None:
+            return ProductPage([], None)
+        sql = [
+            "SELECT p.*, c.slug as category_slug, c.name as category_name FROM product_fts f",
+            "JOIN product p ON p.id = f.rowid",
+            "JOIN category c ON p.category_id = c.id",
+            "WHERE product_fts MATCH ?",
+        ]
+        params.append(match)
+    else:
+        sql = [
+            "SELECT p.*, c.slug as category_slug, c.name as category_name FROM product p",
+            "JOIN category c ON p.category_id = c.id",
+            "WHERE 1=1",
+        ]
     if category_slug and category_slug != "all":
         sql.append("AND c.slug = ?")
         params.append(category_slug)
     if limited is not None:
         sql.append("AND p.limited_drop = ?")
         params.append(1 if limited else 0)
+    if seasonal is not None:
+        sql.append("AND p.seasonal = ?")
+        params.append(1 if seasonal else 0)
+
+    offset = 0
     if search_term:
-        sql.append("AND (p.name LIKE ? OR p.description LIKE ?)")
-        like = f"%{search_term}%"
-        params.extend([like, like])
-    sql.append("ORDER BY p.limited_drop DESC, p.seasonal DESC, p.name")
+        # Relevance ranks are computed per query, so search pages are addressed by offset.
+        if position is not None:
+            offset = int(position[0])
+        weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+        sql.append(f"ORDER BY bm25(product_fts, {weights}), p.name")
+    else:
+        if position is not None:
+            if len(position) != 2:
+                raise ValueError(f"Invalid cursor position: {position!r}")
+            sql.append("AND (p.listing_key, p.id) > (?, ?)")
+            params.extend(position)
+        sql.append("ORDER BY p.listing_key, p.id")
+    if limit is not None:
+        sql.append("LIMIT ? OFFSET ?")
+        params.extend([limit + 1, offset])
     query = "\n".join(sql)
-    return _query(query, params)
+    rows = _query(query, params)
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([offset + limit] if search_term else [last["listing_key"], last["id"]])
+    return ProductPage(_products_from_rows(rows), next_cursor)
+
+
+def get_product_by_slug(slug: str) -> Optional[Product]:
+    return _cached(("product", slug), lambda: _load_product_by_slug(slug))
 
 
-def get_product_by_slug(slug: str) -> Optional[sqlite3.Row]:
+def _load_product_by_slug(slug: str) -> Optional[Product]:
     rows = _query(
         """
         SELECT p.*, c.slug AS category_slug, c.name AS category_name
@@ -415,7 +1281,7 @@ def get_product_by_slug(slug: str) -> Optional[sqlite3.Row]:
         """,
         (slug,),
     )
-    return rows[0] if rows else None
+    return Product(rows[0], get_product_images(rows[0]["id"])) if rows else None
 
 
 def get_product_images(product_id: int) -> List[sqlite3.Row]:
@@ -425,6 +1291,119 @@ def get_product_images(product_id: int) -> List[sqlite3.Row]:
     )
 
 
+def get_products_by_ids(product_ids: Iterable[int]) -> List[Product]:
+    ids = list(dict.fromkeys(product_ids))
+    if not ids:
+        return []
+    rows = _query(
+        """
+        SELECT p.*, c.slug AS category_slug, c.name AS category_name
+        FROM product p
+        JOIN category c ON p.category_id = c.id
+        WHERE p.id IN (SELECT value FROM json_each(?))
+        """,
+        (json.dumps(ids),),
+    )
+    by_id = {row["id"]: row for row in rows}
+    return _products_from_rows([by_id[product_id] for product_id in ids if product_id in by_id])
+
+
+def get_products_by_slugs(slugs: Iterable[str]) -> List[Product]:
+    wanted = list(dict.fromkeys(slugs))
+    if not wanted:
+        return []
+    rows = _query(
+        """
+        SELECT p.*, c.slug AS category_slug, c.name AS category_name
+        FROM product p
+        JOIN category c ON p.category_id = c.id
+        WHERE p.slug IN (SELECT value FROM json_each(?))
+        """,
+        (json.dumps(wanted),),
+    )
+    by_slug = {row["slug"]: row for row in rows}
+    return _products_from_rows([by_slug[slug] for slug in wanted if slug in by_slug])
+
+
+def get_related_products(product_id: int, limit: int = 3) -> List[Product]:
+    def load() -> List[Product]:
+        rows = _query(
+            """
+            SELECT p.*, c.slug AS category_slug, c.name AS category_name
+            FROM related_product r
+            JOIN product p ON p.id = r.related_id
+            JOIN category c ON p.category_id = c.id
+            WHERE r.product_id = ?
+            ORDER BY r.rank
+            LIMIT ?
+            """,
+            (product_id, limit),
+        )
+        return _products_from_rows(rows)
+
+    return list(_cached(("related", product_id, limit), load))
+
+
+def get_facet_rows(product_ids: Optional[Iterable[int]] = None) -> List[sqlite3.Row]:
+    sql = """
+        SELECT id, category_id, limited_drop, seasonal, made_to_order, bundle_eligible, availability, price, listing_key
+        FROM product
+    """
+    if product_ids is None:
+        return _query(sql)
+    return _query(sql + " WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(list(product_ids)),))
+
+
+def get_option_rows(product_ids: Optional[Iterable[int]] = None) -> List[sqlite3.Row]:
+    sql = "SELECT product_id, kind, value FROM product_option_value"
+    if product_ids is None:
+        return _query(sql)
+    return _query(sql + " WHERE product_id IN (SELECT value FROM json_each(?))", (json.dumps(list(product_ids)),))
+
+
+def get_product_change_window() -> Tuple[int, int]:
+    row = _query(
+        """
+        SELECT COALESCE((SELECT MIN(seq) FROM product_change), 0) AS first,
+               COALESCE((SELECT MAX(seq) FROM product_change), 0) AS last
+        """
+    )[0]
+    return row["first"], row["last"]
+
+
+def get_product_changes(since: int) -> List[int]:
+    rows = _query("SELECT product_id FROM product_change WHERE seq > ?", (since,))
+    return list(dict.fromkeys(row["product_id"] for row in rows))
+
+
+def get_product_images_bulk(product_ids: Iterable[int]) -> Dict[int, List[sqlite3.Row]]:
+    ids = list(dict.fromkeys(product_ids))
+    grouped: Dict[int, List[sqlite3.Row]] = {product_id: [] for product_id in ids}
+    if not ids:
+        return grouped
+    rows = _query(
+        """
+        SELECT * FROM product_image
+        WHERE product_id IN (SELECT value FROM json_each(?))
+        ORDER BY product_id, position, id
+        """,
+        (json.dumps(ids),),
+    )
+    for row in rows:
+        grouped[row["product_id"]].append(row)
+    return grouped
+
+
+def get_option_values(kind: Optional[str] = None) -> List[sqlite3.Row]:
+    sql = "SELECT kind, value, COUNT(*) AS product_count FROM product_option_value"
+    params: List = []
+    if kind:
+        sql += " WHERE kind = ?"
+        params.append(kind)
+    sql += " GROUP BY kind, value ORDER BY kind, value"
+    return list(_cached(("option_values", kind), lambda: _query(sql, params)))
+
+
 def get_reviews(limit: Optional[int] = None) -> List[sqlite3.Row]:
     sql = "SELECT * FROM review ORDER BY id"
     if limit:
@@ -434,7 +1413,7 @@ def get_reviews(limit: Optional[int] = None) -> List[sqlite3.Row]:
 
 
 def get_city_pages() -> List[sqlite3.Row]:
-    return _query("SELECT * FROM city_page ORDER BY id")
+    return list(_cached(("city_pages",), lambda: _query("SELECT * FROM city_page ORDER BY id")))
 
 
 def get_city_page(slug: str) -> Optional[sqlite3.Row]:
@@ -443,8 +1422,201 @@ def get_city_page(slug: str) -> Optional[sqlite3.Row]:
 
 
 def get_videos_grouped() -> dict:
+    # Sized by videos, not categories: a handful of categories can hold the whole table.
+    grouped = _cached(("videos_grouped",), _load_videos_grouped, lambda value: sum(map(len, value.values())))
+    return {category: list(rows) for category, rows in grouped.items()}
+
+
+def _load_videos_grouped() -> dict:
     rows = _query("SELECT * FROM video ORDER BY category, title")
     grouped: dict = {}
     for row in rows:
         grouped.setdefault(row["category"], []).append(row)
     return grouped
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id: int, variant: str, requested: int) -> None:
+        super().__init__(f"Not enough stock for product {product_id} {variant!r} (requested {requested})")
+        self.product_id = product_id
+        self.variant = variant
+        self.requested = requested
+
+
+def variant_key(options: Optional[Dict[str, str]] = None) -> str:
+    return ";".join(f"{name}={value}" for name, value in sorted((options or {}).items()))
+
+
+@contextmanager
+def _immediate(db: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+
+def _expire_holds(db: sqlite3.Connection, now: float) -> int:
+    expired = db.execute("SELECT token FROM stock_hold WHERE expires_at <= ? LIMIT 1", (now,)).fetchone()
+    if expired is None:
+        return 0
+    db.execute(
+        """
+        UPDATE inventory
+        SET reserved = MAX(reserved - (
+            SELECT SUM(h.quantity) FROM stock_hold h
+            WHERE h.expires_at <= :now AND h.product_id = inventory.product_id AND (h.variant = inventory.variant OR inventory.variant = '')
+        ), 0)
+        WHERE (product_id, variant) IN (
+            SELECT h.product_id, h.variant FROM stock_hold h WHERE h.expires_at <= :now
+            UNION
+            SELECT h.product_id, '' FROM stock_hold h WHERE h.expires_at <= :now
+        )
+        """,
+        {"now": now},
+    )
+    return db.execute("DELETE FROM stock_hold WHERE expires_at <= ?", (now,)).rowcount
+
+
+def _adjust_holds(db: sqlite3.Connection, token: str, on_hand_sign: int) -> bool:
+    holds = db.execute("SELECT product_id, variant, quantity FROM stock_hold WHERE token = ?", (token,)).fetchall()
+    if not holds:
+        return False
+    for hold in holds:
+        db.execute(
+            """
+            UPDATE inventory SET reserved = MAX(reserved - :quantity, 0), on_hand = on_hand + :delta
+            WHERE product_id = :product_id AND variant IN ('', :variant)
+            """,
+            {
+                "product_id": hold["product_id"],
+                "variant": hold["variant"],
+                "quantity": hold["quantity"],
+                "delta": on_hand_sign * hold["quantity"],
+            },
+        )
+    db.execute("DELETE FROM stock_hold WHERE token = ?", (token,))
+    return True
+
+
+def set_inventory(product_id: int, on_hand: int, variant: str = "") -> None:
+    with _immediate(get_db()) as db:
+        db.execute(
+            """
+            INSERT INTO inventory (product_id, variant, on_hand) VALUES (?, ?, ?)
+            ON CONFLICT(product_id, variant) DO UPDATE SET on_hand = excluded.on_hand
+            """,
+            (product_id, variant, on_hand),
+        )
+
+
+def reserve_stock(items: Iterable[Tuple[int, str, int]], ttl: Optional[float] = None) -> Optional[str]:
+    # A variant hold also draws on the product-level row when one exists; untracked products always succeed.
+    # Returns None when no item is tracked, since there is then no hold to confirm or release.
+    ttl = current_app.config["STOCK_HOLD_SECONDS"] if ttl is None else ttl
+    current_app.extensions["hold_sweeper"].ensure_started()
+    token = secrets.token_urlsafe(16)
+    now = time.time()
+    held = False
+    with _immediate(get_db()) as db:
+        _expire_holds(db, now)
+        for product_id, variant, quantity in items:
+            tracked = db.execute(
+                "SELECT COUNT(*) FROM inventory WHERE product_id = ? AND variant IN ('', ?)", (product_id, variant)
+            ).fetchone()[0]
+            if not tracked:
+                continue
+            updated = db.execute(
+                """
+                UPDATE inventory SET reserved = reserved + :quantity
+                WHERE product_id = :product_id AND variant IN ('', :variant) AND on_hand - reserved >= :quantity
+                """,
+                {"product_id": product_id, "variant": variant, "quantity": quantity},
+            ).rowcount
+            if updated < tracked:
+                raise OutOfStock(product_id, variant, quantity)
+            db.execute(
+                "INSERT INTO stock_hold (token, product_id, variant, quantity, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (token, product_id, variant, quantity, now + ttl),
+            )
+            held = True
+    return token if held else None
+
+
+def confirm_reservation(token: str) -> bool:
+    with _immediate(get_db()) as db:
+        return _adjust_holds(db, token, on_hand_sign=-1)
+
+
+def release_reservation(token: str) -> bool:
+    with _immediate(get_db()) as db:
+        return _adjust_holds(db, token, on_hand_sign=0)
+
+
+def confirm_hold(db: sqlite3.Connection, token: str) -> bool:
+    # For writers already inside a transaction, so the stock leaves on_hand atomically with whatever it paid for.
+    return _adjust_holds(db, token, on_hand_sign=-1)
+
+
+def release_hold(db: sqlite3.Connection, token: str) -> bool:
+    return _adjust_holds(db, token, on_hand_sign=0)
+
+
+def expire_holds(now: Optional[float] = None) -> int:
+    with _immediate(get_db()) as db:
+        return _expire_holds(db, time.time() if now is None else now)
+
+
+def get_inventory(product_id: int) -> List[sqlite3.Row]:
+    return _query(
+        "SELECT variant, on_hand, reserved, on_hand - reserved AS available FROM inventory WHERE product_id = ?",
+        (product_id,),
+    )
+
+
+class HoldSweeper:
+    # Returns expired holds to stock even when no new reservation arrives to expire them inline.
+    def __init__(self, pool: ConnectionPool, interval: float) -> None:
+        self.pool = pool
+        self.interval = interval
+        self.expired = 0
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def ensure_started(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="stock-hold-sweeper", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout: float = 5.0) -> None:
+        # Once closed the sweeper stays stopped; reservations still expire stale holds inline.
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+
+    def sweep(self) -> int:
+        db = self.pool.acquire()
+        try:
+            with _immediate(db):
+                expired = _expire_holds(db, time.time())
+        finally:
+            self.pool.release(db)
+        self.expired += expired
+        return expired
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except sqlite3.Error:
+                continue
@@ -0,0 +1,256 @@
+import bisect
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from flask import current_app
+
+from . import data
+
+
+FLAG_FACETS = ("limited_drop", "seasonal", "made_to_order", "bundle_eligible")
+OPTION_FACETS = {"colorways": "colorway", "inlays": "inlay"}
+FACETS = ("category", "availability", "price") + FLAG_FACETS + tuple(OPTION_FACETS.values())
+FACET_LABELS = {
+    "category": "Category",
+    "availability": "Availability",
+    "price": "Price",
+    "limited_drop": "Limited drop",
+    "seasonal": "Seasonal",
+    "made_to_order": "Made to order",
+    "bundle_eligible": "Bundle eligible",
+    "colorway": "Colorway",
+    "inlay": "Inlay",
+}
+PRICE_BUCKETS: Sequence[Tuple[str, str, float, Optional[float]]] = (
+    ("under-25", "Under $25", 0, 25),
+    ("25-50", "$25 – $50", 25, 50),
+    ("50-100", "$50 – $100", 50, 100),
+    ("100-200", "$100 – $200", 100, 200),
+    ("200-plus", "$200+", 200, None),
+)
+
+FacetKey = Tuple[str, str]
+
+
+class FacetResult(NamedTuple):
+    product_ids: List[int]
+    total: int
+    counts: Dict[str, Dict[str, int]]
+    next_position: Optional[list]
+
+
+def init_app(app) -> None:
+    app.extensions["facet_index"] = FacetIndex()
+
+
+def get_index() -> "FacetIndex":
+    index: FacetIndex = current_app.extensions["facet_index"]
+    index.sync()
+    return index
+
+
+def price_bucket(price: float) -> str:
+    for key, _, low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return key
+    return PRICE_BUCKETS[0][0]
+
+
+def _facet_keys(row, options: Iterable[Tuple[str, str]]) -> Tuple[FacetKey, ...]:
+    keys: List[FacetKey] = [
+        ("category", str(row["category_id"])),
+        ("availability", row["availability"] or ""),
+        ("price", price_bucket(row["price"])),
+    ]
+    keys.extend((flag, "1") for flag in FLAG_FACETS if row[flag])
+    keys.extend((OPTION_FACETS[kind], value) for kind, value in options if kind in OPTION_FACETS)
+    # An option listed twice must map to one key, or removing the product would clear its bit twice.
+    return tuple(dict.fromkeys(keys))
+
+
+def _bitset(ids: Iterable[int], size: int) -> int:
+    buffer = bytearray(size // 8 + 1)
+    for product_id in ids:
+        buffer[product_id >> 3] |= 1 << (product_id & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _options_by_product(rows) -> Dict[int, List[Tuple[str, str]]]:
+    grouped: Dict[int, List[Tuple[str, str]]] = defaultdict(list)
+    for row in rows:
+        grouped[row["product_id"]].append((row["kind"], row["value"]))
+    return grouped
+
+
+class FacetIndex:
+    # Bit n of every bitset stands for product id n, so catalog edits only touch the bits of changed products.
+    def __init__(self) -> None:
+        self.generation: Optional[int] = None
+        self.change_seq = 0
+        self.full_rebuilds = 0
+        self.incremental_updates = 0
+        self.universe = 0
+        self._bits: Dict[str, Dict[str, int]] = {}
+        self._keys: Dict[int, Tuple[FacetKey, ...]] = {}
+        self._listing: Dict[int, str] = {}
+        self._ordered: List[Tuple[str, int]] = []
+        self._lock = threading.Lock()
+
+    def sync(self) -> None:
+        generation = data.catalog_generation()
+        if generation == self.generation:
+            return
+        with self._lock:
+            if generation == self.generation:
+                return
+            first, last = data.get_product_change_window()
+            if self.generation is None or (first and self.change_seq < first - 1):
+                self._rebuild()
+            elif last > self.change_seq:
+                self._apply(data.get_product_changes(self.change_seq))
+            self.change_seq = last
+            self.generation = generation
+
+    def _rebuild(self) -> None:
+        rows = data.get_facet_rows()
+        options = _options_by_product(data.get_option_rows())
+        members: Dict[FacetKey, List[int]] = defaultdict(list)
+        keys: Dict[int, Tuple[FacetKey, ...]] = {}
+        for row in rows:
+            product_keys = _facet_keys(row, options.get(row["id"], ()))
+            keys[row["id"]] = product_keys
+            for key in product_keys:
+                members[key].append(row["id"])
+
+        size = max(keys, default=0) + 1
+        bits: Dict[str, Dict[str, int]] = {}
+        for (facet, value), ids in members.items():
+            bits.setdefault(facet, {})[value] = _bitset(ids, size)
+        self._bits = bits
+        self._keys = keys
+        self.universe = _bitset(keys, size)
+        self._listing = {row["id"]: row["listing_key"] for row in rows}
+        self._ordered = sorted((listing_key, product_id) for product_id, listing_key in self._listing.items())
+        self.full_rebuilds += 1
+
+    def _apply(self, product_ids: List[int]) -> None:
+        rows = {row["id"]: row for row in data.get_facet_rows(product_ids)}
+        options = _options_by_product(data.get_option_rows(product_ids))
+        reorder = False
+        for product_id in product_ids:
+            bit = 1 << product_id
+            for facet, value in self._keys.pop(product_id, ()):
+                values = self._bits[facet]
+                values[value] &= ~bit
+                if not values[value]:
+                    del values[value]
+            row = rows.get(product_id)
+            if row is None:
+                self.universe &= ~bit
+                reorder = self._listing.pop(product_id, None) is not None or reorder
+                continue
+            product_keys = _facet_keys(row, options.get(product_id, ()))
+            for facet, value in product_keys:
+                values = self._bits.setdefault(facet, {})
+                values[value] = values.get(value, 0) | bit
+            self._keys[product_id] = product_keys
+            self.universe |= bit
+            if self._listing.get(product_id) != row["listing_key"]:
+                self._listing[product_id] = row["listing_key"]
+                reorder = True
+        if reorder:
+            self._ordered = sorted((listing_key, product_id) for product_id, listing_key in self._listing.items())
+        self.incremental_updates += 1
+
+    def query(self, selection: Dict[str, Set[str]], after: Optional[list] = None, limit: int = 24) -> FacetResult:
+        with self._lock:
+            masks: Dict[str, int] = {}
+            for facet, values in selection.items():
+                if not values:
+                    continue
+                mask = 0
+                for value in values:
+                    mask |= self._bits.get(facet, {}).get(value, 0)
+                masks[facet] = mask
+
+            match = self.universe
+            for mask in masks.values():
+                match &= mask
+
+            # A facet's own selection is left out of its counts so sibling values stay selectable.
+            counts: Dict[str, Dict[str, int]] = {}
+            for facet, values in self._bits.items():
+                base = self.universe
+                for other, mask in masks.items():
+                    if other != facet:
+                        base &= mask
+                counts[facet] = {value: (base & bits).bit_count() for value, bits in values.items()}
+
+            membership = match.to_bytes(match.bit_length() // 8 + 1, "little")
+            start = bisect.bisect_right(self._ordered, (after[0], after[1])) if after else 0
+            found: List[Tuple[str, int]] = []
+            for index in range(start, len(self._ordered)):
+                entry = self._ordered[index]
+                product_id = entry[1]
+                byte = product_id >> 3
+                if byte < len(membership) and membership[byte] >> (product_id & 7) & 1:
+                    found.append(entry)
+                    if len(found) > limit:
+                        break
+
+        next_position = list(found[limit - 1]) if len(found) > limit else None
+        return FacetResult([product_id for _, product_id in found[:limit]], match.bit_count(), counts, next_position)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "generation": self.generation,
+            "change_seq": self.change_seq,
+            "products": len(self._keys),
+            "values": sum(len(values) for values in self._bits.values()),
+            "full_rebuilds": self.full_rebuilds,
+            "incremental_updates": self.incremental_updates,
+        }
+
+
+def selection_from_args(args) -> Dict[str, Set[str]]:
+    category_ids = {row["slug"]: str(row["id"]) for row in data.get_categories()}
+    selection: Dict[str, Set[str]] = {}
+    for facet in FACETS:
+        values = {value for value in args.getlist(facet) if value}
+        if facet == "category":
+            values = {category_ids[slug] for slug in values if slug in category_ids}
+        if values:
+            selection[facet] = values
+    return selection
+
+
+def facet_groups(counts: Dict[str, Dict[str, int]], selection: Dict[str, Set[str]]) -> List[dict]:
+    categories = data.get_categories()
+    labels = {
+        "category": {str(row["id"]): (row["slug"], row["name"]) for row in categories},
+        "price": {key: (key, label) for key, label, _, _ in PRICE_BUCKETS},
+    }
+    groups = []
+    for facet in FACETS:
+        values = counts.get(facet, {})
+        if facet in labels:
+            ordered = [value for value in labels[facet] if value in values]
+        else:
+            ordered = sorted(values)
+        options = []
+        for value in ordered:
+            public_value, label = labels.get(facet, {}).get(value, (value, value.replace("_", " ").capitalize()))
+            if facet in FLAG_FACETS:
+                label = FACET_LABELS[facet]
+            options.append(
+                {
+                    "value": public_value,
+                    "label": label,
+                    "count": values[value],
+                    "selected": value in selection.get(facet, ()),
+                }
+            )
+        if options:
+            groups.append({"name": facet, "label": FACET_LABELS[facet], "options": options})
+    return groups
@@ -0,0 +1,124 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from .images import DerivativeCache
+
+
+class FragmentCache:
+    # Rendered fragments in least-recently-used order, bounded by the total length of the stored markup.
+    def __init__(self, max_bytes: int, disk: Optional[DerivativeCache] = None) -> None:
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key: str, render: Callable[[], str]) -> str:
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+        html = self._load(key, render) if self.disk is not None else None
+        if html is None:
+            html = render()
+            with self._lock:
+                self.misses += 1
+        self._put(key, html)
+        return html
+
+    def _load(self, key: str, render: Callable[[], str]) -> Optional[str]:
+        # Shared across workers: one process renders a card and the others read it back from disk.
+        rendered = []
+
+        def build() -> bytes:
+            rendered.append(render())
+            return rendered[0].encode("utf-8")
+
+        path = self.disk.get_or_build(hashlib.sha1(key.encode()).hexdigest(), build)
+        if rendered:
+            with self._lock:
+                self.misses += 1
+            return rendered[0]
+        try:
+            with open(path, encoding="utf-8") as handle:
+                html = handle.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        return html
+
+    def _put(self, key: str, html: str) -> None:
+        with self._lock:
+            if key in self._entries or len(html) > self.max_bytes:
+                return
+            self._entries[key] = html
+            self._bytes += len(html)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class FragmentCacheExtension(Extension):
+    # {% cache product %}...{% endcache %}: the body may only depend on the product it is keyed on,
+    # since anything else it reads is frozen into the markup until the product or the fragment changes.
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        product = parser.parse_expression()
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        # Node reprs carry the fragment's source but not its line numbers, so edits elsewhere in the file keep the key.
+        source = hashlib.sha1(f"{parser.name}:{body!r}".encode()).hexdigest()[:16]
+        return nodes.CallBlock(self.call_method("_render", [nodes.Const(source), product]), [], [], body).set_lineno(lineno)
+
+    def _render(self, source: str, product, caller) -> Markup:
+        cache: Optional[FragmentCache] = current_app.extensions.get("fragment_cache")
+        version = getattr(product, "version", None)
+        if cache is None or version is None:
+            return caller()
+        # Local originals change image URLs without touching the product, so the index version is part of the key.
+        originals = current_app.extensions["image_originals"].version
+        key = f"{source}:{product.id}:{version}:{originals}"
+        return Markup(cache.get_or_render(key, lambda: str(caller())))
+
+
+def init_app(app) -> None:
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    if app.config["FRAGMENT_CACHE_MAX_BYTES"] <= 0:
+        return
+    disk = None
+    if app.config["FRAGMENT_CACHE_DIR"]:
+        disk = DerivativeCache(app.config["FRAGMENT_CACHE_DIR"], app.config["FRAGMENT_CACHE_DISK_MAX_BYTES"])
+    app.extensions["fragment_cache"] = FragmentCache(app.config["FRAGMENT_CACHE_MAX_BYTES"], disk)
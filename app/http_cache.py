@@ -0,0 +1,89 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Optional, Tuple
+
+from flask import current_app, make_response, request, session
+
+from . import cart, data
+
+
+STATIC = "static"
+CATALOG = "catalog"
+
+
+def init_app(app) -> None:
+    app.extensions["template_fingerprint"] = _template_fingerprint(os.path.join(app.root_path, app.template_folder))
+
+
+def _template_fingerprint(template_dir: str) -> Tuple[str, int]:
+    digest = hashlib.sha1()
+    newest = 0
+    for root, dirs, files in os.walk(template_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, template_dir).encode())
+            with open(path, "rb") as handle:
+                digest.update(handle.read())
+            newest = max(newest, int(os.path.getmtime(path)))
+    return digest.hexdigest(), newest
+
+
+def _validators(scope: str) -> Tuple[str, Optional[datetime]]:
+    if current_app.debug:
+        init_app(current_app)
+    template_digest, templates_modified = current_app.extensions["template_fingerprint"]
+    assets = current_app.extensions.get("asset_manifest", {})
+    # Every page renders the cart badge, so the count is part of each representation.
+    count = cart.cart_count()
+    parts = [template_digest, ",".join(sorted(assets.values())), scope, str(count)]
+    modified = templates_modified
+    if scope == CATALOG:
+        parts.append(str(data.catalog_generation()))
+        modified = max(modified, data.catalog_modified_at())
+    etag = hashlib.sha1(":".join(parts).encode()).hexdigest()
+    # Cart edits carry no timestamp, so a date only describes the page while the cart is empty;
+    # otherwise the ETag alone validates it.
+    if count:
+        return etag, None
+    return etag, datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def _not_modified(etag: str, last_modified: Optional[datetime]) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def conditional(scope: str = CATALOG) -> Callable:
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Flashed messages are rendered into the page once, so those responses are never revalidated.
+            if request.method not in ("GET", "HEAD") or "_flashes" in session:
+                return view(*args, **kwargs)
+            etag, last_modified = _validators(scope)
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.public = True
+            if scope == STATIC:
+                response.cache_control.max_age = current_app.config["HTTP_CACHE_STATIC_MAX_AGE"]
+            else:
+                response.cache_control.no_cache = True
+            response.vary.add("Cookie")
+            return response
+
+        return wrapper
+
+    return decorator
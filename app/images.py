@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import click
+from flask import abort, current_app, send_file, url_for
+from flask.cli import AppGroup
+
+from . import data
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: srcset helpers fall back to the remote URLs
+    Image = None
+
+
+WIDTHS = (160, 320, 480, 640, 960, 1280, 1600)
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpg": ("JPEG", "image/jpeg")}
+DEFAULT_FORMAT = "webp"
+QUALITY = 78
+INDEX_NAME = "index.json"
+CARD_WIDTHS = (320, 480, 640, 960)
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+RESCAN_SECONDS = 30.0
+
+
+class DerivativeCache:
+    # Sizes are tracked in memory in least-recently-used order. Every worker writes to the same directory, so a put
+    # rescans it at most every RESCAN_SECONDS to pick up files other workers added or evicted: across processes
+    # disk usage can overshoot max_bytes until the next put after a rescan.
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._scanned = 0.0
+        self._lock = threading.Lock()
+        self._building: Dict[str, threading.Lock] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._rescan()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get_or_build(self, name: str, build) -> str:
+        path = self.path(name)
+        with self._lock:
+            if name in self._entries and os.path.exists(path):
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return path
+            building = self._building.setdefault(name, threading.Lock())
+        # Concurrent first requests for one derivative wait on a single encode instead of racing.
+        with building:
+            with self._lock:
+                if name in self._entries and os.path.exists(path):
+                    self._entries.move_to_end(name)
+                    self.hits += 1
+                    return path
+            # Another worker may have written it since the last rescan; files only ever appear complete.
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                size = None
+            if size is not None:
+                with self._lock:
+                    self.hits += 1
+                    self._bytes += size - self._entries.pop(name, 0)
+                    self._entries[name] = size
+                    self._building.pop(name, None)
+                return path
+            try:
+                payload = build()
+                handle, temporary = tempfile.mkstemp(dir=self.directory, prefix=".")
+                try:
+                    with os.fdopen(handle, "wb") as output:
+                        output.write(payload)
+                    os.replace(temporary, path)
+                except BaseException:
+                    # A full disk mid-write would otherwise strand a dot-file that the byte cap never sees.
+                    os.unlink(temporary)
+                    raise
+                with self._lock:
+                    self.misses += 1
+                    self._bytes += len(payload) - self._entries.pop(name, 0)
+                    self._entries[name] = len(payload)
+                    if time.monotonic() - self._scanned >= RESCAN_SECONDS:
+                        self._rescan()
+                    self._evict()
+            finally:
+                with self._lock:
+                    self._building.pop(name, None)
+        return path
+
+    def _rescan(self) -> None:
+        # Files this process knows keep their recency; new ones from other workers count as the most recent, oldest first.
+        on_disk = {}
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_file():
+                    stat = entry.stat()
+                    on_disk[entry.name] = (stat.st_atime, stat.st_size)
+            except FileNotFoundError:
+                continue
+        entries: "OrderedDict[str, int]" = OrderedDict((name, on_disk[name][1]) for name in self._entries if name in on_disk)
+        for name, (_, size) in sorted(on_disk.items(), key=lambda item: item[1][0]):
+            entries.setdefault(name, size)
+        self._entries = entries
+        self._bytes = sum(entries.values())
+        self._scanned = time.monotonic()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class OriginalStore:
+    # Originals are named by content hash; index.json maps each catalog URL to its hash.
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._index: Dict[str, str] = {}
+        self._index_mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_NAME)
+
+    def index(self) -> Dict[str, str]:
+        now = time.monotonic()
+        if now - self._checked < 1.0:
+            return self._index
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.stat(self._index_path()).st_mtime_ns
+            except FileNotFoundError:
+                self._index = {}
+                return self._index
+            if mtime != self._index_mtime:
+                with open(self._index_path(), encoding="utf-8") as handle:
+                    self._index = json.load(handle)
+                self._index_mtime = mtime
+        return self._index
+
+    @property
+    def version(self) -> int:
+        self.index()
+        return self._index_mtime or 0
+
+    def digest_for(self, url: str) -> Optional[str]:
+        return self.index().get(url)
+
+    def path(self, digest: str) -> Optional[str]:
+        if len(digest) != 64 or not all(char in "0123456789abcdef" for char in digest):
+            return None
+        path = os.path.join(self.directory, digest)
+        return path if os.path.exists(path) else None
+
+    def add(self, url: str, payload: bytes) -> str:
+        digest = hashlib.sha256(payload).hexdigest()
+        path = os.path.join(self.directory, digest)
+        if not os.path.exists(path):
+            with open(path, "wb") as handle:
+                handle.write(payload)
+        with self._lock:
+            index = dict(self.index())
+            index[url] = digest
+            handle, temporary = tempfile.mkstemp(dir=self.directory, prefix=".")
+            with os.fdopen(handle, "w", encoding="utf-8") as output:
+                json.dump(index, output, indent=2, sort_keys=True)
+            os.replace(temporary, self._index_path())
+            self._index = index
+            self._index_mtime = os.stat(self._index_path()).st_mtime_ns
+        return digest
+
+
+def init_app(app) -> None:
+    app.extensions["image_originals"] = OriginalStore(app.config["IMAGE_ORIGINALS_DIR"])
+    app.extensions["image_cache"] = DerivativeCache(app.config["IMAGE_CACHE_DIR"], app.config["IMAGE_CACHE_MAX_BYTES"])
+    app.add_url_rule("/images/<digest>/<int:width>.<fmt>", "image_derivative", serve_derivative)
+    app.add_template_global(image_url)
+    app.add_template_global(image_srcset)
+    app.cli.add_command(images_cli)
+
+
+def _closest_width(width: int) -> int:
+    return min(WIDTHS, key=lambda candidate: (abs(candidate - width), candidate))
+
+
+def _remote_resized(url: str, width: int) -> str:
+    # Until an original is fetched locally, Unsplash can resize on its side with the same widths.
+    parts = urlsplit(url)
+    if parts.netloc != "images.unsplash.com":
+        return url
+    query = dict(parse_qsl(parts.query))
+    query["w"] = str(width)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def image_url(url: str, width: int, fmt: str = DEFAULT_FORMAT) -> str:
+    if not url:
+        return url
+    width = _closest_width(width)
+    digest = current_app.extensions["image_originals"].digest_for(url) if Image is not None else None
+    if digest is None:
+        return _remote_resized(url, width)
+    return url_for("image_derivative", digest=digest, width=width, fmt=fmt)
+
+
+def image_srcset(url: str, widths: Sequence[int] = CARD_WIDTHS, fmt: str = DEFAULT_FORMAT) -> str:
+    return ", ".join(f"{image_url(url, width, fmt)} {_closest_width(width)}w" for width in widths)
+
+
+def _encode(source: str, width: int, fmt: str) -> bytes:
+    pillow_format, _ = FORMATS[fmt]
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        if image.mode not in ("RGB", "L") and pillow_format == "JPEG":
+            image = image.convert("RGB")
+        output = tempfile.SpooledTemporaryFile()
+        image.save(output, pillow_format, quality=QUALITY, optimize=True)
+        output.seek(0)
+        return output.read()
+
+
+def serve_derivative(digest: str, width: int, fmt: str):
+    if Image is None or width not in WIDTHS or fmt not in FORMATS:
+        abort(404)
+    source = current_app.extensions["image_originals"].path(digest)
+    if source is None:
+        abort(404)
+    cache: DerivativeCache = current_app.extensions["image_cache"]
+    name = f"{digest[:24]}-{width}-q{QUALITY}.{fmt}"
+    path = cache.get_or_build(name, lambda: _encode(source, width, fmt))
+    response = send_file(path, mimetype=FORMATS[fmt][1], max_age=IMMUTABLE_MAX_AGE, etag=name, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def cache_stats() -> Dict[str, int]:
+    return current_app.extensions["image_cache"].stats()
+
+
+def catalog_image_urls() -> Iterable[str]:
+    yield data.PLACEHOLDER_IMAGE
+    for sql in (
+        "SELECT DISTINCT image_url FROM product_image",
+        "SELECT DISTINCT hero_image FROM category WHERE hero_image IS NOT NULL",
+        "SELECT DISTINCT thumbnail_url FROM video WHERE thumbnail_url IS NOT NULL",
+    ):
+        for row in data.get_db().execute(sql):
+            yield row[0]
+
+
+images_cli = AppGroup("images", help="Manage locally stored catalog images.")
+
+
+@images_cli.command("fetch")
+@click.option("--timeout", default=30.0, help="Per-download timeout in seconds.")
+def fetch_command(timeout: float) -> None:
+    """Download every catalog image URL that has no local original yet."""
+    store: OriginalStore = current_app.extensions["image_originals"]
+    for url in dict.fromkeys(catalog_image_urls()):
+        if store.digest_for(url) or not url.startswith(("http://", "https://")):
+            continue
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                payload = response.read()
+        except OSError as exc:
+            click.echo(f"skip {url}: {exc}")
+            continue
+        click.echo(f"{store.add(url, payload)[:12]} {url}")
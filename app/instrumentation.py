@@ -0,0 +1,321 @@
+import hmac
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import abort, before_render_template, current_app, g, has_request_context, request, template_rendered
+
+from . import data
+
+
+TIME_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+_WHITESPACE = re.compile(r"\s+")
+_HERE = os.path.abspath(__file__)
+
+
+class _Statement:
+    __slots__ = ("sql", "params", "caller", "seconds")
+
+    def __init__(self, sql: str, params: Any, caller: str) -> None:
+        self.sql = sql
+        self.params = params
+        self.caller = caller
+        self.seconds = 0.0
+
+
+class RequestTimings:
+    __slots__ = ("started", "statements", "sql_seconds", "render_seconds", "_render_started")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.statements: List[_Statement] = []
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self._render_started: List[float] = []
+
+
+def _timings() -> Optional[RequestTimings]:
+    # Writes from the order writer and hold sweeper threads have no request to charge them to.
+    if not has_request_context():
+        return None
+    return g.get("sql_timings")
+
+
+def _caller() -> str:
+    frame = sys._getframe(3)
+    while frame is not None and (frame.f_code.co_filename == _HERE or frame.f_code.co_name == "_query"):
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return f"{os.path.relpath(frame.f_code.co_filename, os.path.dirname(os.path.dirname(_HERE)))}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def _params_shape(params: Any) -> Any:
+    # Types only: parameter values can hold customer details and never reach the log.
+    if isinstance(params, dict):
+        return {name: type(value).__name__ for name, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [type(value).__name__ for value in params[:20]] + (["..."] if len(params) > 20 else [])
+    return type(params).__name__
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # SQLite does most of a SELECT's work while rows are stepped, so fetches are charged to the statement too.
+    _statement: Optional[_Statement] = None
+
+    def _charge(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        if self._statement is not None:
+            self._statement.seconds += elapsed
+            timings = _timings()
+            if timings is not None:
+                timings.sql_seconds += elapsed
+
+    def _begin(self, sql: str, params: Any) -> None:
+        timings = _timings()
+        if timings is None:
+            self._statement = None
+            return
+        self._statement = _Statement(sql, params, _caller())
+        timings.statements.append(self._statement)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._charge(started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql, "executemany")
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._charge(started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self._charge(started)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            self._charge(started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._charge(started)
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            self._charge(started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # sqlite3.Connection.execute builds its cursor in C, so the shortcuts are re-routed through cursor().
+    def cursor(self, factory=None):
+        return super().cursor(factory or InstrumentedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        cursor = self.cursor()
+        cursor._begin("COMMIT", ())
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            cursor._charge(started)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def exposition(self, name: str, labels: str) -> Iterable[str]:
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.total:.3f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class EndpointMetrics:
+    SERIES = (
+        ("request_duration_ms", TIME_BUCKETS_MS),
+        ("sql_duration_ms", TIME_BUCKETS_MS),
+        ("render_duration_ms", TIME_BUCKETS_MS),
+        ("sql_queries", QUERY_BUCKETS),
+    )
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], Dict[str, Histogram]] = {}
+
+    def observe(self, endpoint: str, status: int, values: Dict[str, float]) -> None:
+        key = (endpoint, f"{status // 100}xx")
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {name: Histogram(bounds) for name, bounds in self.SERIES}
+            for name, value in values.items():
+                series[name].observe(value)
+
+    def exposition(self) -> Iterable[str]:
+        with self._lock:
+            snapshot = {key: {name: (h.counts[:], h.total, h.count) for name, h in series.items()} for key, series in self._series.items()}
+        for name, bounds in self.SERIES:
+            yield f"# TYPE {name} histogram"
+            for (endpoint, status), series in sorted(snapshot.items()):
+                histogram = Histogram(bounds)
+                histogram.counts, histogram.total, histogram.count = series[name]
+                yield from histogram.exposition(f"{name}", f'endpoint="{endpoint}",status="{status}"')
+
+
+def init_app(app) -> None:
+    if not app.config["SQL_INSTRUMENTATION"]:
+        return
+    pool: data.ConnectionPool = app.extensions["db_pool"]
+    pool.factory = InstrumentedConnection
+    pool.close_all()
+    app.extensions["endpoint_metrics"] = EndpointMetrics()
+    app.before_request(_start)
+    app.after_request(_finish)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+    app.add_url_rule("/_internal/metrics", "internal_metrics", metrics)
+
+
+def _start() -> None:
+    g.sql_timings = RequestTimings()
+
+
+def _render_started(sender, template, context, **extra) -> None:
+    timings = _timings()
+    if timings is not None:
+        timings._render_started.append(time.perf_counter())
+
+
+def _render_finished(sender, template, context, **extra) -> None:
+    timings = _timings()
+    if timings is not None and timings._render_started:
+        timings.render_seconds += time.perf_counter() - timings._render_started.pop()
+
+
+def _finish(response):
+    timings: Optional[RequestTimings] = g.get("sql_timings")
+    if timings is None:
+        return response
+    # Streamed templates render after this hook, so the header only covers the work done before the first byte.
+    response.headers.add(
+        "Server-Timing",
+        f'db;dur={timings.sql_seconds * 1000:.2f};desc="{len(timings.statements)} queries", '
+        f"render;dur={timings.render_seconds * 1000:.2f}, app;dur={(time.perf_counter() - timings.started) * 1000:.2f}",
+    )
+    # Metrics and slow-query logs wait until the body has been sent, when a streamed page's SQL and rendering are in.
+    app = current_app._get_current_object()
+    details = {"endpoint": request.endpoint or "unmatched", "method": request.method, "path": request.path}
+    status = response.status_code
+    response.call_on_close(lambda: _record(app, timings, status, details))
+    return response
+
+
+def _record(app, timings: RequestTimings, status: int, details: Dict[str, str]) -> None:
+    total_ms = (time.perf_counter() - timings.started) * 1000
+    app.extensions["endpoint_metrics"].observe(
+        details["endpoint"],
+        status,
+        {
+            "request_duration_ms": total_ms,
+            "sql_duration_ms": timings.sql_seconds * 1000,
+            "render_duration_ms": timings.render_seconds * 1000,
+            "sql_queries": len(timings.statements),
+        },
+    )
+    _log_slow(app, timings, details)
+
+
+def _log_slow(app, timings: RequestTimings, details: Dict[str, str]) -> None:
+    threshold = app.config["SLOW_QUERY_MS"] / 1000
+    logger = app.logger.getChild("sql")
+    for statement in timings.statements:
+        if statement.seconds < threshold:
+            continue
+        logger.warning(
+            json.dumps(
+                {
+                    "event": "slow_query",
+                    "ms": round(statement.seconds * 1000, 2),
+                    "sql": _WHITESPACE.sub(" ", statement.sql).strip(),
+                    "params": _params_shape(statement.params),
+                    "caller": statement.caller,
+                    **details,
+                }
+            )
+        )
+
+
+def _gauges(prefix: str, values: Dict[str, Any]) -> Iterable[str]:
+    for name, value in sorted(values.items()):
+        if isinstance(value, (int, float)):
+            yield f"{prefix}_{name} {value}"
+
+
+def metrics():
+    # Behind a proxy every request arrives from the proxy's address, so the scraper proves itself with a token instead.
+    token = current_app.config["METRICS_TOKEN"]
+    scheme, _, supplied = request.headers.get("Authorization", "").partition(" ")
+    if not token or scheme.lower() != "bearer" or not hmac.compare_digest(supplied.encode(), token.encode()):
+        abort(404)
+    extensions = current_app.extensions
+    lines = list(extensions["endpoint_metrics"].exposition())
+    lines += _gauges("db_pool", extensions["db_pool"].stats())
+    lines += _gauges("catalog_cache", extensions["catalog_cache"].stats())
+    lines += _gauges("order_writer", extensions["order_writer"].stats())
+    if "image_cache" in extensions:
+        lines += _gauges("image_cache", extensions["image_cache"].stats())
+    if "fragment_cache" in extensions:
+        lines += _gauges("fragment_cache", extensions["fragment_cache"].stats())
+    lines.append(f"process_pid {os.getpid()}")
+    response = current_app.response_class("\n".join(lines) + "\n", mimetype="text/plain")
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    response.cache_control.no_store = True
+    return response
@@ -0,0 +1,281 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from flask import current_app
+
+from . import data
+from .data import ConnectionPool
+
+
+class OrderQueueFull(Exception):
+    """Raised when the writer queue is at capacity and the caller should retry later."""
+
+
+class HoldExpired(Exception):
+    """Raised when an order's stock hold was swept before the order could be written."""
+
+
+class OrderLine(NamedTuple):
+    product_id: int
+    product_name: str
+    quantity: int
+    unit_price: float
+    options: Dict[str, str]
+    personalization: Dict[str, str]
+
+
+class NewOrder(NamedTuple):
+    email: str
+    phone: str
+    notes: str
+    address: str
+    city: str
+    zip: str
+    state: str
+    subtotal: float
+    tax: float
+    shipping: float
+    total: float
+    lines: List[OrderLine]
+    hold: Optional[str] = None
+    idempotency_key: Optional[str] = None
+
+
+class _Pending:
+    __slots__ = ("order", "done", "order_id", "error")
+
+    def __init__(self, order: NewOrder) -> None:
+        self.order = order
+        self.done = threading.Event()
+        self.order_id: Optional[int] = None
+        self.error: Optional[BaseException] = None
+
+
+_STOP = object()
+
+
+class OrderWriter:
+    # The only thread that writes orders: concurrent checkouts queue here instead of contending for the SQLite write lock.
+    def __init__(self, pool: ConnectionPool, max_queue: int = 256, max_batch: int = 64, batch_wait: float = 0.005) -> None:
+        self.pool = pool
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._metrics = {
+            "submitted": 0,
+            "committed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "batches": 0,
+            "max_depth": 0,
+            "max_batch_size": 0,
+            "last_batch_size": 0,
+            "commit_ms_total": 0.0,
+            "commit_ms_max": 0.0,
+            "commit_ms_last": 0.0,
+        }
+
+    def _ensure_started(self) -> None:
+        # Threads do not survive fork, so a worker process starts its own writer on first use.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="order-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, order: NewOrder, timeout: float = 10.0) -> int:
+        self._ensure_started()
+        pending = _Pending(order)
+        # One deadline covers both the wait for queue space and the wait for the commit.
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(pending, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._metrics["rejected"] += 1
+            raise OrderQueueFull("The order queue is full.") from None
+        with self._lock:
+            self._metrics["submitted"] += 1
+            self._metrics["max_depth"] = max(self._metrics["max_depth"], self._queue.qsize())
+        if not pending.done.wait(max(deadline - time.monotonic(), 0)):
+            raise TimeoutError("The order was queued but not confirmed in time.")
+        if pending.error is not None:
+            raise pending.error
+        return pending.order_id
+
+    def close(self, timeout: float = 5.0) -> None:
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _next_batch(self) -> Optional[List[_Pending]]:
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._write(batch)
+            except Exception as exc:  # a failed connection or commit fails the whole batch
+                for pending in batch:
+                    if not pending.done.is_set():
+                        pending.order_id = None
+                        pending.error = exc
+                        pending.done.set()
+                with self._lock:
+                    self._metrics["failed"] += len(batch)
+
+    def _write(self, batch: List[_Pending]) -> None:
+        db = self.pool.acquire()
+        # Pool connections run with synchronous=NORMAL; an order id is only handed out after a full fsync.
+        db.execute("PRAGMA synchronous = FULL")
+        try:
+            started = time.perf_counter()
+            written: List[_Pending] = []
+            failed: List[_Pending] = []
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for pending in batch:
+                    # A savepoint per order keeps one bad order from rolling back the rest of the batch.
+                    db.execute("SAVEPOINT order_write")
+                    try:
+                        pending.order_id = _insert_order(db, pending.order)
+                        db.execute("RELEASE order_write")
+                        written.append(pending)
+                    except Exception as exc:
+                        db.execute("ROLLBACK TO order_write")
+                        db.execute("RELEASE order_write")
+                        pending.order_id = None
+                        pending.error = exc
+                        failed.append(pending)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            db.execute("PRAGMA synchronous = NORMAL")
+            self.pool.release(db)
+
+        with self._lock:
+            metrics = self._metrics
+            metrics["batches"] += 1
+            metrics["committed"] += len(written)
+            metrics["failed"] += len(failed)
+            metrics["last_batch_size"] = len(batch)
+            metrics["max_batch_size"] = max(metrics["max_batch_size"], len(batch))
+            metrics["commit_ms_last"] = elapsed
+            metrics["commit_ms_total"] += elapsed
+            metrics["commit_ms_max"] = max(metrics["commit_ms_max"], elapsed)
+        for pending in batch:
+            pending.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+        batches = metrics["batches"] or 1
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "submitted": metrics["submitted"],
+            "committed": metrics["committed"],
+            "failed": metrics["failed"],
+            "rejected": metrics["rejected"],
+            "max_depth": metrics["max_depth"],
+            "batches": metrics["batches"],
+            "batch_size_avg": round(metrics["committed"] / batches, 2),
+            "batch_size_max": metrics["max_batch_size"],
+            "batch_size_last": metrics["last_batch_size"],
+            "commit_ms_avg": round(metrics["commit_ms_total"] / batches, 3),
+            "commit_ms_max": round(metrics["commit_ms_max"], 3),
+            "commit_ms_last": round(metrics["commit_ms_last"], 3),
+        }
+
+
+def _insert_order(db, order: NewOrder) -> int:
+    if order.idempotency_key is not None:
+        existing = db.execute("SELECT id FROM customer_order WHERE idempotency_key = ?", (order.idempotency_key,)).fetchone()
+        if existing is not None:
+            # A retry of an order that already committed: its stock was taken then, so this attempt's hold goes back.
+            if order.hold is not None:
+                data.release_hold(db, order.hold)
+            return existing[0]
+    # The hold is settled in the order's own transaction: an order that commits late still takes its stock with it.
+    if order.hold is not None and not data.confirm_hold(db, order.hold):
+        raise HoldExpired("The stock hold for this order expired.")
+    cursor = db.execute(
+        """
+        INSERT INTO customer_order (email, phone, notes, address, city, zip, state, subtotal, tax, shipping, total, idempotency_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (*order[:11], order.idempotency_key),
+    )
+    order_id = cursor.lastrowid
+    db.executemany(
+        """
+        INSERT INTO order_line (order_id, product_id, product_name, quantity, unit_price, options, personalization)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                order_id,
+                line.product_id,
+                line.product_name,
+                line.quantity,
+                line.unit_price,
+                json.dumps(line.options) if line.options else None,
+                json.dumps(line.personalization) if line.personalization else None,
+            )
+            for line in order.lines
+        ],
+    )
+    return order_id
+
+
+def init_app(app) -> None:
+    app.extensions["order_writer"] = OrderWriter(
+        app.extensions["db_pool"],
+        max_queue=app.config["ORDER_QUEUE_SIZE"],
+        max_batch=app.config["ORDER_BATCH_SIZE"],
+        batch_wait=app.config["ORDER_BATCH_WAIT_MS"] / 1000,
+    )
+
+
+def submit(order: NewOrder) -> int:
+    writer: OrderWriter = current_app.extensions["order_writer"]
+    return writer.submit(order, timeout=current_app.config["ORDER_SUBMIT_TIMEOUT"])
+
+
+def writer_stats() -> Dict[str, Any]:
+    return current_app.extensions["order_writer"].stats()
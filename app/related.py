@@ -0,0 +1,369 @@
+import heapq
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from flask import current_app
+
+from . import data
+from .facets import price_bucket
+
+
+STORED = 8
+WINDOW = 24
+FULL_REBUILD_CHANGES = 2000
+WRITE_CHUNK = 5000
+LEASE_KEY = "related_refresh_lease"
+LEASE_SECONDS = 300.0
+WEIGHTS = {
+    "category": 4.0,
+    "colorway": 2.0,
+    "inlay": 1.0,
+    "price_band": 1.5,
+    "limited_drop": 0.5,
+    "seasonal": 0.5,
+    "sold_out": -3.0,
+}
+
+
+class Features(NamedTuple):
+    id: int
+    category_id: int
+    price: float
+    band: str
+    limited_drop: bool
+    seasonal: bool
+    sold_out: bool
+    colorways: FrozenSet[str]
+    inlays: FrozenSet[str]
+
+
+def score(product: Features, candidate: Features, weights: Dict[str, float] = WEIGHTS) -> float:
+    total = weights["category"] if product.category_id == candidate.category_id else 0.0
+    if product.colorways and candidate.colorways:
+        total += weights["colorway"] * len(product.colorways & candidate.colorways)
+    if product.inlays and candidate.inlays:
+        total += weights["inlay"] * len(product.inlays & candidate.inlays)
+    if product.band == candidate.band:
+        total += weights["price_band"]
+    if product.limited_drop and candidate.limited_drop:
+        total += weights["limited_drop"]
+    if product.seasonal and candidate.seasonal:
+        total += weights["seasonal"]
+    if candidate.sold_out:
+        total += weights["sold_out"]
+    return total
+
+
+def _load_features(db: sqlite3.Connection, where: str = "", params: Tuple = ()) -> Dict[int, Features]:
+    options: Dict[int, Dict[str, Set[str]]] = defaultdict(lambda: {"colorways": set(), "inlays": set()})
+    for product_id, kind, value in db.execute(
+        f"""
+        SELECT o.product_id, o.kind, o.value
+        FROM product_option_value o
+        WHERE o.kind IN ('colorways', 'inlays') AND o.product_id IN (SELECT id FROM product {where})
+        """,
+        params,
+    ):
+        options[product_id][kind].add(value)
+    features = {}
+    for row in db.execute(f"SELECT id, category_id, price, limited_drop, seasonal, availability FROM product {where}", params):
+        values = options.get(row[0], {"colorways": (), "inlays": ()})
+        features[row[0]] = Features(
+            row[0], row[1], row[2], price_bucket(row[2]), bool(row[3]), bool(row[4]), row[5] == "sold_out",
+            frozenset(values["colorways"]), frozenset(values["inlays"]),
+        )
+    return features
+
+
+class PriceOrder:
+    # Each category is kept sorted by price so a product's candidates are its nearest-priced neighbours.
+    def __init__(self, features: Dict[int, Features]) -> None:
+        self.categories: Dict[int, List[Features]] = defaultdict(list)
+        for product in features.values():
+            self.categories[product.category_id].append(product)
+        self.positions: Dict[int, int] = {}
+        self._keys: Dict[int, List[Tuple[float, int]]] = {}
+        for products in self.categories.values():
+            products.sort(key=lambda product: (product.price, product.id))
+            self.positions.update((product.id, index) for index, product in enumerate(products))
+
+    def window(self, product: Features) -> List[Features]:
+        products = self.categories[product.category_id]
+        index = self.positions[product.id]
+        return products[max(index - WINDOW, 0):index] + products[index + 1:index + 1 + WINDOW]
+
+    def around(self, category_id: int, price: float, product_id: int) -> List[Features]:
+        # The products whose windows held a position that may no longer be occupied.
+        products = self.categories.get(category_id, [])
+        if category_id not in self._keys:
+            self._keys[category_id] = [(product.price, product.id) for product in products]
+        index = bisect_left(self._keys[category_id], (price, product_id))
+        return products[max(index - WINDOW - 1, 0):index + WINDOW + 1]
+
+
+def _fallback(db: sqlite3.Connection, product: Features) -> List[Features]:
+    # Only small categories get here: fill up with the nearest-priced products from anywhere else.
+    ids = [
+        row[0]
+        for row in db.execute(
+            "SELECT id FROM product WHERE category_id != ? ORDER BY abs(price - ?), id LIMIT ?",
+            (product.category_id, product.price, STORED * 2),
+        )
+    ]
+    return list(_load_features(db, "WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),)).values())
+
+
+def _rank(product: Features, candidates: Iterable[Features]) -> List[Tuple[int, float]]:
+    # Highest score first; ties go to the closer price, then the lower id, so rebuilds are deterministic.
+    best = heapq.nsmallest(
+        STORED,
+        ((-score(product, candidate), abs(candidate.price - product.price), candidate.id) for candidate in candidates),
+    )
+    return [(candidate_id, -negated) for negated, _, candidate_id in best]
+
+
+def compute(db: sqlite3.Connection, order: PriceOrder, targets: Iterable[Features]) -> Dict[int, List[Tuple[int, float]]]:
+    results = {}
+    for product in targets:
+        candidates = order.window(product)
+        if len(candidates) < STORED:
+            candidates += _fallback(db, product)
+        results[product.id] = _rank(product, candidates)
+    return results
+
+
+def _bump_generation(db: sqlite3.Connection) -> None:
+    # related_product is not a trigger-tracked catalog table, so cached product pages are invalidated explicitly.
+    db.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'catalog_generation'")
+    db.execute("UPDATE meta SET value = CAST(strftime('%s', 'now') AS TEXT) WHERE key = 'catalog_modified_at'")
+
+
+def _write(
+    db: sqlite3.Connection,
+    targets: Dict[int, Features],
+    results: Dict[int, List[Tuple[int, float]]],
+    removed: Iterable[int],
+    change_seq: int,
+    full: bool,
+) -> None:
+    product_ids = list(results)
+    chunks = [product_ids[start:start + WRITE_CHUNK] for start in range(0, len(product_ids), WRITE_CHUNK)] or [[]]
+    for number, chunk in enumerate(chunks):
+        # Bounded transactions: a full rebuild never holds the write lock for the whole catalog.
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if full and number == 0:
+                db.execute("DELETE FROM related_product")
+                db.execute("DELETE FROM related_source")
+            elif number == 0:
+                db.execute("DELETE FROM related_product WHERE product_id IN (SELECT value FROM json_each(?))", (json.dumps(list(removed)),))
+                db.execute("DELETE FROM related_source WHERE product_id IN (SELECT value FROM json_each(?))", (json.dumps(list(removed)),))
+            if not full:
+                db.execute("DELETE FROM related_product WHERE product_id IN (SELECT value FROM json_each(?))", (json.dumps(chunk),))
+            db.executemany(
+                "INSERT OR REPLACE INTO related_source (product_id, category_id, price) VALUES (?, ?, ?)",
+                [(product_id, targets[product_id].category_id, targets[product_id].price) for product_id in chunk],
+            )
+            db.executemany(
+                "INSERT INTO related_product (product_id, rank, related_id, score) VALUES (?, ?, ?, ?)",
+                [
+                    (product_id, rank, related_id, value)
+                    for product_id in chunk
+                    for rank, (related_id, value) in enumerate(results[product_id])
+                ],
+            )
+            if number == len(chunks) - 1:
+                db.execute("UPDATE meta SET value = ? WHERE key = 'related_change_seq'", (str(change_seq),))
+                _bump_generation(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+
+def _change_state(db: sqlite3.Connection) -> Tuple[int, int, int]:
+    applied = db.execute("SELECT value FROM meta WHERE key = 'related_change_seq'").fetchone()
+    first, last = db.execute(
+        "SELECT COALESCE((SELECT MIN(seq) FROM product_change), 0), COALESCE((SELECT MAX(seq) FROM product_change), 0)"
+    ).fetchone()
+    return int(applied[0]) if applied else 0, first, last
+
+
+def rebuild(db: sqlite3.Connection) -> int:
+    _, _, last = _change_state(db)
+    features = _load_features(db)
+    _write(db, features, compute(db, PriceOrder(features), features.values()), (), last, full=True)
+    return len(features)
+
+
+def refresh(db: sqlite3.Connection) -> int:
+    """Recompute the lists touched by product changes since the last refresh; returns how many were rewritten."""
+    applied, first, last = _change_state(db)
+    if last <= applied:
+        return 0
+    if applied == 0 or (first and applied < first - 1):
+        return rebuild(db)
+    changed = list(dict.fromkeys(row[0] for row in db.execute("SELECT product_id FROM product_change WHERE seq > ?", (applied,))))
+    if len(changed) > FULL_REBUILD_CHANGES:
+        return rebuild(db)
+
+    # Lists that mention a changed product are stale too, wherever that product now lives.
+    referencing = [
+        row[0]
+        for row in db.execute(
+            "SELECT DISTINCT product_id FROM related_product WHERE related_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(changed),),
+        )
+    ]
+    previous = db.execute(
+        "SELECT product_id, category_id, price FROM related_source WHERE product_id IN (SELECT value FROM json_each(?))",
+        (json.dumps(changed),),
+    ).fetchall()
+    touched = json.dumps(changed + referencing)
+    features = _load_features(
+        db,
+        """
+        WHERE category_id IN (SELECT category_id FROM product WHERE id IN (SELECT value FROM json_each(?)))
+           OR category_id IN (SELECT value FROM json_each(?))
+        """,
+        (touched, json.dumps([row[1] for row in previous])),
+    )
+    order = PriceOrder(features)
+    targets: Dict[int, Features] = {}
+    for product_id, category_id, price in previous:
+        for neighbour in order.around(category_id, price, product_id):
+            targets[neighbour.id] = neighbour
+    for product_id in changed:
+        product = features.get(product_id)
+        if product is None:
+            continue
+        # Products whose candidate window now includes the changed one may want it in their list.
+        targets[product.id] = product
+        for neighbour in order.window(product):
+            targets[neighbour.id] = neighbour
+    for product_id in referencing:
+        if product_id in features:
+            targets[product_id] = features[product_id]
+    removed = [product_id for product_id in changed if product_id not in features]
+    _write(db, targets, compute(db, order, targets.values()), removed, last, full=False)
+    return len(targets)
+
+
+def _claim(db: sqlite3.Connection, holder: str) -> bool:
+    # The lease is "<holder> <expires_at>" in meta; an expired one is free, so a process that died mid-refresh
+    # only blocks the others for LEASE_SECONDS.
+    now = time.time()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        claimed = db.execute(
+            """
+            INSERT INTO meta (key, value) VALUES (:key, :value)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            WHERE CAST(substr(meta.value, instr(meta.value, ' ') + 1) AS REAL) <= :now
+            """,
+            {"key": LEASE_KEY, "value": f"{holder} {now + LEASE_SECONDS}", "now": now},
+        ).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return claimed == 1
+
+
+def _release(db: sqlite3.Connection, holder: str) -> None:
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.execute("DELETE FROM meta WHERE key = ? AND value LIKE ? || ' %'", (LEASE_KEY, holder))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+@contextmanager
+def exclusive(db: sqlite3.Connection, wait: float = 0.0) -> Iterator[bool]:
+    """Hold the lease that lets one process at a time rewrite related_product; yields False if it is still taken after `wait` seconds."""
+    holder = secrets.token_hex(8)
+    deadline = time.monotonic() + wait
+    while not _claim(db, holder):
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(0.5)
+    try:
+        yield True
+    finally:
+        _release(db, holder)
+
+
+class RelatedRefresher:
+    # Applies product changes to related_product in the background so product views only ever read it.
+    # Every worker runs one, but the lease means only one of them refreshes at a time; the rest find nothing left to do.
+    def __init__(self, pool: data.ConnectionPool, interval: float, logger: logging.Logger) -> None:
+        self.pool = pool
+        self.interval = interval
+        self.logger = logger
+        self.refreshed = 0
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def ensure_started(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="related-refresher", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+
+    def refresh(self) -> int:
+        db = self.pool.acquire()
+        try:
+            with exclusive(db) as held:
+                count = refresh(db) if held else 0
+        finally:
+            self.pool.release(db)
+        self.refreshed += count
+        return count
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except sqlite3.Error:
+                self.logger.exception("related-products refresh failed")
+            self._stop.wait(self.interval)
+
+
+def init_app(app) -> None:
+    app.extensions["related_refresher"] = RelatedRefresher(
+        app.extensions["db_pool"], app.config["RELATED_REFRESH_SECONDS"], app.logger.getChild("related")
+    )
+
+
+def get_related(product: data.Product, limit: int = 3) -> List[data.Product]:
+    current_app.extensions["related_refresher"].ensure_started()
+    related = data.get_related_products(product.id, limit)
+    if related:
+        return related
+    # Until the first refresh has run, fall back to the first page of the category.
+    siblings = data.get_products_page(category_slug=product.category_slug, limit=limit + 1).products
+    return [sibling for sibling in siblings if sibling.id != product.id][:limit]
@@ -0,0 +1,90 @@
+import gc
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from flask import Flask
+
+from . import data, facets
+
+
+def build(app: Flask) -> int:
+    """Load the read-mostly catalog state into this process; returns the catalog generation it reflects."""
+    # In the prefork master, workers then inherit the facet index and catalog cache copy-on-write.
+    started = time.perf_counter()
+    with app.app_context():
+        facets.get_index()
+        data.get_categories()
+        data.get_city_pages()
+        data.get_videos_grouped()
+        data.get_option_values()
+        data.get_products_page(limit=app.config["PRODUCTS_PAGE_SIZE"])
+        generation = data.catalog_generation()
+    # SQLite connections must not cross a fork; workers open their own on first use.
+    app.extensions["db_pool"].close_all()
+    # Frozen objects are skipped by the collector, which would otherwise touch (and copy) every shared page.
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+    app.logger.info("catalog snapshot for generation %s built in %.2fs", generation, time.perf_counter() - started)
+    return generation
+
+
+def _read_generation(database_path: str) -> Optional[int]:
+    try:
+        db = sqlite3.connect(Path(database_path).resolve().as_uri() + "?mode=ro", uri=True, timeout=1.0)
+    except sqlite3.Error:
+        return None
+    try:
+        row = db.execute("SELECT value FROM meta WHERE key = 'catalog_generation'").fetchone()
+        return int(row[0]) if row else None
+    except sqlite3.Error:
+        return None
+    finally:
+        db.close()
+
+
+class CatalogWatcher:
+    # Runs in the master: once the catalog has changed and then held still for a full interval
+    # (so a bulk import triggers one reload, not thousands), on_change asks for a graceful reload.
+    # Workers are forked while this thread is alive. Only the forking thread survives into a child,
+    # so the only hazard is a lock the watcher held at that instant. CPython reinitialises the GIL and
+    # its own locks in the child; SQLite's process-wide mutexes are covered by _forking, which makes
+    # every fork wait out an in-flight read and keeps the watcher from starting one mid-fork.
+    def __init__(self, database_path: str, generation: int, interval: float, on_change: Callable[[], None]) -> None:
+        self.database_path = database_path
+        self.generation = generation
+        self.interval = interval
+        self.on_change = on_change
+        self.reloads = 0
+        self._thread: Optional[threading.Thread] = None
+        self._forking = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        os.register_at_fork(
+            before=self._forking.acquire, after_in_parent=self._forking.release, after_in_child=self._forking.release
+        )
+        self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        seen = self.generation
+        while not self._stop.wait(self.interval):
+            with self._forking:
+                current = _read_generation(self.database_path)
+            if current is None:
+                continue
+            if current != self.generation and current == seen:
+                self.generation = current
+                self.reloads += 1
+                self.on_change()
+            seen = current
@@ -6,11 +6,37 @@ const confetti = () => {
   setTimeout(() => burst.remove(), 600);
 };
 
+const setCartCount = (count) => {
+  document.querySelectorAll('[data-cart-count]').forEach((node) => {
+    node.textContent = count;
+  });
+};
+
 document.addEventListener('DOMContentLoaded', () => {
-  document.querySelectorAll('[data-add-to-cart]').forEach((button) => {
-    button.addEventListener('click', (event) => {
-      event.preventDefault();
+  document.addEventListener('click', async (event) => {
+    const button = event.target.closest('[data-add-to-cart]');
+    if (!button) return;
+    const { form } = button;
+    if (!form || !window.fetch) {
+      if (!form) event.preventDefault();
+      confetti();
+      return;
+    }
+    if (!form.reportValidity()) return;
+    event.preventDefault();
+    try {
+      const response = await fetch(form.action, {
+        method: 'POST',
+        body: new FormData(form),
+        headers: { Accept: 'application/json' },
+        credentials: 'same-origin',
+      });
+      if (!response.ok) throw new Error(`Add to cart failed: ${response.status}`);
+      const payload = await response.json();
+      setCartCount(payload.cart_count);
       confetti();
-    });
+    } catch (error) {
+      form.submit();
+    }
   });
 });
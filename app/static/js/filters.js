@@ -2,9 +2,43 @@ document.addEventListener('DOMContentLoaded', () => {
   const form = document.querySelector('[data-filter-form]');
   if (!form) return;
 
-  form.addEventListener('change', () => {
-    const params = new URLSearchParams(new FormData(form));
-    const target = form.getAttribute('action') || window.location.pathname;
+  const grid = document.querySelector('[data-product-grid]');
+  const total = document.querySelector('[data-result-total]');
+  const endpoint = form.dataset.filterEndpoint;
+  const target = form.getAttribute('action') || window.location.pathname;
+
+  const reload = (params) => {
     window.location.href = `${target}?${params.toString()}`;
+  };
+
+  const updateCounts = (facets) => {
+    form.querySelectorAll('[data-facet-count]').forEach((node) => {
+      node.textContent = '0';
+    });
+    facets.forEach((facet) => {
+      facet.options.forEach((option) => {
+        const node = form.querySelector(`[data-facet-count="${CSS.escape(`${facet.name}:${option.value}`)}"]`);
+        if (node) node.textContent = option.count;
+      });
+    });
+  };
+
+  form.addEventListener('change', async () => {
+    const params = new URLSearchParams(new FormData(form));
+    if (!endpoint || !grid || !window.fetch) {
+      reload(params);
+      return;
+    }
+    try {
+      const response = await fetch(`${endpoint}?${params.toString()}`, { headers: { Accept: 'application/json' } });
+      if (!response.ok) throw new Error(`Filter request failed: ${response.status}`);
+      const payload = await response.json();
+      grid.innerHTML = payload.html;
+      if (total) total.textContent = payload.total;
+      updateCounts(payload.facets);
+      window.history.replaceState(null, '', `${target}?${params.toString()}`);
+    } catch (error) {
+      reload(params);
+    }
   });
 });
@@ -0,0 +1,124 @@
+import mimetypes
+import os
+import re
+from typing import Iterator, Optional, Tuple
+
+from flask import Response, current_app, request
+from werkzeug.http import http_date, parse_date, parse_etags
+
+
+CHUNK_SIZE = 256 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def file_etag(stat: os.stat_result) -> str:
+    return f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # One byte range only: multipart/byteranges responses cannot go through sendfile, and players never need them.
+    # RFC 9110 lets a server ignore Range, so other units, several ranges and malformed values return None (a plain 200).
+    match = _RANGE.match(header.replace(" ", ""))
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def _read_region(path: str, start: int, length: int) -> Iterator[bytes]:
+    # pread keeps each read bounded to the requested region without buffering more than one chunk.
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        offset, remaining = start, length
+        while remaining > 0:
+            chunk = os.pread(fd, min(CHUNK_SIZE, remaining), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        os.close(fd)
+
+
+def _body(path: str, start: int, length: int, size: int):
+    # wsgi.file_wrapper lets servers like gunicorn hand the descriptor to sendfile(); it always reads to EOF,
+    # so it is only used when the requested region runs to the end of the file.
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    if file_wrapper is not None and start + length == size:
+        handle = open(path, "rb")
+        handle.seek(start)
+        return file_wrapper(handle, CHUNK_SIZE)
+    return _read_region(path, start, length)
+
+
+def _fresh(etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        return parse_etags(if_none_match).contains_weak(etag)
+    since = parse_date(request.headers.get("If-Modified-Since"))
+    return since is not None and int(mtime) <= since.timestamp()
+
+
+def _range_applies(etag: str, mtime: float) -> bool:
+    # If-Range: a client resuming against a file that has since changed gets the whole new file instead.
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return parse_etags(if_range).contains(etag)
+    since = parse_date(if_range)
+    return since is not None and int(mtime) == since.timestamp()
+
+
+def send_ranged(path: str, mimetype: Optional[str] = None, max_age: int = 0) -> Response:
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = file_etag(stat)
+    mimetype = mimetype or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": f"public, max-age={max_age}",
+    }
+
+    if _fresh(etag, stat.st_mtime):
+        return Response(status=304, headers=headers)
+
+    if current_app.config["USE_X_SENDFILE"]:
+        # The front server reads the file itself and answers the Range header on its own.
+        headers["X-Sendfile"] = path
+        headers["Content-Length"] = str(size)
+        return Response(status=200, headers=headers, mimetype=mimetype)
+
+    status, start, length = 200, 0, size
+    range_header = request.headers.get("Range")
+    if range_header and _range_applies(etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            status, length = 206, end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(length)
+    if request.method == "HEAD":
+        return Response(status=status, headers=headers, mimetype=mimetype)
+    return Response(_body(path, start, length, size), status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
@@ -0,0 +1,60 @@
+from typing import Any, Callable
+
+from flask import g
+
+from . import cart, data
+
+
+class LazyGlobal:
+    # Resolved the first time a template touches it, then kept on g for the rest of the request.
+    __slots__ = ("name", "loader")
+
+    def __init__(self, name: str, loader: Callable[[], Any]) -> None:
+        self.name = name
+        self.loader = loader
+
+    def resolve(self) -> Any:
+        key = f"template_global_{self.name}"
+        if key not in g:
+            setattr(g, key, self.loader())
+        return getattr(g, key)
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __len__(self) -> int:
+        return len(self.resolve())
+
+    def __bool__(self) -> bool:
+        return bool(self.resolve())
+
+    def __getitem__(self, key):
+        return self.resolve()[key]
+
+    def __contains__(self, item) -> bool:
+        return item in self.resolve()
+
+    def __getattr__(self, name: str):
+        return getattr(self.resolve(), name)
+
+    def __eq__(self, other) -> bool:
+        return self.resolve() == other
+
+    def __int__(self) -> int:
+        return int(self.resolve())
+
+    def __str__(self) -> str:
+        return str(self.resolve())
+
+    def __repr__(self) -> str:
+        return f"<LazyGlobal {self.name}>"
+
+
+def init_app(app) -> None:
+    # Globals rather than context processors: pages that never mention them do no work for them.
+    # Catalog lists come from the generation-keyed catalog cache, so they are only reloaded after a change.
+    app.jinja_env.globals.update(
+        categories=LazyGlobal("categories", data.get_categories),
+        cities=LazyGlobal("cities", data.get_city_pages),
+        cart_count=LazyGlobal("cart_count", cart.cart_count),
+    )
@@ -0,0 +1,229 @@
+import io
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from flask import current_app
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+
+from . import data
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: uploads are kept without thumbnails or previews
+    Image = None
+
+
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".heic", ".heif"}
+THUMBNAIL_SIZE = (320, 320)
+PREVIEW_SIZE = (1280, 1280)
+MAX_FORM_MEMORY = 512 * 1024
+
+
+class StoredUpload(NamedTuple):
+    original_name: str
+    stored_name: str
+    content_type: str
+    size: int
+
+
+class _CappedFile(io.FileIO):
+    # Werkzeug's multipart parser writes each part here chunk by chunk, so the cap trips before the file is complete.
+    def __init__(self, path: str, limit: int) -> None:
+        super().__init__(path, "w+")
+        self.limit = limit
+        self.written = 0
+
+    def write(self, chunk) -> int:
+        self.written += len(chunk)
+        if self.written > self.limit:
+            raise RequestEntityTooLarge(f"Each photo must be under {self.limit // (1024 * 1024)} MB.")
+        return super().write(chunk)
+
+
+def upload_dir(app=None) -> str:
+    app = app or current_app
+    path = app.config["CUSTOM_UPLOAD_DIR"]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def receive(environ, field: str) -> Tuple[MultiDict, List[StoredUpload]]:
+    config = current_app.config
+    directory = upload_dir()
+    created: List[str] = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        if len(created) >= config["CUSTOM_UPLOAD_MAX_FILES"]:
+            raise RequestEntityTooLarge(f"Attach at most {config['CUSTOM_UPLOAD_MAX_FILES']} photos.")
+        extension = os.path.splitext(filename or "")[1].lower()
+        stored_name = secrets.token_hex(16) + (extension if extension in ALLOWED_EXTENSIONS else ".bin")
+        created.append(stored_name)
+        return _CappedFile(os.path.join(directory, stored_name), config["CUSTOM_UPLOAD_MAX_FILE_BYTES"])
+
+    try:
+        _, form, files = parse_form_data(
+            environ,
+            stream_factory=stream_factory,
+            max_form_memory_size=MAX_FORM_MEMORY,
+            max_content_length=config["CUSTOM_UPLOAD_MAX_BYTES"],
+        )
+    except Exception:
+        _discard(directory, created)
+        raise
+
+    stored: List[StoredUpload] = []
+    keep = set()
+    for upload in files.getlist(field):
+        stored_name = os.path.basename(upload.stream.name)
+        size = upload.stream.written
+        upload.stream.close()
+        extension = os.path.splitext(stored_name)[1]
+        if not upload.filename or not size or extension not in ALLOWED_EXTENSIONS:
+            continue
+        keep.add(stored_name)
+        stored.append(StoredUpload(upload.filename[:200], stored_name, upload.mimetype or "", size))
+    for upload in files.values():
+        upload.stream.close()
+    _discard(directory, [name for name in created if name not in keep])
+    return form, stored
+
+
+def discard(stored: List[StoredUpload]) -> None:
+    _discard(upload_dir(), [upload.stored_name for upload in stored])
+
+
+def _discard(directory: str, names: List[str]) -> None:
+    for name in names:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def make_derivatives(directory: str, stored_name: str) -> Dict[str, object]:
+    stem = os.path.splitext(stored_name)[0]
+    with Image.open(os.path.join(directory, stored_name)) as image:
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        names = {}
+        for kind, size in (("thumbnail", THUMBNAIL_SIZE), ("preview", PREVIEW_SIZE)):
+            derivative = image.copy()
+            derivative.thumbnail(size)
+            names[kind] = f"{stem}.{kind}.jpg"
+            derivative.save(os.path.join(directory, names[kind]), "JPEG", quality=82, optimize=True)
+    return {"width": width, "height": height, "thumbnail_name": names["thumbnail"], "preview_name": names["preview"]}
+
+
+class DerivativePool:
+    # Image decoding is CPU-bound, so it runs in worker processes and the intake POST never waits on it.
+    def __init__(self, db_pool: data.ConnectionPool, directory: str, workers: int) -> None:
+        self.db_pool = db_pool
+        self.directory = directory
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # spawn: forking a threaded server process could copy a held lock into the children.
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, asset_id: int, stored_name: str) -> Optional[Future]:
+        if Image is None:
+            self._record(asset_id, "stored", {})
+            return None
+        future = self._get_executor().submit(make_derivatives, self.directory, stored_name)
+        with self._lock:
+            self._pending[asset_id] = future
+        future.add_done_callback(lambda done: self._finish(asset_id, done))
+        return future
+
+    def _finish(self, asset_id: int, future: Future) -> None:
+        with self._lock:
+            self._pending.pop(asset_id, None)
+        try:
+            result = future.result()
+        except Exception:
+            self._record(asset_id, "failed", {})
+            return
+        self._record(asset_id, "ready", result)
+
+    def _record(self, asset_id: int, status: str, result: Dict[str, object]) -> None:
+        db = self.db_pool.acquire()
+        try:
+            db.execute(
+                """
+                UPDATE custom_request_asset
+                SET status = ?, thumbnail_name = ?, preview_name = ?, width = ?, height = ?
+                WHERE id = ?
+                """,
+                (status, result.get("thumbnail_name"), result.get("preview_name"), result.get("width"), result.get("height"), asset_id),
+            )
+            db.commit()
+        finally:
+            self.db_pool.release(db)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=wait)
+
+
+def init_app(app) -> None:
+    app.extensions["derivative_pool"] = DerivativePool(
+        app.extensions["db_pool"],
+        upload_dir(app),
+        app.config["CUSTOM_UPLOAD_WORKERS"],
+    )
+
+
+def save_request(form: MultiDict, stored: List[StoredUpload]) -> Tuple[int, List[int]]:
+    db = data.get_db()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        request_id = db.execute(
+            "INSERT INTO custom_request (name, email, deadline, budget, notes) VALUES (?, ?, ?, ?, ?)",
+            (
+                form.get("name", "").strip(),
+                form.get("email", "").strip(),
+                form.get("deadline") or None,
+                form.get("budget") or None,
+                form.get("notes", "").strip(),
+            ),
+        ).lastrowid
+        asset_ids = [
+            db.execute(
+                """
+                INSERT INTO custom_request_asset (request_id, original_name, stored_name, content_type, size)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (request_id, upload.original_name, upload.stored_name, upload.content_type, upload.size),
+            ).lastrowid
+            for upload in stored
+        ]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    pool: DerivativePool = current_app.extensions["derivative_pool"]
+    for asset_id, upload in zip(asset_ids, stored):
+        pool.submit(asset_id, upload.stored_name)
+    return request_id, asset_ids
@@ -0,0 +1,128 @@
+import json
+import os
+import random
+import sqlite3
+from typing import Iterator, List, Sequence, Tuple
+
+from flask import Flask
+
+from app import create_app
+from app.config import Config
+
+
+ADJECTIVES = [
+    "Aurora", "Cosmic", "Ember", "Flora", "Opal", "Riverstone", "Glacier", "Midnight", "Sunset", "Tide",
+    "Copper", "Meadow", "Garden", "Amber", "Violet", "Emerald", "Nebula", "Driftwood", "Moonlit", "Prism",
+]
+NOUNS = [
+    "Earrings", "Tray", "Ashtray", "Domino Set", "Bottle Opener", "Pendant", "Coaster", "Keychain",
+    "Ring Dish", "Bookmark", "Pin", "Bangle", "Charm", "Catchall", "Paperweight",
+]
+COLORWAYS = ["Violet", "Emerald", "Sunset", "Glacier", "Amber", "Copper", "Midnight", "Aurora", "Garden", "Meadow", "Opal", "Tide"]
+INLAYS = ["Gold leaf", "Pressed florals", "River rock", "Copper flake", "Mica", "Opal fleck", "Iridescent flakes", "Leaf"]
+SIZES = ["Standard", "Small", "Large", "Adjustable", "18 inch", "24 inch"]
+AVAILABILITY = ["in_stock", "in_stock", "in_stock", "made_to_order", "sold_out"]
+VIDEO_CATEGORIES = ["pours", "demolds", "finishing", "behind-the-scenes"]
+IMAGE_URL = "https://images.unsplash.com/photo-{seed}?auto=format&fit=crop&w=900&q=80"
+
+
+def _chunks(rows: Sequence, size: int = 5000) -> Iterator[Sequence]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def generate_catalog(
+    db: sqlite3.Connection,
+    products: int,
+    images_per_product: int = 3,
+    categories: int = 24,
+    reviews: int = 500,
+    cities: int = 50,
+    videos: int = 200,
+    seed: int = 1234,
+) -> None:
+    rng = random.Random(seed)
+
+    category_rows: List[Tuple] = [
+        (f"synthetic-category-{index}", f"Synthetic {NOUNS[index % len(NOUNS)]} {index}", "Generated category.", IMAGE_URL.format(seed=index))
+        for index in range(categories)
+    ]
+    db.executemany("INSERT INTO category (slug, name, description, hero_image) VALUES (?, ?, ?, ?)", category_rows)
+    category_ids = [row[0] for row in db.execute("SELECT id FROM category WHERE slug LIKE 'synthetic-category-%' ORDER BY id")]
+
+    product_rows: List[Tuple] = []
+    for index in range(products):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {index}"
+        colorways = rng.sample(COLORWAYS, rng.randint(1, 4))
+        inlays = rng.sample(INLAYS, rng.randint(0, 3))
+        product_rows.append(
+            (
+                f"synthetic-product-{index}",
+                name,
+                rng.choice(category_ids),
+                f"{name} hand-poured with {', '.join(inlays) or 'clear resin'} in {' and '.join(colorways)}.",
+                round(rng.uniform(12, 400), 2),
+                int(rng.random() < 0.3),
+                int(rng.random() < 0.1),
+                int(rng.random() < 0.15),
+                int(rng.random() < 0.4),
+                json.dumps({"engrave": rng.random() < 0.5, "colorways": colorways, "inlays": inlays}),
+                rng.choice(AVAILABILITY),
+                json.dumps({"sizes": rng.sample(SIZES, rng.randint(1, 2)), "colorways": colorways, "inlays": inlays}),
+            )
+        )
+    for chunk in _chunks(product_rows):
+        db.executemany(
+            """
+            INSERT INTO product (
+                slug, name, category_id, description, price, made_to_order, limited_drop, seasonal, bundle_eligible,
+                personalization_schema, availability, options
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            chunk,
+        )
+
+    product_ids = [row[0] for row in db.execute("SELECT id FROM product WHERE slug LIKE 'synthetic-product-%' ORDER BY id")]
+    image_rows = [
+        (product_id, IMAGE_URL.format(seed=f"{product_id}-{position}"), f"Synthetic image {position}", position)
+        for product_id in product_ids
+        for position in range(images_per_product)
+    ]
+    for chunk in _chunks(image_rows):
+        db.executemany("INSERT INTO product_image (product_id, image_url, alt_text, position) VALUES (?, ?, ?, ?)", chunk)
+
+    db.executemany(
+        "INSERT INTO review (quote, name, piece_ref) VALUES (?, ?, ?)",
+        [(f"Synthetic review {index}.", f"Reviewer {index}", f"Synthetic piece {index}") for index in range(reviews)],
+    )
+    db.executemany(
+        "INSERT INTO city_page (slug, title, intro, directions, hours) VALUES (?, ?, ?, ?, ?)",
+        [(f"synthetic-city-{index}", f"Synthetic City {index}", "Generated stop.", "Follow the signs.", "Weekends") for index in range(cities)],
+    )
+    db.executemany(
+        "INSERT INTO video (slug, title, category, thumbnail_url, video_url) VALUES (?, ?, ?, ?, ?)",
+        [
+            (f"synthetic-video-{index}", f"Synthetic Clip {index}", rng.choice(VIDEO_CATEGORIES), IMAGE_URL.format(seed=f"v{index}"), None)
+            for index in range(videos)
+        ],
+    )
+    db.commit()
+
+
+def synthetic_app(directory: str, products: int, **options) -> Flask:
+    class SyntheticConfig(Config):
+        INSTANCE_DIR = directory
+        AUTO_MIGRATE = True
+        DATABASE_PATH = os.path.join(directory, f"synthetic-{products}.db")
+        CUSTOM_UPLOAD_DIR = os.path.join(directory, "uploads")
+        IMAGE_ORIGINALS_DIR = os.path.join(directory, "images", "originals")
+        IMAGE_CACHE_DIR = os.path.join(directory, "images", "derived")
+        MEDIA_DIR = os.path.join(directory, "media")
+
+    app = create_app(SyntheticConfig)
+    with app.app_context():
+        from app import data, related
+
+        generate_catalog(data.get_db(), products, **options)
+        related.rebuild(data.get_db())
+    return app
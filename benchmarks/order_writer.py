@@ -0,0 +1,96 @@
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+
+from flask import current_app
+
+from app import data, orders
+
+from .catalog import synthetic_app
+
+
+def _order(index: int) -> orders.NewOrder:
+    lines = [orders.OrderLine(1 + (index + n) % 50, f"Synthetic {n}", 1 + n, 24.0, {"colorway": "Violet"}, {}) for n in range(3)]
+    subtotal = sum(line.unit_price * line.quantity for line in lines)
+    return orders.NewOrder(
+        f"buyer{index}@example.com", "", "", "1 Market St", "Harrisburg", "17101", "PA",
+        subtotal, round(subtotal * 0.06, 2), 8.0, round(subtotal * 1.06 + 8, 2), lines,
+    )
+
+
+def _direct_commit(pool: data.ConnectionPool, order: orders.NewOrder) -> int:
+    db = pool.acquire()
+    try:
+        db.execute("PRAGMA synchronous = FULL")
+        db.execute("BEGIN IMMEDIATE")
+        order_id = orders._insert_order(db, order)
+        db.commit()
+        return order_id
+    finally:
+        db.execute("PRAGMA synchronous = NORMAL")
+        pool.release(db)
+
+
+def _drive(submit, clients: int, per_client: int) -> tuple:
+    ids: List[int] = []
+    errors: List[BaseException] = []
+    lock = threading.Lock()
+
+    def client(offset: int) -> None:
+        for n in range(per_client):
+            try:
+                order_id = submit(_order(offset * per_client + n))
+            except BaseException as exc:  # collected and reported, not raised in the worker
+                with lock:
+                    errors.append(exc)
+                continue
+            with lock:
+                ids.append(order_id)
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return ids, errors, time.perf_counter() - started
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare batched single-writer order commits with one transaction per order.")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=5, help="orders per client")
+    args = parser.parse_args(argv)
+    total = args.clients * args.orders
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = synthetic_app(directory, 50)
+        with app.app_context():
+            pool = current_app.extensions["db_pool"]
+            writer: orders.OrderWriter = current_app.extensions["order_writer"]
+
+            ids, errors, elapsed = _drive(lambda order: _direct_commit(pool, order), args.clients, args.orders)
+            print(f"per-order transactions: {len(ids)}/{total} committed, {len(errors)} errors, {total / elapsed:,.0f} orders/s")
+
+            ids, errors, elapsed = _drive(lambda order: writer.submit(order, timeout=60), args.clients, args.orders)
+            print(f"single writer:          {len(ids)}/{total} committed, {len(errors)} errors, {total / elapsed:,.0f} orders/s")
+            for key, value in writer.stats().items():
+                print(f"    {key}: {value}")
+            writer.close()
+
+            duplicate_ids = len(ids) - len(set(ids))
+            stored = data.get_db().execute(
+                "SELECT COUNT(*) FROM customer_order WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),)
+            ).fetchone()[0]
+    if errors or duplicate_ids or stored != len(ids):
+        print(f"FAIL: {len(errors)} errors, {duplicate_ids} duplicate ids, {stored}/{len(ids)} ids stored")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
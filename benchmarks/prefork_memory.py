@@ -0,0 +1,137 @@
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List
+
+from .catalog import synthetic_app
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ("/", "/shop/", "/shop/?colorway=Violet&inlay=Mica", "/shop/category/synthetic-category-3", "/shop/search?q=cosmic+tray")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii") as handle:
+                fields = handle.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def _memory(pid: int) -> Dict[str, int]:
+    # smaps_rollup splits resident pages into shared and private, which plain RSS cannot show.
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as handle:
+        for line in handle:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "private": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def _wait_until_serving(url: str, server: subprocess.Popen, timeout: float = 300) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"server exited with {server.returncode}")
+        try:
+            urllib.request.urlopen(url, timeout=5).read()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise SystemExit(f"server did not answer {url} within {timeout:.0f}s")
+
+
+def measure(directory: str, database_path: str, workers: int, threads: int, preload: bool, requests: int) -> Dict[str, float]:
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_PATH=database_path,
+        FLASK_INSTANCE_PATH=directory,
+        SERVER_BIND=f"127.0.0.1:{port}",
+        SERVER_WORKERS=str(workers),
+        SERVER_THREADS=str(threads),
+        SERVER_PRELOAD="1" if preload else "0",
+        CATALOG_RELOAD_SECONDS="0",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        _wait_until_serving(base + "/about", server)
+        # Enough traffic that every worker serves each listing at least once.
+        for _ in range(requests * workers):
+            for path in PATHS:
+                urllib.request.urlopen(base + path, timeout=30).read()
+        worker_pids = _children(server.pid)
+        master = _memory(server.pid)
+        per_worker = [_memory(pid) for pid in worker_pids]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+    count = len(per_worker) or 1
+    return {
+        "workers": len(per_worker),
+        "master_rss": master["rss"] / 1024,
+        "worker_rss": sum(item["rss"] for item in per_worker) / count / 1024,
+        "worker_private": sum(item["private"] for item in per_worker) / count / 1024,
+        "total_pss": (master["pss"] + sum(item["pss"] for item in per_worker)) / 1024,
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-worker memory of the prefork server, with and without a preloaded catalog snapshot.")
+    parser.add_argument("--products", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=10, help="rounds of listing requests per worker before sampling")
+    args = parser.parse_args(argv)
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        raise SystemExit("needs Linux /proc/<pid>/smaps_rollup")
+
+    print(f"{'products':>9} {'preload':>8} {'workers':>8} {'master RSS':>11} {'worker RSS':>11} {'private':>9} {'total PSS':>10}  (MiB)")
+    for products in args.products:
+        with tempfile.TemporaryDirectory() as directory:
+            app = synthetic_app(directory, products)
+            app.extensions["order_writer"].close()
+            app.extensions["hold_sweeper"].close()
+            app.extensions["related_refresher"].close()
+            app.extensions["derivative_pool"].shutdown()
+            app.extensions["db_pool"].close_all()
+            for preload in (False, True):
+                result = measure(directory, app.config["DATABASE_PATH"], args.workers, args.threads, preload, args.requests)
+                print(
+                    f"{products:>9,} {'yes' if preload else 'no':>8} {result['workers']:>8} {result['master_rss']:>11.1f}"
+                    f" {result['worker_rss']:>11.1f} {result['worker_private']:>9.1f} {result['total_pss']:>10.1f}"
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import argparse
+import sqlite3
+import sys
+import tempfile
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Tuple
+
+from flask import current_app
+
+from app import data
+
+from .catalog import synthetic_app
+
+
+class PlanCheck(NamedTuple):
+    name: str
+    call: Callable[[], object]
+    allowed_scans: FrozenSet[str] = frozenset()
+    allow_temp_sort: bool = False
+
+
+CHECKS: List[PlanCheck] = [
+    PlanCheck("get_categories", lambda: data.get_categories()),
+    PlanCheck("get_category_by_slug", lambda: data.get_category_by_slug("synthetic-category-3")),
+    PlanCheck("get_products", lambda: data.get_products()),
+    PlanCheck("get_products[limited]", lambda: data.get_products(limited=True)),
+    PlanCheck("get_products[category]", lambda: data.get_products(category_slug="synthetic-category-3")),
+    PlanCheck("get_products[search]", lambda: data.get_products(search_term="cosmic tray"), allow_temp_sort=True),
+    PlanCheck("get_products[seasonal]", lambda: data.get_products(seasonal=True)),
+    PlanCheck("get_products_page", lambda: data.get_products_page(after=data.get_products_page().next_cursor)),
+    PlanCheck("get_products_page[limited]", lambda: data.get_products_page(limited=True, after=data.get_products_page(limited=True).next_cursor)),
+    PlanCheck("get_products_page[seasonal]", lambda: data.get_products_page(seasonal=True, after=data.get_products_page(seasonal=True).next_cursor)),
+    PlanCheck(
+        "get_products_page[category]",
+        lambda: data.get_products_page(
+            category_slug="synthetic-category-3",
+            after=data.get_products_page(category_slug="synthetic-category-3").next_cursor,
+        ),
+    ),
+    PlanCheck("get_products_page[search]", lambda: data.get_products_page(search_term="cosmic"), allow_temp_sort=True),
+    PlanCheck("get_product_by_slug", lambda: data.get_product_by_slug("synthetic-product-42")),
+    PlanCheck("get_product_images", lambda: data.get_product_images(42)),
+    PlanCheck("get_product_images_bulk", lambda: data.get_product_images_bulk(range(1, 500))),
+    PlanCheck("get_products_by_ids", lambda: data.get_products_by_ids(range(1, 50))),
+    PlanCheck("get_products_by_slugs", lambda: data.get_products_by_slugs(f"synthetic-product-{n}" for n in range(1, 50))),
+    PlanCheck("get_related_products", lambda: data.get_related_products(42)),
+    PlanCheck("get_facet_rows", lambda: data.get_facet_rows(), allowed_scans=frozenset({"product"})),
+    PlanCheck("get_facet_rows[ids]", lambda: data.get_facet_rows(range(1, 50))),
+    PlanCheck("get_option_rows", lambda: data.get_option_rows(), allowed_scans=frozenset({"product_option_value"})),
+    PlanCheck("get_option_rows[ids]", lambda: data.get_option_rows(range(1, 50))),
+    PlanCheck("get_product_change_window", lambda: data.get_product_change_window()),
+    PlanCheck("get_product_changes", lambda: data.get_product_changes(0)),
+    PlanCheck("get_inventory", lambda: data.get_inventory(42)),
+    PlanCheck("get_option_values", lambda: data.get_option_values()),
+    PlanCheck("get_option_values[kind]", lambda: data.get_option_values("colorways")),
+    PlanCheck("get_reviews", lambda: data.get_reviews(limit=3), allowed_scans=frozenset({"review"})),
+    PlanCheck("get_city_pages", lambda: data.get_city_pages(), allowed_scans=frozenset({"city_page"})),
+    PlanCheck("get_city_page", lambda: data.get_city_page("synthetic-city-7")),
+    PlanCheck("get_videos_grouped", lambda: data.get_videos_grouped()),
+]
+
+
+def _capture(check: PlanCheck) -> List[str]:
+    statements: List[str] = []
+    db = data.get_db()
+    current_app.extensions["catalog_cache"].clear()
+    db.set_trace_callback(statements.append)
+    try:
+        check.call()
+    finally:
+        db.set_trace_callback(None)
+    # FTS5 reads its shadow tables through the same connection; those are not ours to index.
+    return [sql for sql in statements if sql.lstrip().upper().startswith("SELECT") and "'main'." not in sql]
+
+
+def _problems(db: sqlite3.Connection, sql: str, check: PlanCheck) -> List[str]:
+    problems = []
+    for row in db.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        detail = row[3]
+        if detail.startswith("SCAN ") and "USING" not in detail and "VIRTUAL TABLE" not in detail and "CONSTANT ROW" not in detail:
+            if detail.split()[1] not in check.allowed_scans:
+                problems.append(detail)
+        if "TEMP B-TREE" in detail and not check.allow_temp_sort:
+            problems.append(detail)
+    return problems
+
+
+def uncovered_accessors() -> List[str]:
+    covered = {check.name.split("[")[0] for check in CHECKS}
+    accessors = {name for name in dir(data) if name.startswith("get_") and name != "get_db"}
+    return sorted(accessors - covered)
+
+
+def check_plan(check: PlanCheck) -> List[Tuple[str, List[str]]]:
+    """Run one check inside an app context; returns (statement, problems) for every statement that scans or sorts."""
+    statements = _capture(check)
+    if not statements:
+        return [("<no SELECT captured>", [])]
+    db = data.get_db()
+    return [(sql, problems) for sql in statements for problems in [_problems(db, sql, check)] if problems]
+
+
+def run(products: int) -> Dict[str, List[Tuple[str, List[str]]]]:
+    failures: Dict[str, List[Tuple[str, List[str]]]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        app = synthetic_app(directory, products)
+        with app.app_context():
+            for name in uncovered_accessors():
+                failures[name] = [("<no plan check registered>", [])]
+            for check in CHECKS:
+                entries = check_plan(check)
+                if entries:
+                    failures[check.name] = entries
+    return failures
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fail when a data.py query regresses to a full scan or temp sort.")
+    parser.add_argument("--products", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    failures = run(args.products)
+    for name, entries in failures.items():
+        for sql, problems in entries:
+            print(f"FAIL {name}: {' | '.join(problems) or sql}")
+            if problems:
+                print("    " + " ".join(sql.split()))
+    if failures:
+        return 1
+    print(f"OK: {len(CHECKS)} query plans checked against {args.products} products")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
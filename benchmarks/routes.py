@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from flask import Flask
+from flask.testing import FlaskClient
+
+from app import cart, data
+
+from .catalog import synthetic_app
+
+
+BLUEPRINTS = ("main", "shop", "custom", "media", "checkout")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "routes.json")
+VIDEO_NAME = "synthetic-demold.mp4"
+CHECKOUT_FORM = {"email": "bench@example.com", "address": "1 Market St", "city": "Harrisburg", "zip": "17101", "state": "PA"}
+
+
+class Case(NamedTuple):
+    name: str
+    method: str
+    path: str
+    form: Optional[Dict[str, Any]] = None
+    headers: Optional[Dict[str, str]] = None
+    prepare: Optional[Callable[[FlaskClient], None]] = None
+    # Path a redirect must land on; a redirect anywhere else means the case measured an error path.
+    location: Optional[str] = None
+
+
+class StatementCounter:
+    # Installed as the sqlite3 trace callback on every pooled connection, including the order writer's.
+    def __init__(self) -> None:
+        self.count = 0
+        self._lock = threading.Lock()
+        self._traced: "set[int]" = set()
+
+    def __call__(self, statement: str) -> None:
+        with self._lock:
+            self.count += 1
+
+    def install(self, app: Flask) -> None:
+        pool: data.ConnectionPool = app.extensions["db_pool"]
+        acquire = pool.acquire
+
+        def traced_acquire(readonly: bool = False) -> sqlite3.Connection:
+            db = acquire(readonly)
+            if id(db) not in self._traced:
+                db.set_trace_callback(self)
+                self._traced.add(id(db))
+            return db
+
+        pool.acquire = traced_acquire
+
+    def take(self) -> int:
+        with self._lock:
+            count, self.count = self.count, 0
+        return count
+
+
+def _add_to_cart(product_id: int) -> Callable[[FlaskClient], None]:
+    def prepare(client: FlaskClient) -> None:
+        client.post("/cart/add", data={"product_id": product_id, "quantity": 1})
+
+    return prepare
+
+
+def build_cases(products: int) -> List[Case]:
+    middle = products // 2 or 1
+    product_slug = f"synthetic-product-{middle}"
+    line = cart.line_key([middle, 1, {}, {}])
+    return [
+        Case("main.home", "GET", "/"),
+        Case("main.about", "GET", "/about"),
+        Case("main.visit", "GET", "/visit"),
+        Case("main.local_page", "GET", "/visit/synthetic-city-7"),
+        Case("main.care", "GET", "/care"),
+        Case("main.faq", "GET", "/faq"),
+        Case("main.reviews_page", "GET", "/reviews"),
+        Case("main.contact", "GET", "/contact"),
+        Case("main.contact[post]", "POST", "/contact", form={"name": "Bench", "email": "bench@example.com", "message": "Hello"}),
+        Case("main.shipping_policy", "GET", "/policies/shipping"),
+        Case("main.returns_policy", "GET", "/policies/returns"),
+        Case("main.privacy_policy", "GET", "/policies/privacy"),
+        Case("main.terms_policy", "GET", "/policies/terms"),
+        Case("main.subscribe", "POST", "/subscribe", form={"email": "bench@example.com"}),
+        Case("main.subscribe_local", "POST", "/subscribe/local", form={"email": "bench@example.com", "zip": "17101"}),
+        Case("shop.list_products", "GET", "/shop/"),
+        Case("shop.list_products[facets]", "GET", "/shop/?colorway=Violet&inlay=Mica&price_max=200"),
+        Case("shop.filter_products", "GET", "/shop/filter?colorway=Violet&inlay=Mica"),
+        Case("shop.category", "GET", "/shop/category/synthetic-category-3"),
+        Case("shop.product", "GET", f"/shop/product/{product_slug}"),
+        Case("shop.search", "GET", "/shop/search?q=cosmic+tray"),
+        Case("shop.limited", "GET", "/shop/limited"),
+        Case("shop.seasonal", "GET", "/shop/seasonal"),
+        Case("custom.how_it_works", "GET", "/custom/how-it-works"),
+        Case("custom.inspiration", "GET", "/custom/inspiration"),
+        Case("custom.intake_form", "GET", "/custom/start"),
+        Case("custom.intake_form[post]", "POST", "/custom/start", form={"name": "Bench", "email": "bench@example.com", "notes": "A tray."}),
+        Case("media.videos", "GET", "/videos/"),
+        Case("media.stream", "GET", f"/videos/stream/{VIDEO_NAME}"),
+        Case("media.stream[range]", "GET", f"/videos/stream/{VIDEO_NAME}", headers={"Range": "bytes=1048576-2097151"}),
+        Case("checkout.cart", "GET", "/cart", prepare=_add_to_cart(middle)),
+        Case("checkout.add_to_cart", "POST", "/cart/add", form={"product_id": middle, "quantity": 1}),
+        Case("checkout.update_cart", "POST", "/cart/update", form={"line": line, "quantity": 2}, prepare=_add_to_cart(middle)),
+        Case("checkout.remove_from_cart", "POST", "/cart/remove", form={"line": line}, prepare=_add_to_cart(middle)),
+        Case("checkout.checkout_view", "GET", "/checkout", prepare=_add_to_cart(middle)),
+        Case("checkout.checkout_view[post]", "POST", "/checkout", form=CHECKOUT_FORM, prepare=_add_to_cart(middle), location="/checkout/success"),
+        Case("checkout.success", "GET", "/checkout/success?order=1"),
+    ]
+
+
+def uncovered_endpoints(app: Flask, cases: List[Case]) -> List[str]:
+    adapter = app.url_map.bind("localhost")
+    covered = {adapter.match(case.path.split("?")[0], method=case.method)[0] for case in cases}
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.split(".")[0] in BLUEPRINTS}
+    return sorted(endpoints - covered)
+
+
+def _prepare_files(app: Flask) -> None:
+    os.makedirs(app.config["MEDIA_DIR"], exist_ok=True)
+    with open(os.path.join(app.config["MEDIA_DIR"], VIDEO_NAME), "wb") as handle:
+        handle.write(os.urandom(8 * 1024 * 1024))
+
+
+def _request(client: FlaskClient, case: Case) -> int:
+    response = client.open(case.path, method=case.method, data=case.form, headers=case.headers)
+    # Drain streamed bodies so template streaming and file responses are measured end to end.
+    for _ in response.response:
+        pass
+    response.close()
+    if case.location is not None and urlsplit(response.location or "").path != case.location:
+        raise SystemExit(f"{case.name}: expected a redirect to {case.location}, got {response.status_code} {response.location}")
+    return response.status_code
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(app: Flask, case: Case, iterations: int, warmup: int, counter: StatementCounter) -> Dict[str, Any]:
+    client = app.test_client()
+    for _ in range(warmup):
+        if case.prepare:
+            case.prepare(client)
+        _request(client, case)
+
+    timings: List[float] = []
+    queries: List[int] = []
+    statuses = set()
+    for _ in range(iterations):
+        if case.prepare:
+            case.prepare(client)
+        counter.take()
+        started = time.perf_counter()
+        statuses.add(_request(client, case))
+        timings.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.take())
+
+    # tracemalloc slows every allocation, so memory gets its own short pass after the timed one.
+    tracemalloc.start()
+    peaks = []
+    for _ in range(3):
+        if case.prepare:
+            case.prepare(client)
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        _request(client, case)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    return {
+        "status": sorted(statuses),
+        "p50": round(_percentile(timings, 0.50), 3),
+        "p95": round(_percentile(timings, 0.95), 3),
+        "p99": round(_percentile(timings, 0.99), 3),
+        "queries": max(queries),
+        "peak_kib": round(max(peaks) / 1024, 1),
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    # Latency and memory get a relative tolerance plus an absolute floor; statement counts are deterministic.
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result["queries"] > previous["queries"]:
+            regressions.append(f"{name}: queries {previous['queries']} -> {result['queries']}")
+        if result["p95"] > previous["p95"] * (1 + tolerance) and result["p95"] - previous["p95"] > 1.0:
+            regressions.append(f"{name}: p95 {previous['p95']:.2f}ms -> {result['p95']:.2f}ms")
+        if result["peak_kib"] > previous["peak_kib"] * (1 + tolerance) and result["peak_kib"] - previous["peak_kib"] > 64:
+            regressions.append(f"{name}: peak memory {previous['peak_kib']:.0f}KiB -> {result['peak_kib']:.0f}KiB")
+    return regressions
+
+
+def run(products: int, iterations: int, warmup: int) -> Dict[str, Dict[str, Any]]:
+    with tempfile.TemporaryDirectory() as directory:
+        app = synthetic_app(directory, products)
+        _prepare_files(app)
+        cases = build_cases(products)
+        missing = uncovered_endpoints(app, cases)
+        if missing:
+            raise SystemExit(f"routes without a benchmark case: {', '.join(missing)}")
+        counter = StatementCounter()
+        counter.install(app)
+        results = {}
+        for case in cases:
+            results[case.name] = measure(app, case, iterations, warmup, counter)
+        app.extensions["order_writer"].close()
+        app.extensions["hold_sweeper"].close()
+        app.extensions["related_refresher"].close()
+        app.extensions["derivative_pool"].shutdown()
+    return results
+
+
+def _print(products: int, results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"\n{products:,} products")
+    print(f"    {'route':<34} {'status':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'peak KiB':>9}")
+    for name, result in results.items():
+        status = ",".join(str(code) for code in result["status"])
+        print(
+            f"    {name:<34} {status:>8} {result['p50']:>8.2f} {result['p95']:>8.2f} {result['p99']:>8.2f}"
+            f" {result['queries']:>8} {result['peak_kib']:>9.1f}"
+        )
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Drive every HTML route against synthetic catalogs and compare with a stored baseline.")
+    parser.add_argument("--products", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results to --baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p95/memory growth before failing")
+    args = parser.parse_args(argv)
+
+    stored: Dict[str, Dict[str, Any]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as handle:
+            stored = json.load(handle)
+
+    regressions = []
+    for products in args.products:
+        results = run(products, args.iterations, args.warmup)
+        _print(products, results)
+        if args.save_baseline:
+            stored[str(products)] = results
+        elif str(products) in stored:
+            regressions += [f"[{products}] {problem}" for problem in compare(results, stored[str(products)], args.tolerance)]
+        else:
+            print(f"    no baseline for {products} products")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(stored, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        print(f"\nbaseline written to {args.baseline}")
+        return 0
+    for problem in regressions:
+        print(f"REGRESSION: {problem}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from app import data
+
+from .catalog import synthetic_app
+
+
+PRODUCT_ID = 1
+VARIANT = data.variant_key({"colorway": "Violet"})
+
+
+def _client(app, seed: int, attempts: int, totals: Dict[str, int], lock: threading.Lock) -> None:
+    rng = random.Random(seed)
+    counts = {"reserved": 0, "confirmed": 0, "released": 0, "abandoned": 0, "sold_out": 0, "busy": 0}
+    with app.app_context():
+        for _ in range(attempts):
+            quantity = rng.choice((1, 1, 1, 2))
+            variant = rng.choice(("", VARIANT))
+            try:
+                token = data.reserve_stock([(PRODUCT_ID, variant, quantity)], ttl=rng.choice((0.05, 60)))
+            except data.OutOfStock:
+                counts["sold_out"] += 1
+                continue
+            except sqlite3.OperationalError:
+                counts["busy"] += 1
+                continue
+            counts["reserved"] += 1
+            outcome = rng.random()
+            if outcome < 0.6:
+                if data.confirm_reservation(token):
+                    counts["confirmed"] += quantity
+                else:
+                    counts["abandoned"] += 1
+            elif outcome < 0.8:
+                data.release_reservation(token)
+                counts["released"] += 1
+            else:
+                counts["abandoned"] += 1
+            data.close_db()
+    with lock:
+        for key, value in counts.items():
+            totals[key] = totals.get(key, 0) + value
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Hammer one SKU from many threads and check that stock never oversells.")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--attempts", type=int, default=200, help="reservation attempts per thread")
+    parser.add_argument("--stock", type=int, default=500, help="product-level units on hand")
+    parser.add_argument("--variant-stock", type=int, default=150, help="units on hand for the Violet variant")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = synthetic_app(directory, 50)
+        app.config["STOCK_HOLD_SWEEP_SECONDS"] = 0.1
+        with app.app_context():
+            data.set_inventory(PRODUCT_ID, args.stock)
+            data.set_inventory(PRODUCT_ID, args.variant_stock, VARIANT)
+
+        totals: Dict[str, int] = {}
+        lock = threading.Lock()
+        threads = [threading.Thread(target=_client, args=(app, seed, args.attempts, totals, lock)) for seed in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        time.sleep(0.1)
+        with app.app_context():
+            data.expire_holds(time.time() + 3600)
+            stock = {row["variant"]: row for row in data.get_inventory(PRODUCT_ID)}
+            variant_confirmed = args.variant_stock - stock[VARIANT]["on_hand"]
+        app.extensions["hold_sweeper"].close()
+
+    attempts = args.threads * args.attempts
+    print(f"{attempts} attempts from {args.threads} threads in {elapsed:.2f}s: {attempts / elapsed:,.0f} reservation attempts/s")
+    print(f"    {totals['reserved'] / elapsed:,.0f} successful reservations/s")
+    for key in sorted(totals):
+        print(f"    {key}: {totals[key]}")
+    print(f"    product on_hand: {stock['']['on_hand']} reserved: {stock['']['reserved']}")
+    print(f"    variant on_hand: {stock[VARIANT]['on_hand']} reserved: {stock[VARIANT]['reserved']}")
+
+    problems = []
+    if stock[""]["on_hand"] != args.stock - totals["confirmed"]:
+        problems.append("product on_hand does not match confirmed units")
+    if stock[""]["on_hand"] < 0 or stock[VARIANT]["on_hand"] < 0 or variant_confirmed > args.variant_stock:
+        problems.append("oversold")
+    if stock[""]["reserved"] or stock[VARIANT]["reserved"]:
+        problems.append("holds left reserved after expiry")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""Production server: ``gunicorn -c gunicorn.conf.py``.
+
+The app is loaded and the catalog snapshot built once in the master, then workers are forked from it.
+A catalog change sends the master SIGHUP: it refreshes its snapshot and gracefully replaces the workers.
+"""
+import os
+import signal
+
+from app import snapshot
+from app.config import Config
+
+
+wsgi_app = "run:app"
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS
+threads = Config.SERVER_THREADS
+worker_class = "gthread"
+preload_app = Config.SERVER_PRELOAD
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    app = server.app.wsgi()
+    generation = snapshot.build(app)
+    if Config.CATALOG_RELOAD_SECONDS > 0:
+        # Kept on the arbiter: this file is re-executed on every reload, the arbiter is not.
+        server.catalog_watcher = snapshot.CatalogWatcher(
+            app.config["DATABASE_PATH"], generation, Config.CATALOG_RELOAD_SECONDS, lambda: os.kill(server.pid, signal.SIGHUP)
+        )
+        server.catalog_watcher.start()
+
+
+def on_reload(server):
+    # Runs in the master before the replacement workers are forked, so they start from the new catalog.
+    if not server.cfg.preload_app:
+        return
+    generation = snapshot.build(server.app.wsgi())
+    watcher = getattr(server, "catalog_watcher", None)
+    if watcher is not None:
+        watcher.generation = generation
+
+
+def post_worker_init(worker):
+    # Without preloading, each worker builds a private snapshot before it accepts requests.
+    if not worker.cfg.preload_app:
+        snapshot.build(worker.wsgi)
+
+
+def on_exit(server):
+    watcher = getattr(server, "catalog_watcher", None)
+    if watcher is not None:
+        watcher.close()
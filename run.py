@@ -1,8 +1,10 @@
-from app import create_app
+from app import create_app, data
 
 
 app = create_app()
 
 
 if __name__ == "__main__":
+    with app.app_context():
+        data.upgrade()
     app.run(debug=True)
@@ -0,0 +1,26 @@
+module.exports = {
+  content: ['./app/templates/**/*.html', './app/static/js/**/*.js'],
+  theme: {
+    extend: {
+      fontFamily: {
+        sans: ['Inter', 'ui-sans-serif', 'system-ui'],
+      },
+      colors: {
+        base: {
+          900: '#050508',
+          800: '#0b0b0f',
+          700: '#14141d',
+          600: '#1d1d2a',
+        },
+        accent: {
+          500: '#8fd3ff',
+          400: '#b0e4ff',
+          300: '#def3ff'
+        }
+      },
+      boxShadow: {
+        glow: '0 0 0 1px rgba(255,255,255,0.08), 0 20px 50px rgba(5,5,8,0.55)',
+      }
+    }
+  }
+};
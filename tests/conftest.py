@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from app import create_app, data
+from app.config import Config
+
+
+def make_app(directory, **overrides):
+    class TestConfig(Config):
+        TESTING = True
+        SECRET_KEY = "test-secret"
+        INSTANCE_DIR = str(directory)
+        AUTO_MIGRATE = True
+        DATABASE_PATH = os.path.join(directory, "test.db")
+        CUSTOM_UPLOAD_DIR = os.path.join(directory, "uploads")
+        IMAGE_ORIGINALS_DIR = os.path.join(directory, "images", "originals")
+        IMAGE_CACHE_DIR = os.path.join(directory, "images", "derived")
+        MEDIA_DIR = os.path.join(directory, "media")
+        SQL_INSTRUMENTATION = False
+
+    for name, value in overrides.items():
+        setattr(TestConfig, name, value)
+    return create_app(TestConfig)
+
+
+def shutdown(app) -> None:
+    app.extensions["order_writer"].close()
+    app.extensions["hold_sweeper"].close()
+    app.extensions["related_refresher"].close()
+    app.extensions["derivative_pool"].shutdown()
+    app.extensions["db_pool"].close_all()
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path)
+    yield app
+    shutdown(app)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def db(app):
+    with app.app_context():
+        yield data.get_db()
+
+
+@pytest.fixture
+def statements(app, monkeypatch):
+    # Every SQL statement the app runs from here on, including ones on pooled connections acquired later.
+    traced = []
+    pool = app.extensions["db_pool"]
+    acquire = pool.acquire
+
+    def traced_acquire(readonly=False):
+        db = acquire(readonly)
+        db.set_trace_callback(traced.append)
+        return db
+
+    monkeypatch.setattr(pool, "acquire", traced_acquire)
+    return traced
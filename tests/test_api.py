@@ -0,0 +1,63 @@
+import pytest
+
+from app.blueprints.api.routes import PRODUCT_FIELDS
+
+
+def test_product_has_every_field(client):
+    payload = client.get("/api/v1/products/opal-pendant").get_json()["data"]
+    assert set(payload) == set(PRODUCT_FIELDS)
+    assert isinstance(payload["limited_drop"], bool)
+    assert all(set(image) == {"id", "image_url", "alt_text", "position"} for image in payload["images"])
+
+
+def test_fields_select_the_output(client):
+    response = client.get("/api/v1/products/opal-pendant", query_string={"fields": "price, slug,price"})
+    assert set(response.get_json()["data"]) == {"price", "slug"}
+
+
+def test_unknown_fields_are_a_json_400(client):
+    response = client.get("/api/v1/products", query_string={"fields": "slug,secret"})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": {"status": 400, "message": "Unknown fields: secret"}}
+
+
+def test_products_page_through_with_the_cursor(client):
+    slugs, after = [], None
+    while True:
+        query = {"fields": "slug", "limit": 2, **({"after": after} if after else {})}
+        payload = client.get("/api/v1/products", query_string=query).get_json()
+        slugs += [record["slug"] for record in payload["data"]]
+        after = payload["next_cursor"]
+        if after is None:
+            break
+    everything = client.get("/api/v1/products", query_string={"fields": "slug", "limit": 100}).get_json()["data"]
+    assert slugs == [record["slug"] for record in everything]
+    assert len(slugs) == len(set(slugs)) > 2
+
+
+@pytest.mark.parametrize("query", [{"limit": "0"}, {"limit": "many"}, {"limit": "10000"}, {"after": "not-a-cursor"}])
+def test_bad_paging_is_a_400(client, query):
+    assert client.get("/api/v1/products", query_string=query).status_code == 400
+
+
+def test_bulk_keeps_request_order_and_reports_missing(client):
+    response = client.get("/api/v1/products/bulk", query_string={"slugs": "opal-pendant,nope,ember-ashtray", "fields": "slug"})
+    payload = response.get_json()
+    assert sorted(record["slug"] for record in payload["data"]) == ["ember-ashtray", "opal-pendant"]
+    assert payload["missing"] == ["nope"]
+
+
+def test_bulk_needs_slugs(client):
+    assert client.get("/api/v1/products/bulk").status_code == 400
+
+
+@pytest.mark.parametrize("path", ["/api/v1/products/nope", "/api/v1/categories/nope", "/api/v1/cities/nope"])
+def test_missing_records_are_a_json_404(client, path):
+    response = client.get(path)
+    assert response.status_code == 404
+    assert response.get_json()["error"]["status"] == 404
+
+
+def test_responses_revalidate(client):
+    first = client.get("/api/v1/categories")
+    assert client.get("/api/v1/categories", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
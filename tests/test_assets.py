@@ -0,0 +1,46 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from app import assets
+
+SCRIPT = """const banner = `
+  // not a comment: this line is part of the string
+    indented text`;
+const url = "http://example.com"; // trailing comment
+"""
+
+
+@pytest.fixture
+def static_folder(app, tmp_path, monkeypatch):
+    folder = tmp_path / "static"
+    shutil.copytree(app.static_folder, folder, ignore=shutil.ignore_patterns(assets.DIST_DIR))
+    (folder / assets.JS_SOURCES[0]).write_text(SCRIPT, encoding="utf-8")
+    monkeypatch.setattr(assets, "compile_tailwind", lambda command, project_root: ".tw{color:red}")
+    return str(folder)
+
+
+def test_build_keeps_scripts_intact(static_folder):
+    manifest = assets.build(static_folder, os.path.dirname(static_folder), "unused")
+    with open(os.path.join(static_folder, manifest["dist/site.js"]), encoding="utf-8") as handle:
+        script = handle.read()
+    assert script.startswith(SCRIPT)
+    for name in assets.JS_SOURCES[1:]:
+        with open(os.path.join(static_folder, name), encoding="utf-8") as handle:
+            assert handle.read() in script
+
+
+def test_build_fingerprints_and_precompresses(static_folder):
+    manifest = assets.build(static_folder, os.path.dirname(static_folder), "unused")
+    with open(os.path.join(static_folder, assets.DIST_DIR, assets.MANIFEST_NAME), encoding="utf-8") as handle:
+        assert json.load(handle) == manifest
+    for logical in ("dist/site.css", "dist/site.js"):
+        hashed = manifest[logical]
+        assert hashed != logical
+        assert os.path.exists(os.path.join(static_folder, hashed + ".gz"))
+
+
+def test_minify_css_drops_comments_and_whitespace():
+    assert assets.minify_css("/* note */\n.a  >  .b {\n  color: red;\n  margin: 0;\n}\n") == ".a>.b{color: red;margin: 0}"
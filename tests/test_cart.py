@@ -0,0 +1,96 @@
+import pytest
+from itsdangerous import URLSafeSerializer
+
+from app import cart, data
+
+JSON = {"Accept": "application/json"}
+
+
+def _add(client, product_id, **fields):
+    return client.post("/cart/add", data={"product_id": product_id, **fields}, headers=JSON)
+
+
+def _signed(app, lines, secret=None):
+    return URLSafeSerializer(secret or app.secret_key, salt="cart").dumps(lines)
+
+
+def _load(app, cookie):
+    with app.test_request_context(headers={"Cookie": f"{cart.COOKIE_NAME}={cookie}"}):
+        return cart.load()
+
+
+def test_cart_lives_in_a_signed_cookie(app, client):
+    assert _add(client, 1, colorway="Violet", quantity=2).get_json()["cart_count"] == 2
+    assert _add(client, 1, colorway="Violet").get_json()["cart_count"] == 3
+    cookie = client.get_cookie(cart.COOKIE_NAME)
+    assert cookie.http_only
+    assert _load(app, cookie.value) == [[1, 3, {"colorway": "Violet"}, {}]]
+
+
+def test_tampered_or_foreign_cookies_are_ignored(app, client):
+    _add(client, 1, colorway="Violet")
+    value = client.get_cookie(cart.COOKIE_NAME).value
+    assert _load(app, value[:-1] + ("B" if value.endswith("A") else "A")) == []
+    assert _load(app, _signed(app, [[1, 1, {}, {}]], secret="someone-else")) == []
+    assert _load(app, "garbage") == []
+
+
+def test_malformed_lines_are_dropped(app):
+    lines = [[1, 1, {}, {}], [2, 0, {}, {}], [3, -4, {}, {}], ["4", 1, {}, {}], [5, 1, []], "line"]
+    assert _load(app, _signed(app, lines)) == [[1, 1, {}, {}]]
+
+
+def test_quantities_and_lines_are_clamped(app, client):
+    app.config["CART_MAX_QUANTITY"] = 3
+    app.config["CART_MAX_LINES"] = 2
+    assert _add(client, 1, quantity=10).get_json()["cart_count"] == 3
+    assert _add(client, 2).get_json()["cart_count"] == 4
+    response = _add(client, 3)
+    assert response.status_code == 409
+    assert "full" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize(
+    "options, allowed",
+    [
+        ({}, True),
+        ({"colorway": "Violet", "inlay": "Gold leaf", "size": "Standard"}, True),
+        ({"colorway": "Plaid"}, False),
+        ({"inlay": "River rock"}, False),
+        ({"finish": "Matte"}, False),
+    ],
+)
+def test_options_are_checked_against_the_product(app, options, allowed):
+    with app.test_request_context():
+        priced = cart.priced([[1, 1, options, {}]])
+    assert priced.dropped == (0 if allowed else 1)
+    assert len(priced.lines) == (1 if allowed else 0)
+
+
+def test_cart_page_prunes_lines_that_no_longer_validate(app, client):
+    client.set_cookie(cart.COOKIE_NAME, _signed(app, [[1, 1, {"colorway": "Violet"}, {}], [1, 1, {"colorway": "Plaid"}, {}], [999, 1, {}, {}]]))
+    response = client.get("/cart")
+    assert b"no longer available" in response.data
+    assert _load(app, client.get_cookie(cart.COOKIE_NAME).value) == [[1, 1, {"colorway": "Violet"}, {}]]
+
+
+def test_pricing_uses_the_catalog_price(app):
+    with app.test_request_context():
+        priced = cart.priced([[1, 2, {}, {}], [5, 1, {}, {}]])
+    assert priced.subtotal == 68.0 * 2 + 32.0
+    assert priced.tax == round(priced.subtotal * cart.TAX_RATE, 2)
+    assert priced.total == round(priced.subtotal + priced.tax + cart.FLAT_SHIPPING, 2)
+
+
+def test_cart_badge_runs_no_queries(app, client):
+    _add(client, 1, quantity=2)
+    statements = []
+    cookie = client.get_cookie(cart.COOKIE_NAME).value
+    with app.test_request_context(headers={"Cookie": f"{cart.COOKIE_NAME}={cookie}"}):
+        db = data.get_db()
+        db.set_trace_callback(statements.append)
+        try:
+            assert cart.cart_count() == 2
+        finally:
+            db.set_trace_callback(None)
+    assert statements == []
@@ -0,0 +1,51 @@
+import pytest
+
+from app import data
+from app.data import CatalogCache
+
+
+def test_entries_are_evicted_by_rows_least_recently_used_first():
+    cache = CatalogCache(max_rows=5)
+    cache.get(1, "a", lambda: [1, 2])
+    cache.get(1, "b", lambda: [1, 2])
+    cache.get(1, "a", pytest.fail)
+    cache.get(1, "c", lambda: [1, 2])
+    assert cache.get(1, "a", pytest.fail) == [1, 2]
+    assert cache.get(1, "b", lambda: "reloaded") == "reloaded"
+    assert cache.stats()["rows"] <= 5
+
+
+def test_a_new_generation_drops_every_entry():
+    cache = CatalogCache()
+    cache.get(1, "a", lambda: [1])
+    assert cache.get(2, "a", lambda: [2]) == [2]
+    assert cache.stats() == {"generation": 2, "entries": 1, "rows": 1, "hits": 0, "misses": 2, "evictions": 0}
+
+
+def test_value_larger_than_the_cap_is_not_kept():
+    cache = CatalogCache(max_rows=2)
+    cache.get(1, "a", lambda: [1, 2, 3])
+    assert cache.stats()["entries"] == 0
+
+
+def test_catalog_write_invalidates_cached_reads(app, db):
+    names = [row["name"] for row in data.get_categories()]
+    db.execute("UPDATE category SET name = 'Renamed' WHERE id = (SELECT MIN(id) FROM category)")
+    db.commit()
+    assert [row["name"] for row in data.get_categories()] == names
+    # The generation is read once per request, so the next request sees the write.
+    with app.app_context():
+        assert "Renamed" in [row["name"] for row in data.get_categories()]
+
+
+def test_grouped_videos_are_sized_by_rows(app, db):
+    category = db.execute("SELECT category FROM video LIMIT 1").fetchone()["category"]
+    db.executemany(
+        "INSERT INTO video (slug, title, category) VALUES (?, ?, ?)",
+        [(f"extra-{index}", f"Extra {index}", category) for index in range(10)],
+    )
+    db.commit()
+    total = db.execute("SELECT COUNT(*) FROM video").fetchone()[0]
+    with app.app_context():
+        data.get_videos_grouped()
+        assert data.catalog_cache_stats()["rows"] == total
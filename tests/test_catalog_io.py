@@ -0,0 +1,60 @@
+import io
+import json
+
+import pytest
+
+from app import data
+from app.catalog_io import import_catalog
+
+RECORDS = [
+    {"type": "category", "slug": "coasters", "name": "Coasters"},
+    {"slug": "tide-coaster", "name": "Tide Coaster", "category": "coasters", "price": 18},
+    {"slug": "opal-coaster", "name": "Opal Coaster", "category": "coasters", "price": "21.50"},
+    {"slug": "lost-coaster", "name": "Lost Coaster", "category": "nowhere", "price": 5},
+    {"slug": "Bad Slug", "name": "Bad", "category": "coasters", "price": 5},
+]
+
+
+def _jsonl(records):
+    return io.StringIO("".join(json.dumps(record) + "\n" for record in records))
+
+
+def _counts(db):
+    return db.execute("SELECT (SELECT COUNT(*) FROM category), (SELECT COUNT(*) FROM product)").fetchone()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_dry_run_matches_a_real_import_and_keeps_nothing(db, chunk_size):
+    before = tuple(_counts(db))
+    errors = []
+    dry = import_catalog(db, _jsonl(RECORDS), "jsonl", chunk_size=chunk_size, dry_run=True, on_error=lambda *error: errors.append(error))
+    assert tuple(_counts(db)) == before
+    assert not db.in_transaction
+    # The category from an earlier chunk is visible to the products in later ones.
+    errors = dict(errors)
+    assert sorted(errors) == [4, 5]
+    assert errors[4] == "unknown category 'nowhere'"
+
+    real = import_catalog(db, _jsonl(RECORDS), "jsonl", chunk_size=chunk_size)
+    assert dry[:4] == real[:4] == (1, 2, 0, 2)
+    assert tuple(_counts(db)) == (before[0] + 1, before[1] + 2)
+
+
+def test_dry_run_rolls_back_when_the_import_fails(db):
+    def broken():
+        yield json.dumps(RECORDS[0]) + "\n"
+        raise OSError("stream closed")
+
+    before = tuple(_counts(db))
+    with pytest.raises(OSError):
+        import_catalog(db, broken(), "jsonl", chunk_size=1, dry_run=True)
+    assert not db.in_transaction
+    assert tuple(_counts(db)) == before
+
+
+def test_import_upserts_by_slug(db):
+    import_catalog(db, _jsonl(RECORDS[:2]), "jsonl")
+    import_catalog(db, _jsonl([{**RECORDS[1], "price": 19}]), "jsonl")
+    rows = db.execute("SELECT price FROM product WHERE slug = 'tide-coaster'").fetchall()
+    assert [row[0] for row in rows] == [19]
+    assert data.schema_version(db) == data.SCHEMA_VERSION
@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.data import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_idle=2, mmap_size=0, cache_size_kib=1024)
+    db = pool.acquire()
+    db.execute("CREATE TABLE item (id INTEGER PRIMARY KEY)")
+    db.commit()
+    pool.release(db)
+    yield pool
+    pool.close_all()
+
+
+def test_connections_are_tuned_once(pool):
+    db = pool.acquire()
+    assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert db.execute("PRAGMA synchronous").fetchone()[0] == 1
+    assert db.execute("PRAGMA cache_size").fetchone()[0] == -1024
+    assert isinstance(db.execute("SELECT 1 AS one").fetchone(), sqlite3.Row)
+    pool.release(db)
+
+
+def test_released_connections_are_reused(pool):
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    assert pool.stats()["reused"] == 2
+
+
+def test_release_rolls_back_an_open_transaction(pool):
+    db = pool.acquire()
+    db.execute("INSERT INTO item (id) VALUES (1)")
+    pool.release(db)
+    db = pool.acquire()
+    assert db.execute("SELECT COUNT(*) FROM item").fetchone()[0] == 0
+    pool.release(db)
+
+
+def test_readonly_connections_refuse_writes(pool):
+    db = pool.acquire(readonly=True)
+    with pytest.raises(sqlite3.OperationalError):
+        db.execute("INSERT INTO item (id) VALUES (1)")
+    pool.release(db, readonly=True)
+    assert pool.stats()["idle_readonly"] == 1
+
+
+def test_idle_connections_are_capped(pool):
+    held = [pool.acquire() for _ in range(4)]
+    for db in held:
+        pool.release(db)
+    stats = pool.stats()
+    assert (stats["idle"], stats["in_use"], stats["discarded"]) == (2, 0, 2)
+
+
+def test_a_thread_gets_back_the_connection_it_released(pool):
+    mine, other = pool.acquire(), pool.acquire()
+    pool.release(mine)
+    released = threading.Event()
+
+    def release_other():
+        pool.release(other)
+        released.set()
+
+    threading.Thread(target=release_other).start()
+    released.wait(5.0)
+    assert pool.acquire() is mine
+
+
+def test_requests_return_their_connections(app, client):
+    assert client.get("/shop/").data
+    assert client.get("/cart").data
+    assert app.extensions["db_pool"].stats()["in_use"] == 0
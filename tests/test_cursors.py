@@ -0,0 +1,74 @@
+import re
+
+import pytest
+
+from app import data
+from app.blueprints.shop.routes import _next_url
+
+
+@pytest.mark.parametrize("position", [["aurora-tray", 12], [48], ["a b/c+d=", 0], ["ünïcode", 7]])
+def test_cursor_round_trip(position):
+    cursor = data.encode_cursor(position)
+    assert "=" not in cursor
+    assert data.decode_cursor(cursor) == position
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "e30", "W10", "bnVsbA", "%%%"])
+def test_decode_cursor_rejects_malformed_values(cursor):
+    # e30 is {}, W10 is [] and bnVsbA is null: valid JSON but not a position.
+    with pytest.raises(ValueError):
+        data.decode_cursor(cursor)
+
+
+def test_keyset_pages_cover_the_catalog_once(app):
+    with app.app_context():
+        expected = [product.id for product in data.get_products()]
+        seen, after = [], None
+        while True:
+            page = data.get_products_page(after=after, limit=2)
+            seen += [product.id for product in page.products]
+            if page.next_cursor is None:
+                break
+            after = page.next_cursor
+    assert seen == expected
+    assert len(expected) > 2
+
+
+def test_search_pages_use_offset_cursors(app):
+    with app.app_context():
+        first = data.get_products_page(search_term="mica", limit=1)
+        assert data.decode_cursor(first.next_cursor) == [1]
+        second = data.get_products_page(search_term="mica", after=first.next_cursor, limit=1)
+    assert [product.id for product in second.products] != [product.id for product in first.products]
+
+
+def test_keyset_cursor_with_the_wrong_shape_is_rejected(app):
+    with app.app_context(), pytest.raises(ValueError):
+        data.get_products_page(after=data.encode_cursor([3]), limit=2)
+
+
+@pytest.mark.parametrize("after", ["garbage!", data.encode_cursor([3])])
+def test_listing_answers_400_for_bad_cursors(client, after):
+    assert client.get("/shop/", query_string={"after": after}).status_code == 400
+
+
+def test_streamed_listing_links_to_the_next_page(app, client):
+    app.config["PRODUCTS_PAGE_SIZE"] = 1
+    with app.app_context():
+        expected = [product.slug for product in data.get_products(limited=True)]
+    seen, url = [], "/shop/limited"
+    while url:
+        html = client.get(url).get_data(as_text=True)
+        seen += [slug for slug in re.findall(r'href="/shop/product/([a-z0-9-]+)"', html) if slug not in seen]
+        match = re.search(r'href="(/shop/limited\?after=[^"]+)"', html)
+        url = match.group(1).replace("&amp;", "&") if match else None
+    assert seen == expected
+    assert len(expected) == 2
+
+
+def test_next_url_keeps_view_args_over_query_args(app):
+    with app.test_request_context("/shop/category/earrings?slug=trays&sort=new"):
+        url = _next_url(data.ProductPage([], "CURSOR"))
+    assert url.startswith("/shop/category/earrings?")
+    assert "slug=" not in url
+    assert "sort=new" in url and "after=CURSOR" in url
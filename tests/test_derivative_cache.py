@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from app import images
+from app.images import DerivativeCache
+
+
+def _payload(size):
+    return lambda: b"x" * size
+
+
+def test_builds_once_and_then_hits(tmp_path):
+    cache = DerivativeCache(str(tmp_path), 1000)
+    path = cache.get_or_build("a", _payload(10))
+    assert cache.get_or_build("a", pytest.fail) == path
+    assert open(path, "rb").read() == b"x" * 10
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_least_recently_used_is_evicted(tmp_path):
+    cache = DerivativeCache(str(tmp_path), 250)
+    for name in "abc":
+        cache.get_or_build(name, _payload(100))
+    assert sorted(os.listdir(tmp_path)) == ["b", "c"]
+    cache.get_or_build("b", pytest.fail)
+    cache.get_or_build("d", _payload(100))
+    assert sorted(os.listdir(tmp_path)) == ["b", "d"]
+
+
+def test_failed_build_leaves_no_state_behind(tmp_path):
+    cache = DerivativeCache(str(tmp_path), 1000)
+
+    def broken():
+        raise OSError("decoder failed")
+
+    with pytest.raises(OSError):
+        cache.get_or_build("a", broken)
+    assert cache._building == {}
+    assert cache.get_or_build("a", _payload(5))
+    assert cache._building == {}
+
+
+def test_cap_holds_across_processes_sharing_a_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(images, "RESCAN_SECONDS", 0.0)
+    first, second = DerivativeCache(str(tmp_path), 300), DerivativeCache(str(tmp_path), 300)
+    for index in range(3):
+        first.get_or_build(f"first-{index}", _payload(100))
+        second.get_or_build(f"second-{index}", _payload(100))
+    sizes = [os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)]
+    assert sum(sizes) <= 300
+    # A file the other worker evicted is rebuilt rather than served from a stale entry.
+    missing = next(f"first-{index}" for index in range(3) if not (tmp_path / f"first-{index}").exists())
+    assert os.path.exists(first.get_or_build(missing, _payload(100)))
+
+
+def test_failed_write_removes_the_temporary_file(tmp_path, monkeypatch):
+    cache = DerivativeCache(str(tmp_path), 1000)
+
+    def full_disk(source, destination):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(images.os, "replace", full_disk)
+    with pytest.raises(OSError):
+        cache.get_or_build("a", _payload(10))
+    assert os.listdir(tmp_path) == []
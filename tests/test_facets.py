@@ -0,0 +1,100 @@
+import pytest
+
+from app import data, facets
+from benchmarks.catalog import synthetic_app
+
+from .conftest import shutdown
+
+
+@pytest.fixture
+def catalog_app(tmp_path):
+    app = synthetic_app(str(tmp_path), 300)
+    yield app
+    shutdown(app)
+
+
+def _expected(selection):
+    # Brute force over the same rows: a product matches when every selected facet has one of its values.
+    options = facets._options_by_product(data.get_option_rows())
+    matches = []
+    for row in data.get_facet_rows():
+        keys = set(facets._facet_keys(row, options.get(row["id"], ())))
+        if all(any((facet, value) in keys for value in values) for facet, values in selection.items()):
+            matches.append((row["listing_key"], row["id"]))
+    return [product_id for _, product_id in sorted(matches)]
+
+
+def _walk(index, selection, limit=7):
+    ids, after = [], None
+    while True:
+        result = index.query(selection, after=after, limit=limit)
+        ids += result.product_ids
+        if result.next_position is None:
+            return ids
+        after = result.next_position
+
+
+SELECTIONS = [
+    {},
+    {"colorway": {"Violet"}},
+    {"colorway": {"Violet", "Ocean"}, "price": {"50-100", "100-200"}},
+    {"inlay": {"Mica"}, "limited_drop": {"1"}},
+    {"availability": {"no-such-value"}},
+]
+
+
+@pytest.mark.parametrize("selection", SELECTIONS)
+def test_query_matches_a_scan_in_listing_order(catalog_app, selection):
+    with catalog_app.app_context():
+        index = facets.get_index()
+        expected = _expected(selection)
+        assert index.query(selection, limit=10_000).total == len(expected)
+        assert _walk(index, selection) == expected
+
+
+def test_counts_leave_out_the_facets_own_selection(catalog_app):
+    with catalog_app.app_context():
+        counts = facets.get_index().query({"colorway": {"Violet"}, "price": {"50-100"}}).counts
+        for value, count in counts["colorway"].items():
+            assert count == len(_expected({"colorway": {value}, "price": {"50-100"}}))
+        for value, count in counts["inlay"].items():
+            assert count == len(_expected({"colorway": {"Violet"}, "price": {"50-100"}, "inlay": {value}}))
+
+
+def test_catalog_edits_are_applied_incrementally(catalog_app):
+    selection = {"price": {"200-plus"}}
+    with catalog_app.app_context():
+        index = facets.get_index()
+        before = index.query(selection).total
+    with catalog_app.app_context():
+        db = data.get_db()
+        product_id = db.execute("SELECT MIN(id) FROM product WHERE price < 200").fetchone()[0]
+        db.execute("UPDATE product SET price = 250 WHERE id = ?", (product_id,))
+        db.execute("DELETE FROM product_option_value WHERE product_id = ?", (product_id + 1,))
+        db.commit()
+    with catalog_app.app_context():
+        index = facets.get_index()
+        assert (index.full_rebuilds, index.incremental_updates) == (1, 1)
+        assert index.query(selection).total == before + 1
+        for case in SELECTIONS:
+            assert _walk(index, case) == _expected(case)
+
+
+def test_repeated_option_values_map_to_one_key():
+    row = {"category_id": 1, "availability": "in_stock", "price": 30.0, **{flag: 0 for flag in facets.FLAG_FACETS}}
+    keys = facets._facet_keys(row, [("colorways", "Violet"), ("colorways", "Violet")])
+    assert keys.count(("colorway", "Violet")) == 1
+
+
+@pytest.mark.parametrize("position", [[1, 2], ["a"], ["a", "b"], ["a", True], ["a", 1, 2]])
+def test_facet_listing_answers_400_for_bad_cursors(client, position):
+    response = client.get("/shop/", query_string={"colorway": "Violet", "after": data.encode_cursor(position)})
+    assert response.status_code == 400
+
+
+def test_filter_endpoint_returns_the_grid_and_counts(catalog_app):
+    response = catalog_app.test_client().get("/shop/filter", query_string={"colorway": "Violet"})
+    payload = response.get_json()
+    with catalog_app.app_context():
+        assert payload["total"] == len(_expected({"colorway": {"Violet"}}))
+    assert "html" in payload and any(group["name"] == "colorway" for group in payload["facets"])
@@ -0,0 +1,47 @@
+import pytest
+
+from app import data
+from app.fragments import FragmentCache
+from app.images import DerivativeCache
+
+from .conftest import make_app, shutdown
+
+
+def test_fragments_are_rendered_once_and_evicted_by_size():
+    cache = FragmentCache(max_bytes=10)
+    assert cache.get_or_render("a", lambda: "aaaa") == "aaaa"
+    assert cache.get_or_render("a", pytest.fail) == "aaaa"
+    cache.get_or_render("b", lambda: "bbbb")
+    cache.get_or_render("c", lambda: "cccc")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["bytes"]) == (1, 3, 1, 8)
+    assert cache.get_or_render("a", lambda: "again") == "again"
+
+
+def test_disk_tier_is_shared_between_processes(tmp_path):
+    first = FragmentCache(1000, DerivativeCache(str(tmp_path), 1000))
+    second = FragmentCache(1000, DerivativeCache(str(tmp_path), 1000))
+    first.get_or_render("card", lambda: "<li>tray</li>")
+    assert second.get_or_render("card", pytest.fail) == "<li>tray</li>"
+    assert second.stats()["disk_hits"] == 1
+
+
+@pytest.fixture
+def uncached_client(tmp_path):
+    app = make_app(tmp_path / "uncached", FRAGMENT_CACHE_MAX_BYTES=0)
+    yield app.test_client()
+    shutdown(app)
+
+
+@pytest.mark.parametrize("path", ["/", "/shop/", "/custom/inspiration"])
+def test_cached_pages_match_uncached_renders(client, uncached_client, path):
+    assert client.get(path).data
+    assert client.get(path).data == uncached_client.get(path).data
+
+
+def test_product_change_rerenders_its_card(app, client, db):
+    assert b"Renamed Tray" not in client.get("/shop/").data
+    assert app.extensions["fragment_cache"].stats()["entries"] > 0
+    db.execute("UPDATE product SET name = 'Renamed Tray' WHERE id = (SELECT MIN(id) FROM product)")
+    db.commit()
+    assert b"Renamed Tray" in client.get("/shop/").data
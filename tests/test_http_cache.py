@@ -0,0 +1,75 @@
+import pytest
+
+from app import data
+
+
+@pytest.fixture
+def product_id(db):
+    return db.execute("SELECT MIN(id) FROM product").fetchone()[0]
+
+
+def _revalidate(client, response, path="/"):
+    return client.get(path, headers={"If-None-Match": response.headers["ETag"]})
+
+
+def test_matching_etag_is_not_modified(client):
+    first = client.get("/")
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "public, no-cache"
+    assert "Cookie" in first.headers["Vary"]
+    again = _revalidate(client, first)
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+def test_catalog_write_changes_the_etag(app, client):
+    first = client.get("/")
+    with app.app_context():
+        db = data.get_db()
+        db.execute("UPDATE product SET name = name || '!' WHERE id = (SELECT MIN(id) FROM product)")
+        db.commit()
+    assert _revalidate(client, first).status_code == 200
+
+
+def test_static_pages_ignore_the_catalog(app, client):
+    first = client.get("/about")
+    assert first.headers["Cache-Control"] == f"public, max-age={app.config['HTTP_CACHE_STATIC_MAX_AGE']}"
+    with app.app_context():
+        db = data.get_db()
+        db.execute("UPDATE product SET name = name || '!' WHERE id = (SELECT MIN(id) FROM product)")
+        db.commit()
+    assert _revalidate(client, first, "/about").status_code == 304
+
+
+def test_cart_change_changes_the_etag(client, product_id):
+    first = client.get("/")
+    client.post("/cart/add", data={"product_id": product_id, "quantity": 1})
+    client.get("/cart")
+    assert _revalidate(client, first).status_code == 200
+
+
+def test_if_modified_since_is_honoured_with_an_empty_cart(client):
+    first = client.get("/")
+    again = client.get("/", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert again.status_code == 304
+
+
+def test_cart_pages_carry_no_last_modified(client, product_id):
+    # Adding to the cart does not move the catalog date, so a date-only revalidation must not 304.
+    first = client.get("/")
+    client.post("/cart/add", data={"product_id": product_id, "quantity": 1})
+    client.get("/cart")
+    again = client.get("/", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert again.status_code == 200
+    assert "Last-Modified" not in again.headers
+    assert _revalidate(client, again).status_code == 304
+
+
+def test_flashed_responses_are_not_revalidated(client):
+    first = client.get("/")
+    with client.session_transaction() as session:
+        session["_flashes"] = [("message", "Thanks!")]
+    response = _revalidate(client, first)
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
@@ -0,0 +1,66 @@
+import json
+import logging
+
+import pytest
+
+from .conftest import make_app, shutdown
+
+TOKEN = "scrape-secret"
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path, SQL_INSTRUMENTATION=True, METRICS_TOKEN=TOKEN)
+    yield app
+    shutdown(app)
+
+
+def _metrics(client):
+    response = client.get("/_internal/metrics", headers={"Authorization": f"Bearer {TOKEN}"})
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def _count(text, series, endpoint):
+    prefix = f'{series}_count{{endpoint="{endpoint}",status="2xx"}} '
+    return next((int(line[len(prefix):]) for line in text.splitlines() if line.startswith(prefix)), 0)
+
+
+def test_server_timing_counts_the_queries(client):
+    header = client.get("/about").headers["Server-Timing"]
+    assert header.startswith("db;dur=") and "queries" in header and "app;dur=" in header
+
+
+@pytest.mark.parametrize("authorization", [None, "Bearer wrong", f"Basic {TOKEN}"])
+def test_metrics_need_the_token(client, authorization):
+    headers = {"Authorization": authorization} if authorization else {}
+    assert client.get("/_internal/metrics", headers=headers).status_code == 404
+
+
+def test_metrics_are_off_without_a_token(tmp_path):
+    app = make_app(tmp_path, SQL_INSTRUMENTATION=True)
+    try:
+        assert app.test_client().get("/_internal/metrics", headers={"Authorization": "Bearer "}).status_code == 404
+    finally:
+        shutdown(app)
+
+
+def test_streamed_pages_are_recorded_once_the_body_is_sent(client):
+    response = client.get("/shop/", buffered=False)
+    assert _count(_metrics(client), "sql_queries", "shop.list_products") == 0
+    body = b"".join(response.response)
+    response.close()
+    assert body
+    text = _metrics(client)
+    assert _count(text, "sql_queries", "shop.list_products") == 1
+    assert _count(text, "render_duration_ms", "shop.list_products") == 1
+
+
+def test_slow_queries_are_logged_without_parameter_values(app, client, caplog):
+    app.config["SLOW_QUERY_MS"] = 0
+    with caplog.at_level(logging.WARNING, logger=app.logger.getChild("sql").name):
+        client.get("/shop/search", query_string={"q": "secret-customer-term"}).close()
+    events = [json.loads(record.getMessage()) for record in caplog.records if record.name.endswith(".sql")]
+    assert events and all(event["event"] == "slow_query" for event in events)
+    assert all(event["endpoint"] == "shop.search" for event in events)
+    assert "secret-customer-term" not in caplog.text
@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+from app import data
+
+from .conftest import make_app, shutdown
+
+
+def _schema(db: sqlite3.Connection) -> dict:
+    rows = db.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' ORDER BY type, name")
+    return {(row[0], row[1]): row[2] for row in rows}
+
+
+@pytest.fixture
+def unmigrated(tmp_path):
+    app = make_app(tmp_path, AUTO_MIGRATE=False)
+    yield app
+    shutdown(app)
+
+
+def test_fresh_database_applies_every_migration(unmigrated):
+    with unmigrated.app_context():
+        db = data.get_db()
+        assert data.schema_version(db) == 0
+        assert data.upgrade() == [version for version, _ in data.MIGRATIONS]
+        assert data.schema_version(db) == data.SCHEMA_VERSION
+        assert db.execute("SELECT COUNT(*) FROM product").fetchone()[0] > 0
+        assert data.upgrade() == []
+
+
+def test_versions_are_contiguous():
+    versions = [version for version, _ in data.MIGRATIONS]
+    assert versions == list(range(2, data.SCHEMA_VERSION + 1))
+
+
+@pytest.mark.parametrize("stop", range(2, data.SCHEMA_VERSION))
+def test_upgrade_resumes_from_every_version(tmp_path, unmigrated, monkeypatch, stop):
+    reference = make_app(tmp_path / "reference")
+    try:
+        with reference.app_context():
+            expected = _schema(data.get_db())
+            expected_products = data.get_db().execute("SELECT id, slug, listing_key FROM product ORDER BY id").fetchall()
+    finally:
+        shutdown(reference)
+
+    with unmigrated.app_context():
+        db = data.get_db()
+        monkeypatch.setattr(data, "MIGRATIONS", [step for step in data.MIGRATIONS if step[0] <= stop])
+        data.upgrade()
+        assert data.schema_version(db) == stop
+        monkeypatch.undo()
+
+        assert data.upgrade() == list(range(stop + 1, data.SCHEMA_VERSION + 1))
+        assert data.schema_version(db) == data.SCHEMA_VERSION
+        assert _schema(db) == expected
+        products = db.execute("SELECT id, slug, listing_key FROM product ORDER BY id").fetchall()
+        assert [tuple(row) for row in products] == [tuple(row) for row in expected_products]
+        # Rows seeded under an older schema are searchable once the index migration has run.
+        assert data.get_products(search_term="mica")
+
+
+def test_startup_without_auto_migrate_only_warns(tmp_path, caplog):
+    app = make_app(tmp_path, AUTO_MIGRATE=False)
+    try:
+        with app.app_context():
+            assert data.schema_version(data.get_db()) == 0
+    finally:
+        shutdown(app)
+    assert f"expected {data.SCHEMA_VERSION}" in caplog.text
+
+
+def test_startup_on_a_current_schema_runs_no_ddl(tmp_path, monkeypatch):
+    shutdown(make_app(tmp_path))
+    monkeypatch.setattr(data, "MIGRATIONS", [(version, pytest.fail) for version, _ in data.MIGRATIONS])
+    app = make_app(tmp_path)
+    try:
+        with app.app_context():
+            assert data.upgrade() == []
+    finally:
+        shutdown(app)
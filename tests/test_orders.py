@@ -0,0 +1,77 @@
+import pytest
+
+from app import data, orders
+
+CHECKOUT_FORM = {"email": "buyer@example.com", "address": "1 Main St", "city": "Springfield", "zip": "12345"}
+
+
+@pytest.fixture
+def late_commit(monkeypatch):
+    # The order commits, but only after the request has stopped waiting for it.
+    submit = orders.submit
+    state = {"late": True}
+
+    def slow_submit(order):
+        order_id = submit(order)
+        if state["late"]:
+            raise TimeoutError("The order was queued but not confirmed in time.")
+        return order_id
+
+    monkeypatch.setattr(orders, "submit", slow_submit)
+    return state
+
+
+def _order_lines(app):
+    with app.app_context():
+        rows = data.get_db().execute("SELECT order_id, product_id, quantity FROM order_line ORDER BY order_id, product_id")
+        return [tuple(row) for row in rows]
+
+
+def test_resubmitting_after_a_timeout_returns_the_committed_order(app, client, late_commit):
+    client.post("/cart/add", data={"product_id": 1, "quantity": 2})
+    response = client.post("/checkout", data=CHECKOUT_FORM)
+    assert response.headers["Location"] == "/checkout"
+    late_commit["late"] = False
+    response = client.post("/checkout", data=CHECKOUT_FORM)
+    assert response.headers["Location"] == "/checkout/success?order=1"
+    assert _order_lines(app) == [(1, 1, 2)]
+
+
+def test_changing_the_cart_after_a_timeout_places_a_new_order(app, client, late_commit):
+    client.post("/cart/add", data={"product_id": 1, "quantity": 2})
+    client.post("/checkout", data=CHECKOUT_FORM)
+    late_commit["late"] = False
+    client.post("/cart/add", data={"product_id": 5})
+    response = client.post("/checkout", data=CHECKOUT_FORM)
+    assert response.headers["Location"] == "/checkout/success?order=2"
+    assert _order_lines(app) == [(1, 1, 2), (2, 1, 2), (2, 5, 1)]
+
+
+def test_a_different_email_is_a_different_order(app, client, late_commit):
+    client.post("/cart/add", data={"product_id": 1})
+    client.post("/checkout", data=CHECKOUT_FORM)
+    late_commit["late"] = False
+    response = client.post("/checkout", data={**CHECKOUT_FORM, "email": "someone@example.com"})
+    assert response.headers["Location"] == "/checkout/success?order=2"
+
+
+def test_buying_the_same_cart_again_is_a_new_order(app, client):
+    for expected in (1, 2):
+        client.post("/cart/add", data={"product_id": 1})
+        response = client.post("/checkout", data=CHECKOUT_FORM)
+        assert response.headers["Location"] == f"/checkout/success?order={expected}"
+
+
+def test_queue_full_releases_the_hold(app, client, monkeypatch):
+    with app.app_context():
+        data.set_inventory(1, 3)
+
+    def full(order):
+        raise orders.OrderQueueFull("The order queue is full.")
+
+    monkeypatch.setattr(orders, "submit", full)
+    client.post("/cart/add", data={"product_id": 1, "quantity": 2})
+    response = client.post("/checkout", data=CHECKOUT_FORM)
+    assert response.headers["Location"] == "/checkout"
+    with app.app_context():
+        assert [tuple(row) for row in data.get_inventory(1)] == [("", 3, 0, 3)]
@@ -0,0 +1,44 @@
+import pytest
+
+from app import data
+from benchmarks.catalog import synthetic_app
+
+from .conftest import shutdown
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = synthetic_app(str(tmp_path), 200)
+    yield app
+    shutdown(app)
+
+
+def test_images_are_grouped_per_product_in_position_order(app, statements):
+    with app.app_context():
+        db = data.get_db()
+        ids = [row[0] for row in db.execute("SELECT id FROM product ORDER BY id LIMIT 5")]
+        db.execute("DELETE FROM product_image WHERE product_id = ?", (ids[0],))
+        db.commit()
+        statements.clear()
+        grouped = data.get_product_images_bulk(ids + [ids[1], 10**9])
+        assert len(statements) == 1
+    assert list(grouped) == ids + [10**9]
+    assert grouped[ids[0]] == [] and grouped[10**9] == []
+    for product_id in ids[1:]:
+        rows = grouped[product_id]
+        assert rows and all(row["product_id"] == product_id for row in rows)
+        assert [(row["position"], row["id"]) for row in rows] == sorted((row["position"], row["id"]) for row in rows)
+
+
+@pytest.mark.parametrize("path", ["/", "/shop/", "/shop/category/synthetic-category-3", "/custom/inspiration"])
+def test_listing_queries_do_not_grow_with_the_page(app, statements, path):
+    client = app.test_client()
+    counts = []
+    for page_size in (2, 20):
+        app.config["PRODUCTS_PAGE_SIZE"] = page_size
+        assert client.get(path).data
+        app.extensions["catalog_cache"].clear()
+        statements.clear()
+        assert client.get(path).data
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
@@ -0,0 +1,47 @@
+import pytest
+
+from app import data
+
+
+@pytest.fixture
+def product(app):
+    with app.app_context():
+        return data.get_product_by_slug("opal-pendant")
+
+
+def test_json_columns_are_decoded_once_on_first_use(product, monkeypatch):
+    calls = []
+    decode = data._decode_json
+    monkeypatch.setattr(data, "_decode_json", lambda raw: calls.append(raw) or decode(raw))
+    assert product.option_values == product.option_values
+    assert product.personalization == product.personalization
+    assert calls == [product.options, product.personalization_schema]
+
+
+@pytest.mark.parametrize("raw, expected", [(None, {}), ("", {}), ("{not json", {}), ("[1, 2]", {}), ('{"a": 1}', {"a": 1})])
+def test_decoding_tolerates_bad_values(raw, expected):
+    assert data._decode_json(raw) == expected
+
+
+def test_records_read_like_rows(product):
+    assert product["name"] == product.name == product.get("name")
+    assert product.get("missing", "fallback") == "fallback"
+    assert set(product.keys()) == set(data.Product.FIELDS)
+    with pytest.raises(KeyError):
+        product["missing"]
+
+
+def test_version_tracks_the_record(app, product):
+    with app.app_context():
+        db = data.get_db()
+        assert data.get_products_by_ids([product.id])[0].version == product.version
+        db.execute("UPDATE product SET price = price + 1 WHERE id = ?", (product.id,))
+        db.commit()
+        assert data.get_products_by_ids([product.id])[0].version != product.version
+
+
+def test_product_page_renders_decoded_options(client, product):
+    body = client.get("/shop/product/opal-pendant").get_data(as_text=True)
+    for values in product.option_values.values():
+        for value in values:
+            assert value in body
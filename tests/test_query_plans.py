@@ -0,0 +1,23 @@
+import pytest
+
+from benchmarks import query_plans
+from benchmarks.catalog import synthetic_app
+
+from .conftest import shutdown
+
+
+@pytest.fixture(scope="module")
+def catalog_app(tmp_path_factory):
+    app = synthetic_app(str(tmp_path_factory.mktemp("plans")), 2000)
+    yield app
+    shutdown(app)
+
+
+def test_every_accessor_has_a_plan_check():
+    assert query_plans.uncovered_accessors() == []
+
+
+@pytest.mark.parametrize("check", query_plans.CHECKS, ids=lambda check: check.name)
+def test_query_avoids_scans_and_temp_sorts(catalog_app, check):
+    with catalog_app.app_context():
+        assert query_plans.check_plan(check) == []
@@ -0,0 +1,134 @@
+import os
+
+import pytest
+from werkzeug.http import http_date
+
+from app.blueprints.media import routes as media_routes
+from app.streaming import RangeNotSatisfiable, parse_range
+
+BODY = bytes(range(256)) * 40
+URL = "/videos/stream/clip.mp4"
+
+
+@pytest.fixture
+def clip(app):
+    os.makedirs(app.config["MEDIA_DIR"], exist_ok=True)
+    path = os.path.join(app.config["MEDIA_DIR"], "clip.mp4")
+    with open(path, "wb") as handle:
+        handle.write(BODY)
+    return path
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-10", (990, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=900-5000", (900, 999)),
+        ("bytes = 1 - 2", (1, 2)),
+        ("bytes=999-999", (999, 999)),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1000-2000", "bytes=-0"])
+def test_parse_range_rejects_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000)
+
+
+@pytest.mark.parametrize("header", ["bytes=5-4", "bytes=-", "bytes=0-1,5-6", "items=0-1", "bytes=a-b", ""])
+def test_parse_range_ignores_ranges_it_does_not_serve(header):
+    assert parse_range(header, 1000) is None
+
+
+def test_full_response_advertises_ranges(client, clip):
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["Content-Length"] == str(len(BODY))
+    assert response.data == BODY
+
+
+@pytest.mark.parametrize("header, start, end", [("bytes=0-99", 0, 99), ("bytes=10000-", 10000, 10239), ("bytes=-16", 10224, 10239)])
+def test_single_range_is_partial_content(client, clip, header, start, end):
+    response = client.get(URL, headers={"Range": header})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes {start}-{end}/{len(BODY)}"
+    assert response.headers["Content-Length"] == str(end - start + 1)
+    assert response.data == BODY[start:end + 1]
+
+
+@pytest.mark.parametrize("header", ["bytes=20000-", "bytes=-0"])
+def test_unsatisfiable_range_is_416(client, clip, header):
+    response = client.get(URL, headers={"Range": header})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(BODY)}"
+    assert response.data == b""
+
+
+@pytest.mark.parametrize("header", ["bytes=0-1,4-5", "lines=1-2", "bytes=9-3"])
+def test_ranges_it_does_not_serve_get_the_whole_file(client, clip, header):
+    response = client.get(URL, headers={"Range": header})
+    assert response.status_code == 200
+    assert "Content-Range" not in response.headers
+    assert response.data == BODY
+
+
+def test_head_reports_the_range_without_a_body(client, clip):
+    response = client.head(URL, headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.headers["Content-Length"] == "10"
+    assert response.data == b""
+
+
+def test_if_range_with_the_current_validator_honours_the_range(client, clip):
+    etag = client.get(URL).headers["ETag"]
+    last_modified = http_date(os.stat(clip).st_mtime)
+    for validator in (etag, last_modified):
+        response = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": validator})
+        assert response.status_code == 206
+        assert response.data == BODY[:10]
+
+
+def test_if_range_with_a_stale_validator_sends_the_whole_file(client, clip):
+    etag = client.get(URL).headers["ETag"]
+    stat = os.stat(clip)
+    os.utime(clip, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    for validator in (etag, http_date(stat.st_mtime)):
+        response = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": validator})
+        assert response.status_code == 200
+        assert response.data == BODY
+
+
+def test_conditional_get_is_not_modified(client, clip):
+    etag = client.get(URL).headers["ETag"]
+    assert client.get(URL, headers={"If-None-Match": etag}).status_code == 304
+
+
+@pytest.mark.parametrize("name", ["../test.db", "clip.exe", "missing.mp4"])
+def test_stream_only_serves_media_files(client, clip, name):
+    assert client.get(f"/videos/stream/{name}").status_code == 404
+
+
+def test_failed_download_removes_the_temporary_file(tmp_path, monkeypatch):
+    source = tmp_path / "remote.mp4"
+    source.write_bytes(BODY)
+    target = tmp_path / "media"
+    target.mkdir()
+
+    def interrupted(source, destination, length):
+        destination.write(b"partial")
+        raise OSError("connection reset")
+
+    monkeypatch.setattr(media_routes.shutil, "copyfileobj", interrupted)
+    with pytest.raises(OSError):
+        media_routes._download(source.as_uri(), str(target), 5.0)
+    assert os.listdir(target) == []
+    monkeypatch.undo()
+    assert media_routes._download(source.as_uri(), str(target), 5.0) == "remote.mp4"
+    assert os.listdir(target) == ["remote.mp4"]
@@ -0,0 +1,61 @@
+import time
+
+from app import data, related
+
+
+def _lease(db):
+    row = db.execute("SELECT value FROM meta WHERE key = ?", (related.LEASE_KEY,)).fetchone()
+    return row[0] if row else None
+
+
+def test_only_one_holder_at_a_time(db):
+    with related.exclusive(db) as first:
+        assert first
+        with related.exclusive(db) as second:
+            assert not second
+        assert _lease(db) is not None
+    assert _lease(db) is None
+    with related.exclusive(db) as again:
+        assert again
+
+
+def test_expired_lease_can_be_taken_over(db, monkeypatch):
+    assert related._claim(db, "crashed")
+    assert not related._claim(db, "waiting")
+    monkeypatch.setattr(time, "time", lambda real=time.time: real() + related.LEASE_SECONDS + 1)
+    assert related._claim(db, "waiting")
+    assert _lease(db).startswith("waiting ")
+
+
+def test_refresher_skips_while_another_process_holds_the_lease(app, db):
+    refresher = app.extensions["related_refresher"]
+    product = data.get_products()[0]
+    db.execute("BEGIN IMMEDIATE")
+    db.execute("UPDATE product SET price = price + 1 WHERE id = ?", (product.id,))
+    db.commit()
+    with related.exclusive(db):
+        assert refresher.refresh() == 0
+    assert refresher.refresh() > 0
+    assert refresher.refresh() == 0
+
+
+def test_cli_refuses_to_race_a_running_refresh(app, db, monkeypatch):
+    monkeypatch.setattr("app.catalog_io.LEASE_WAIT_SECONDS", 0.0)
+    runner = app.test_cli_runner()
+    with related.exclusive(db):
+        result = runner.invoke(args=["catalog", "related", "--rebuild"])
+    assert result.exit_code != 0
+    assert "Another process" in result.output
+    result = runner.invoke(args=["catalog", "related", "--rebuild"])
+    assert result.exit_code == 0, result.output
+    assert _lease(db) is None
+
+
+def test_refresher_thread_stops_on_close(app, db):
+    refresher = app.extensions["related_refresher"]
+    refresher.interval = 0.01
+    refresher.ensure_started()
+    thread = refresher._thread
+    assert thread.is_alive()
+    refresher.close()
+    assert not thread.is_alive()
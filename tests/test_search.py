@@ -0,0 +1,68 @@
+import pytest
+
+from app import data
+
+
+def _search(app, term):
+    with app.app_context():
+        return [product.slug for product in data.get_products(search_term=term)]
+
+
+def _execute(app, sql, params=()):
+    with app.app_context():
+        db = data.get_db()
+        db.execute(sql, params)
+        db.commit()
+
+
+@pytest.mark.parametrize(
+    "term, expected",
+    [
+        ("opal", '"opal"*'),
+        ('tray "OR" -x', '"tray"* "OR"* "x"*'),
+        ("  ", None),
+        ('"*()', None),
+    ],
+)
+def test_terms_become_quoted_prefix_tokens(term, expected):
+    assert data.search_query(term) == expected
+
+
+@pytest.mark.parametrize("term", ["pendant", "pen", "OPAL pend", "pendánt"])
+def test_prefixes_case_and_accents_match(app, term):
+    assert _search(app, term) == ["opal-pendant"]
+
+
+def test_every_token_must_match(app):
+    assert _search(app, "pendant tray") == []
+
+
+def test_name_matches_rank_above_description_matches(app):
+    _execute(app, "UPDATE product SET description = description || ' zephyr' WHERE slug = 'ember-ashtray'")
+    _execute(app, "UPDATE product SET name = 'Zephyr Tray' WHERE slug = 'riverstone-serving-tray'")
+    assert _search(app, "zephyr") == ["riverstone-serving-tray", "ember-ashtray"]
+
+
+def test_index_follows_category_renames_and_deletes(app):
+    _execute(app, "UPDATE category SET name = 'Platters' WHERE slug = 'trays'")
+    assert "riverstone-serving-tray" in _search(app, "platters")
+    _execute(app, "DELETE FROM product_image WHERE product_id = (SELECT id FROM product WHERE slug = 'opal-pendant')")
+    _execute(app, "DELETE FROM product WHERE slug = 'opal-pendant'")
+    assert _search(app, "pendant") == []
+
+
+def test_search_page_handles_terms_without_words(client):
+    assert client.get("/shop/search", query_string={"q": '"*'}).status_code == 200
+
+
+def test_search_pages_through_by_offset(app):
+    with app.app_context():
+        everything = [product.slug for product in data.get_products(search_term="a")]
+        pages, after = [], None
+        while True:
+            page = data.get_products_page(search_term="a", after=after, limit=2)
+            pages += [product.slug for product in page.products]
+            if page.next_cursor is None:
+                break
+            after = page.next_cursor
+    assert pages == everything and len(everything) > 2
@@ -0,0 +1,88 @@
+import gc
+import os
+import threading
+import time
+
+import pytest
+
+from app import data, snapshot
+
+
+@pytest.fixture
+def unfreeze():
+    yield
+    gc.unfreeze()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def _rename_a_product(app):
+    with app.app_context():
+        db = data.get_db()
+        db.execute("UPDATE product SET name = name || '!' WHERE id = (SELECT MIN(id) FROM product)")
+        db.commit()
+
+
+def test_build_returns_the_generation_and_drops_pooled_connections(app, unfreeze):
+    with app.app_context():
+        expected = data.catalog_generation()
+    assert snapshot.build(app) == expected
+    pool = app.extensions["db_pool"]
+    assert pool._idle == {False: [], True: []}
+    assert gc.get_freeze_count() > 0
+
+
+def test_watcher_reloads_once_the_catalog_changes(app):
+    generation = snapshot.build(app)
+    gc.unfreeze()
+    reloads = []
+    watcher = snapshot.CatalogWatcher(app.config["DATABASE_PATH"], generation, 0.01, lambda: reloads.append(1))
+    watcher.start()
+    try:
+        time.sleep(0.05)
+        assert reloads == []
+        _rename_a_product(app)
+        _wait_for(lambda: reloads)
+        assert watcher.generation == generation + 1
+    finally:
+        watcher.close()
+    assert not watcher._thread.is_alive()
+    assert len(reloads) == 1
+
+
+def test_forking_waits_for_an_in_flight_read(app, monkeypatch):
+    reading, release = threading.Event(), threading.Event()
+    watcher = snapshot.CatalogWatcher(app.config["DATABASE_PATH"], 0, 0.01, lambda: None)
+
+    def read(path):
+        reading.set()
+        release.wait(5.0)
+        watcher._stop.set()
+        return None
+
+    monkeypatch.setattr(snapshot, "_read_generation", read)
+    watcher.start()
+    reading.wait(5.0)
+    forked_at = []
+
+    def fork():
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0)
+        forked_at.append(time.monotonic())
+        os.waitpid(pid, 0)
+
+    forker = threading.Thread(target=fork)
+    forker.start()
+    time.sleep(0.1)
+    assert forked_at == []
+    released_at = time.monotonic()
+    release.set()
+    forker.join(5.0)
+    watcher.close()
+    assert forked_at and forked_at[0] >= released_at
@@ -0,0 +1,167 @@
+import time
+
+import pytest
+
+from app import data
+
+CHECKOUT_FORM = {"email": "buyer@example.com", "address": "1 Main St", "city": "Springfield", "zip": "12345"}
+
+
+@pytest.fixture
+def product_id(app):
+    with app.app_context():
+        product_id = data.get_products()[0].id
+        data.set_inventory(product_id, 5)
+    return product_id
+
+
+def _stock(product_id, variant=""):
+    rows = {row["variant"]: row for row in data.get_inventory(product_id)}
+    return rows[variant]["on_hand"], rows[variant]["reserved"]
+
+
+def test_reserve_then_confirm_takes_stock(app, product_id):
+    with app.app_context():
+        token = data.reserve_stock([(product_id, "", 3)])
+        assert _stock(product_id) == (5, 3)
+        assert data.confirm_reservation(token)
+        assert _stock(product_id) == (2, 0)
+        # A token can only be settled once.
+        assert not data.confirm_reservation(token)
+        assert _stock(product_id) == (2, 0)
+
+
+def test_release_returns_the_hold(app, product_id):
+    with app.app_context():
+        token = data.reserve_stock([(product_id, "", 4)])
+        assert data.release_reservation(token)
+        assert _stock(product_id) == (5, 0)
+        assert not data.release_reservation(token)
+
+
+def test_reservations_cannot_oversell(app, product_id):
+    with app.app_context():
+        data.reserve_stock([(product_id, "", 3)])
+        with pytest.raises(data.OutOfStock) as excinfo:
+            data.reserve_stock([(product_id, "", 3)])
+        assert excinfo.value.product_id == product_id
+        # The failed reservation left nothing behind.
+        assert _stock(product_id) == (5, 3)
+        data.reserve_stock([(product_id, "", 2)])
+        assert _stock(product_id) == (5, 5)
+
+
+def test_failed_multi_item_reservation_is_atomic(app, product_id):
+    with app.app_context():
+        other = data.get_products()[1].id
+        data.set_inventory(other, 1)
+        with pytest.raises(data.OutOfStock):
+            data.reserve_stock([(product_id, "", 2), (other, "", 2)])
+        assert _stock(product_id) == (5, 0)
+        assert _stock(other) == (1, 0)
+
+
+def test_expired_holds_return_to_stock(app, product_id):
+    with app.app_context():
+        token = data.reserve_stock([(product_id, "", 5)], ttl=60)
+        assert data.expire_holds(now=time.time()) == 0
+        assert data.expire_holds(now=time.time() + 61) == 1
+        assert _stock(product_id) == (5, 0)
+        # The order arrived after the sweep: the hold is gone, so nothing is confirmed.
+        assert not data.confirm_reservation(token)
+        assert _stock(product_id) == (5, 0)
+
+
+def test_new_reservations_expire_stale_holds_inline(app, product_id):
+    with app.app_context():
+        data.reserve_stock([(product_id, "", 5)], ttl=-1)
+        data.reserve_stock([(product_id, "", 5)])
+        assert _stock(product_id) == (5, 5)
+
+
+def test_variant_holds_draw_on_both_rows(app, product_id):
+    variant = data.variant_key({"colorway": "Violet"})
+    with app.app_context():
+        data.set_inventory(product_id, 2, variant)
+        token = data.reserve_stock([(product_id, variant, 2)])
+        assert _stock(product_id) == (5, 2)
+        assert _stock(product_id, variant) == (2, 2)
+        with pytest.raises(data.OutOfStock):
+            data.reserve_stock([(product_id, variant, 1)])
+        assert data.confirm_reservation(token)
+        assert _stock(product_id) == (3, 0)
+        assert _stock(product_id, variant) == (0, 0)
+
+
+def test_untracked_products_always_reserve_without_a_hold(app, product_id):
+    with app.app_context():
+        untracked = data.get_products()[2].id
+        assert data.reserve_stock([(untracked, "", 100)]) is None
+        assert data.get_inventory(untracked) == []
+        # Mixed with a tracked item, the hold covers only that one.
+        token = data.reserve_stock([(untracked, "", 100), (product_id, "", 1)])
+        assert token is not None
+        assert data.confirm_reservation(token)
+        assert _stock(product_id) == (4, 0)
+
+
+def _checkout(client, *product_ids, quantity=2):
+    for product_id in product_ids:
+        client.post("/cart/add", data={"product_id": product_id, "quantity": quantity})
+    return client.post("/checkout", data=CHECKOUT_FORM)
+
+
+def _orders(app):
+    with app.app_context():
+        return data.get_db().execute("SELECT COUNT(*) FROM customer_order").fetchone()[0]
+
+
+def test_checkout_settles_the_hold_with_the_order(app, client, product_id):
+    response = _checkout(client, product_id)
+    assert response.headers["Location"].startswith("/checkout/success")
+    assert _orders(app) == 1
+    with app.app_context():
+        assert _stock(product_id) == (3, 0)
+        assert data.get_db().execute("SELECT COUNT(*) FROM stock_hold").fetchone()[0] == 0
+
+
+def test_checkout_of_untracked_products_places_the_order(app, client):
+    with app.app_context():
+        untracked = [product.id for product in data.get_products()[:2]]
+    response = _checkout(client, *untracked)
+    assert response.headers["Location"].startswith("/checkout/success")
+    assert _orders(app) == 1
+
+
+def test_checkout_with_tracked_and_untracked_products(app, client, product_id):
+    with app.app_context():
+        untracked = data.get_products()[2].id
+    response = _checkout(client, untracked, product_id)
+    assert response.headers["Location"].startswith("/checkout/success")
+    assert _orders(app) == 1
+    with app.app_context():
+        assert _stock(product_id) == (3, 0)
+
+
+def test_checkout_after_the_hold_expired_places_no_order(app, client, product_id, monkeypatch):
+    # The sweeper returns the hold to stock while the order is still queued.
+    reserve = data.reserve_stock
+    monkeypatch.setattr(data, "reserve_stock", lambda items: reserve(items, ttl=-1))
+    monkeypatch.setattr(data, "confirm_hold", lambda db, token: data._expire_holds(db, time.time()) and False)
+    response = _checkout(client, product_id)
+    assert response.headers["Location"] == "/cart"
+    assert _orders(app) == 0
+
+
+def test_sweeper_returns_expired_holds_and_stops_on_close(app, product_id):
+    sweeper = app.extensions["hold_sweeper"]
+    sweeper.interval = 0.01
+    with app.app_context():
+        data.reserve_stock([(product_id, "", 2)], ttl=0)
+        deadline = time.monotonic() + 5
+        while _stock(product_id) != (5, 0) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert _stock(product_id) == (5, 0)
+    thread = sweeper._thread
+    sweeper.close()
+    assert not thread.is_alive()
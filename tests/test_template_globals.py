@@ -0,0 +1,36 @@
+import pytest
+
+from app import data
+from app.template_globals import LazyGlobal
+
+
+def test_loader_runs_once_per_request_and_only_when_used(app):
+    calls = []
+    value = LazyGlobal("numbers", lambda: calls.append(1) or [1, 2, 3])
+    with app.test_request_context():
+        assert calls == []
+        assert list(value) == [1, 2, 3] and len(value) == 3 and 2 in value and value[0] == 1
+        assert calls == [1]
+    with app.test_request_context():
+        assert value == [1, 2, 3]
+    assert calls == [1, 1]
+
+
+@pytest.mark.parametrize("path", ["/faq", "/policies/shipping", "/checkout/success?order=1"])
+def test_content_pages_run_no_sql(client, statements, path):
+    client.get(path)
+    statements.clear()
+    assert client.get(path).status_code == 200
+    assert statements == []
+
+
+def test_navigation_follows_catalog_changes(app, client):
+    with app.app_context():
+        db = data.get_db()
+        name = db.execute("SELECT name FROM category ORDER BY name LIMIT 1").fetchone()["name"]
+    assert name.encode() in client.get("/shop/").data
+    with app.app_context():
+        db = data.get_db()
+        db.execute("UPDATE category SET name = 'Renamed Category' WHERE name = ?", (name,))
+        db.commit()
+    assert b"Renamed Category" in client.get("/shop/").data
@@ -0,0 +1,69 @@
+import io
+import os
+
+import pytest
+
+from .conftest import make_app, shutdown
+
+PIL = pytest.importorskip("PIL.Image")
+FORM = {"name": "Sam", "email": "sam@example.com", "notes": "A tray."}
+
+
+def _png(size=(40, 30)):
+    buffer = io.BytesIO()
+    PIL.new("RGB", size, "purple").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path, CUSTOM_UPLOAD_MAX_FILE_BYTES=4096, CUSTOM_UPLOAD_MAX_FILES=2, CUSTOM_UPLOAD_WORKERS=1)
+    yield app
+    shutdown(app)
+
+
+def _post(client, *files):
+    form = dict(FORM, references=[(io.BytesIO(body), name) for name, body in files])
+    return client.post("/custom/start", data=form, content_type="multipart/form-data")
+
+
+def _stored(app):
+    return sorted(os.listdir(app.config["CUSTOM_UPLOAD_DIR"]))
+
+
+def _assets(db):
+    return db.execute("SELECT original_name, size, status, width, height FROM custom_request_asset").fetchall()
+
+
+def test_photo_is_stored_and_thumbnailed(app, client, db):
+    body = _png()
+    assert _post(client, ("tray.png", body)).status_code == 200
+    app.extensions["derivative_pool"].shutdown()
+    assert [tuple(row) for row in _assets(db)] == [("tray.png", len(body), "ready", 40, 30)]
+    assert len(_stored(app)) == 3
+
+
+def test_files_that_are_not_images_are_dropped(app, client, db):
+    assert _post(client, ("notes.txt", b"hello"), ("tray.png", _png())).status_code == 200
+    assert [row["original_name"] for row in _assets(db)] == ["tray.png"]
+    assert not any(name.endswith(".bin") for name in _stored(app))
+
+
+def test_oversized_photo_is_413_and_leaves_nothing_behind(app, client, db):
+    response = _post(client, ("tray.png", _png()), ("huge.png", b"x" * 5000))
+    assert response.status_code == 413
+    assert _stored(app) == []
+    assert db.execute("SELECT COUNT(*) FROM custom_request").fetchone()[0] == 0
+
+
+def test_too_many_photos_is_413(app, client):
+    response = _post(client, *[(f"tray-{index}.png", _png()) for index in range(3)])
+    assert response.status_code == 413
+    assert _stored(app) == []
+
+
+def test_missing_contact_details_discard_the_photos(app, client, db):
+    form = {"references": [(io.BytesIO(_png()), "tray.png")]}
+    assert client.post("/custom/start", data=form, content_type="multipart/form-data").status_code == 200
+    assert _stored(app) == []
+    assert db.execute("SELECT COUNT(*) FROM custom_request").fetchone()[0] == 0